@@ -0,0 +1,175 @@
+"""
+PDF书签工具 - 自动生成书签
+按字号和粗细识别标题：统计正文字号，将明显更大的字号聚类为标题层级；页面文本经页面文本索引读取
+"""
+
+import re
+from collections import Counter
+
+import text_index
+
+
+# 字号比正文大出该比例才视为标题
+HEADING_SIZE_RATIO = 1.15
+# 出现在超过该比例页面上的相同文本视为页眉页脚
+RUNNING_TEXT_RATIO = 0.3
+MAX_TITLE_LENGTH = 80
+# 同一标题换行时两行之间的最大空白，以字号为单位
+WRAP_GAP_RATIO = 0.8
+# 标题样式至少要在这么多页上出现，只出现一次的大字（封面、插图文字）不作为标题
+MIN_STYLE_PAGES = 2
+# 粗细相同、字号相差不超过该比例的样式视为同一样式（字号取整误差、排版微调）
+SIZE_MERGE_RATIO = 0.05
+
+# 标题编号格式，编号格式相同的标题属于同一层级
+CHAPTER_PATTERN = re.compile(r'^第[\d一二三四五六七八九十百千零〇两]+([章部篇卷节])')
+ENGLISH_CHAPTER_PATTERN = re.compile(r'^(chapter|part|section)\s+\w', re.IGNORECASE)
+DOTTED_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)(?:[.、]\s*|\s+)(?!\d)')
+
+
+def _page_count(pdf_path):
+    import pymupdf
+    with pymupdf.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def collect_lines(pdf_path, workers=None, use_index=True):
+    """读取所有页面的文本行（已索引的页面直接从页面文本索引读取），合并字号统计
+
+    返回 (页数, 各字号字符数, 候选行列表)，候选行为 (页码(0基), 行序号, 文本, 字号, 是否粗体, 上边缘y, 下边缘y)，
+    只保留长度合适的行；行序号是该行在页面所有文本行中的序号，被过滤掉的行也占用序号。
+    """
+    page_count = _page_count(pdf_path)
+    records = text_index.load_pages(pdf_path, range(page_count), workers, use_index)
+
+    size_chars = Counter()
+    lines = []
+    for page_num in sorted(records):
+        page_lines, sizes = records[page_num]
+        size_chars.update(sizes)
+        lines.extend((page_num, ordinal, text, size, bold, top, bottom)
+                     for ordinal, (text, size, bold, top, bottom) in enumerate(page_lines)
+                     if len(text) <= MAX_TITLE_LENGTH)
+    return page_count, size_chars, lines
+
+
+def numbering_key(text):
+    """标题的编号格式：('第', '章')、('chapter',)、('dotted', 级数)，没有编号时返回None"""
+    match = CHAPTER_PATTERN.match(text)
+    if match:
+        return ('第', match.group(1))
+    match = ENGLISH_CHAPTER_PATTERN.match(text)
+    if match:
+        return (match.group(1).lower(),)
+    match = DOTTED_PATTERN.match(text)
+    if match:
+        return ('dotted', match.group(1).count('.') + 1)
+    return None
+
+
+def group_styles(candidates):
+    """将候选行的样式归并为标题组，返回 {样式: 组代表样式}
+
+    先合并粗细相同、字号相近的样式，再合并编号格式相同的样式（如第一章与其余各章字号不一致），
+    组代表样式取组内最大的样式。
+    """
+    group_of = {}
+    representative = None
+    for style in sorted({candidate[3] for candidate in candidates}, reverse=True):
+        if (representative is None or representative[1] != style[1]
+                or style[0] < representative[0] * (1 - SIZE_MERGE_RATIO)):
+            representative = style
+        group_of[style] = representative
+
+    # 各组出现最多的编号格式
+    keys = {}
+    for candidate in candidates:
+        key = numbering_key(candidate[2])
+        if key is not None:
+            keys.setdefault(group_of[candidate[3]], Counter())[key] += 1
+    by_key = {}
+    merged = {}
+    for representative in sorted(set(group_of.values()), reverse=True):
+        key = keys[representative].most_common(1)[0][0] if representative in keys else None
+        if key is None:
+            merged[representative] = representative
+        else:
+            merged[representative] = by_key.setdefault(key, representative)
+    return {style: merged[representative] for style, representative in group_of.items()}
+
+
+def detect_headings(page_count, size_chars, lines, max_levels=3):
+    """根据字号统计识别标题，返回 [[层级, 标题, 页码(1基)], ...]"""
+    if not size_chars:
+        return []
+
+    # 字符数最多的字号为正文字号
+    body_size = size_chars.most_common(1)[0][0]
+
+    # 去掉页眉页脚等在大量页面重复出现的文本，以及纯数字（页码）
+    text_pages = Counter()
+    for text in {(line[0], line[2]) for line in lines}:
+        text_pages[text[1]] += 1
+    running_limit = max(2, page_count * RUNNING_TEXT_RATIO)
+
+    candidates = [(page, ordinal, text, (size, bold), top, bottom)
+                  for page, ordinal, text, size, bold, top, bottom in lines
+                  if size >= body_size * HEADING_SIZE_RATIO
+                  and text_pages[text] < running_limit
+                  and not text.replace('.', '').isdigit()]
+
+    group_of = group_styles(candidates)
+
+    # 有编号的标题组中，第一个编号标题之前的无编号行是封面、扉页等前置内容
+    first_numbered = {}
+    for index, candidate in enumerate(candidates):
+        if numbering_key(candidate[2]) is not None:
+            first_numbered.setdefault(group_of[candidate[3]], index)
+    candidates = [candidate for index, candidate in enumerate(candidates)
+                  if index >= first_numbered.get(group_of[candidate[3]], 0)
+                  or numbering_key(candidate[2]) is not None]
+
+    # 只保留在足够多页面上出现的标题组
+    group_pages = {}
+    for candidate in candidates:
+        group_pages.setdefault(group_of[candidate[3]], set()).add(candidate[0])
+    min_pages = min(MIN_STYLE_PAGES, page_count)
+    groups = [group for group, pages in group_pages.items() if len(pages) >= min_pages]
+
+    # 标题组（字号, 粗体）从大到小依次对应层级1、2、3...，同字号时粗体层级更高
+    heading_groups = sorted(groups, reverse=True)[:max_levels]
+    levels = {group: level for level, group in enumerate(heading_groups, 1)}
+
+    bookmarks = []
+    previous = None  # 上一个标题行 (页码, 行序号, 样式, 下边缘y)
+    for page, ordinal, text, style, top, bottom in candidates:
+        if group_of[style] not in levels:
+            continue
+        level = levels[group_of[style]]
+        # 紧接在上一个标题行之后（中间没有其他行）、样式相同且行距很小的行视为换行的同一标题
+        if (previous is not None and previous[:3] == (page, ordinal - 1, style)
+                and top - previous[3] <= style[0] * WRAP_GAP_RATIO):
+            bookmarks[-1][1] += " " + text
+            previous = (page, ordinal, style, bottom)
+            continue
+        # 层级不能一次跳过多级
+        if bookmarks:
+            level = min(level, bookmarks[-1][0] + 1)
+        else:
+            level = 1
+        bookmarks.append([level, text, page + 1])
+        previous = (page, ordinal, style, bottom)
+    return bookmarks
+
+
+def generate_bookmarks(pdf_path, max_levels=3, workers=None, use_index=True):
+    """从PDF生成书签列表"""
+    page_count, size_chars, lines = collect_lines(pdf_path, workers, use_index)
+    return detect_headings(page_count, size_chars, lines, max_levels)
+
+
+def write_bookmark_file(bookmarks, output_path):
+    """以 层级|标题|页码 格式写出书签文件"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for level, title, page in bookmarks:
+            f.write(f"{level}|{title.replace('|', ' ')}|{page}\n")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+PDF书签工具 - 性能基准测试
+生成合成PDF与书签文件，测量各操作的耗时、峰值内存和输出大小，结果保存为JSON
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+import bookmark_parser
+from instrument import peak_rss_kb
+
+
+PRESETS = {
+    'quick': {'pages': [100, 1000], 'entries': [10, 1000]},
+    'default': {'pages': [100, 1000, 10000], 'entries': [10, 1000, 20000]},
+    'full': {'pages': [100, 1000, 10000, 100000], 'entries': [10, 1000, 20000, 200000]},
+}
+
+OPERATIONS = ['startup', 'parse', 'info', 'view', 'apply', 'extract']
+
+# 与基线相比耗时或内存增长超过该比例即视为性能回退
+REGRESSION_THRESHOLD = 0.2
+# 低于该耗时的操作计时噪声太大，不参与耗时回退判断
+MIN_COMPARE_SECONDS = 0.01
+
+IMAGE_SIZE = 64
+
+# 命令行版本 --help / prompt 的启动耗时目标
+STARTUP_TARGET_SECONDS = 0.15
+
+
+def generate_pdf(path, page_count, kind):
+    """生成合成PDF：text为纯文本页面，image为每页一张不同的图片"""
+    doc = pymupdf.open()
+    pattern = bytes(x * 13 % 256 for x in range(IMAGE_SIZE * IMAGE_SIZE * 3))
+    for i in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapter {i // 20 + 1}  Section {i % 20 + 1}", fontsize=18)
+        page.insert_text((72, 110), f"Synthetic benchmark page {i + 1}. " * 4, fontsize=9)
+        if kind == 'image':
+            # 每页图片内容不同，避免被去重
+            shift = i * 37 % len(pattern)
+            samples = i.to_bytes(8, 'little') + (pattern[shift:] + pattern[:shift])[8:]
+            pixmap = pymupdf.Pixmap(pymupdf.csRGB, IMAGE_SIZE, IMAGE_SIZE, samples, False)
+            page.insert_image(pymupdf.Rect(72, 150, 472, 550), pixmap=pixmap)
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+
+
+def generate_bookmarks(path, entry_count, page_count):
+    """生成 层级|标题|页码 格式的书签文件，层级在1-3之间合法跳转"""
+    with open(path, 'w', encoding='utf-8') as f:
+        level = 1
+        for i in range(entry_count):
+            page = i * page_count // entry_count + 1
+            f.write(f"{level}|第{i + 1}节 合成书签标题|{page}\n")
+            level = level + 1 if level < 3 and i % 3 != 2 else 1
+
+
+def _run_operation(operation, pdf_path, bookmark_path, work_dir):
+    """在独立子进程中执行一次操作，返回 (耗时, 峰值内存KB, 输出大小)"""
+    import cli
+
+    output_path = None
+    if operation == 'apply':
+        # 每次在副本上应用，避免前一次结果影响下一次
+        target = os.path.join(work_dir, 'apply_target.pdf')
+        shutil.copyfile(pdf_path, target)
+        pdf_path = target
+    elif operation == 'extract':
+        output_path = os.path.join(work_dir, 'extract_output.pdf')
+        # 页数在计时开始前读取，不把额外的一次打开计入耗时
+        with pymupdf.open(pdf_path) as doc:
+            page_range = f"1-{max(1, doc.page_count // 2)}"
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        if operation == 'parse':
+            ok = bool(cli.parse_bookmark_file(bookmark_path))
+        elif operation == 'info':
+            ok = cli.load_pdf_info(pdf_path)
+        elif operation == 'view':
+            ok = cli.view_pdf_bookmarks(pdf_path)
+        elif operation == 'apply':
+            ok = cli.apply_bookmarks(pdf_path, bookmark_path)
+        else:
+            ok = cli.extract_pages(pdf_path, page_range, output_path)
+        elapsed = time.perf_counter() - start
+
+    if not ok:
+        raise RuntimeError(f"{operation} 执行失败")
+
+    if operation == 'apply':
+        output_size = os.path.getsize(pdf_path)
+    elif operation == 'extract':
+        output_size = os.path.getsize(output_path)
+    else:
+        output_size = 0
+    return elapsed, peak_rss_kb(), output_size
+
+
+def measure(operation, pdf_path, bookmark_path, work_dir, repeat):
+    """每次测量使用新启动的进程（spawn），取最短耗时与最大峰值内存"""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(_run_operation, operation, pdf_path, bookmark_path, work_dir).result())
+    return {
+        'wall_seconds': min(run[0] for run in runs),
+        'peak_rss_kb': max(run[1] for run in runs),
+        'output_bytes': runs[-1][2],
+    }
+
+
+def measure_startup(repeat):
+    """测量命令行版本 --help 和 prompt 的启动耗时（含解释器启动）"""
+    cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    results = []
+    for name, args in (('startup/help', ['--help']), ('startup/prompt', ['--operation', 'prompt'])):
+        timings = []
+        for _ in range(max(repeat, 5)):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, cli_path, *args], stdout=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+        wall = min(timings)
+        results.append({'name': name, 'operation': 'startup', 'wall_seconds': wall, 'peak_rss_kb': 0,
+                        'output_bytes': 0, 'target_seconds': STARTUP_TARGET_SECONDS,
+                        'within_target': wall <= STARTUP_TARGET_SECONDS})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(page_counts, entry_counts, kinds, operations, repeat, work_dir):
+    results = measure_startup(repeat) if 'startup' in operations else []
+    operations = [op for op in operations if op != 'startup']
+    if not operations:
+        return results
+    for kind in kinds:
+        for page_count in page_counts:
+            pdf_path = os.path.join(work_dir, f"{kind}_{page_count}.pdf")
+            print(f"生成 {kind} PDF: {page_count} 页...", file=sys.stderr)
+            generate_pdf(pdf_path, page_count, kind)
+            pdf_bytes = os.path.getsize(pdf_path)
+
+            for entry_count in entry_counts:
+                bookmark_path = os.path.join(work_dir, f"toc_{entry_count}_{page_count}.txt")
+                generate_bookmarks(bookmark_path, entry_count, page_count)
+
+                # 先在源文件上应用一次书签，使view操作有内容可读
+                source_with_toc = os.path.join(work_dir, 'source_with_toc.pdf')
+                doc = pymupdf.open(pdf_path)
+                doc.set_toc(list(bookmark_parser.iter_bookmarks(bookmark_path)))
+                doc.save(source_with_toc)
+                doc.close()
+
+                for operation in operations:
+                    # 与书签数量无关的操作只测一次
+                    if operation in ('info', 'extract') and entry_count != entry_counts[0]:
+                        continue
+                    if operation == 'parse' and (kind != kinds[0] or page_count != page_counts[0]):
+                        continue
+                    source = source_with_toc if operation == 'view' else pdf_path
+                    name = f"{operation}/{kind}/{page_count}p/{entry_count}e"
+                    print(f"  {name}", file=sys.stderr)
+                    record = {'name': name, 'operation': operation, 'kind': kind, 'pages': page_count,
+                              'entries': entry_count, 'input_bytes': pdf_bytes}
+                    record.update(measure(operation, source, bookmark_path, work_dir, repeat))
+                    results.append(record)
+    return results
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """与基线结果对比，返回回退的条目说明列表"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+
+    regressions = []
+    for record in results:
+        base = baseline.get(record['name'])
+        if base is None:
+            continue
+        for key in ('wall_seconds', 'peak_rss_kb'):
+            if key == 'wall_seconds' and max(base[key], record[key]) < MIN_COMPARE_SECONDS:
+                continue
+            if base[key] and record[key] > base[key] * (1 + threshold):
+                regressions.append(f"{record['name']} {key}: {base[key]} -> {record[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF书签工具 - 性能基准测试")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='default', help='规模预设 (默认: default)')
+    parser.add_argument('--pages', type=int, nargs='+', help='PDF页数列表，覆盖预设')
+    parser.add_argument('--entries', type=int, nargs='+', help='书签条目数列表，覆盖预设')
+    parser.add_argument('--kinds', nargs='+', choices=['text', 'image'], default=['text', 'image'],
+                        help='PDF类型: text(纯文本), image(图片较多)')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=OPERATIONS, help='要测量的操作')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最短耗时 (默认: 3)')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果JSON文件路径')
+    parser.add_argument('--baseline', help='基线JSON文件，耗时或内存增长超过20%%时以非零状态退出')
+    parser.add_argument('--work-dir', help='生成文件的目录，默认使用临时目录并在结束后删除')
+
+    args = parser.parse_args()
+    preset = PRESETS[args.preset]
+    page_counts = args.pages or preset['pages']
+    entry_counts = args.entries or preset['entries']
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pdf_bm_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_benchmarks(page_counts, entry_counts, args.kinds, args.operations, args.repeat, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pymupdf': pymupdf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存至: {args.output}", file=sys.stderr)
+
+    for record in results:
+        print(f"{record['name']:<40} {record['wall_seconds']:8.3f}s {record['peak_rss_kb']:>10}KB "
+              f"{record['output_bytes']:>12}B")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline)
+        if regressions:
+            print("\n性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+PDF书签工具 - 书签文件解析
+命令行版本与GUI版本共用的流式书签解析器，逐行读取并给出带行号的诊断信息
+"""
+
+import codecs
+import re
+from collections import namedtuple
+
+import instrument
+
+
+# 编码探测时读取的字节数
+SNIFF_SIZE = 64 * 1024
+
+# 格式1: 层级|标题|页码
+PIPE_PATTERN = re.compile(r'^\s*(?P<level>[^|]*)\|(?P<title>[^|]*)\|(?P<page>[^|]*)')
+# 格式2/3: 标题 (页码)，兼容全角括号
+PAREN_PATTERN = re.compile(r'^(?P<title>.*?)\s*[(（]\s*(?P<page>[^()（）]*?)\s*[)）]\s*$')
+INDENT_PATTERN = re.compile(r'^[ \t]*')
+
+
+class BookmarkDiagnostic(namedtuple('BookmarkDiagnostic', ['line_num', 'message', 'text'])):
+    """书签文件中某一行的诊断信息"""
+
+    def __str__(self):
+        return f"第{self.line_num}行: {self.message}"
+
+
+def detect_encoding(sample):
+    """根据文件开头的字节探测编码：BOM优先，其次UTF-8，否则按GBK(GB18030)处理"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # 采样末尾可能截断多字节字符，使用增量解码器避免误判
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+def _line_encodings(encoding):
+    """逐行解码时依次尝试的编码
+
+    采样中出现了非UTF-8字节时整个文件很可能是GBK，优先按GB18030解码；
+    采样能按UTF-8解码时可能只是纯ASCII，后面的行仍可能是GBK，先试UTF-8再试GB18030。
+    """
+    return ('gb18030', 'utf-8') if encoding == 'gb18030' else ('utf-8', 'gb18030')
+
+
+def decode_line(raw, encodings=('utf-8', 'gb18030')):
+    """按encodings依次尝试解码一行字节，都失败时返回None"""
+    for encoding in encodings:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def decode_text(data):
+    """解码整个书签文件的内容（用于编辑器），逐行选择编码，无法解码的字节以替换字符显示"""
+    encoding = detect_encoding(data[:SNIFF_SIZE])
+    if encoding in ('utf-16', 'utf-8-sig'):
+        return data.decode(encoding, errors='replace')
+    encodings = _line_encodings(encoding)
+    lines = []
+    for raw in data.splitlines(keepends=True):
+        line = decode_line(raw, encodings)
+        lines.append(line if line is not None else raw.decode(encodings[0], errors='replace'))
+    return ''.join(lines)
+
+
+def iter_lines(bookmark_path, diagnostics=None):
+    """流式读取书签文件，逐行产出 (行号, 行内容)
+
+    每行单独解码，前64KB之后出现其他编码的行也能读取；无法解码的行被跳过，
+    以BookmarkDiagnostic形式追加到diagnostics列表中。
+    """
+    with open(bookmark_path, 'rb') as f:
+        sample = f.read(SNIFF_SIZE)
+    encoding = detect_encoding(sample)
+
+    if encoding == 'utf-16':
+        # UTF-16无法按字节分行，整体按带BOM的UTF-16解码
+        with open(bookmark_path, 'r', encoding=encoding, errors='replace') as f:
+            for line_num, line in enumerate(f, 1):
+                yield line_num, line.rstrip('\r\n')
+        return
+
+    encodings = _line_encodings(encoding)
+    with open(bookmark_path, 'rb') as f:
+        for line_num, raw in enumerate(f, 1):
+            if line_num == 1 and raw.startswith(codecs.BOM_UTF8):
+                raw = raw[len(codecs.BOM_UTF8):]
+            line = decode_line(raw, encodings)
+            if line is None:
+                if diagnostics is not None:
+                    text = raw.decode(encodings[0], errors='replace').rstrip('\r\n')
+                    diagnostics.append(BookmarkDiagnostic(line_num, "无法识别该行的编码（既不是UTF-8也不是GBK）", text))
+                continue
+            yield line_num, line.rstrip('\r\n')
+
+
+def parse_line(line):
+    """解析单行书签，返回 [层级, 标题, 页码]；空行和注释返回None，格式错误抛出ValueError"""
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#'):
+        return None
+
+    # 格式1: 层级|标题|页码
+    if '|' in stripped:
+        match = PIPE_PATTERN.match(stripped)
+        if not match:
+            raise ValueError("竖线格式应为 层级|标题|页码")
+        level_str = match.group('level').strip()
+        title = match.group('title').strip()
+        page_str = match.group('page').strip()
+        if not level_str.isdigit():
+            raise ValueError(f"层级不是数字: '{level_str}'")
+        if not page_str.isdigit():
+            raise ValueError(f"页码不是数字: '{page_str}'")
+        level, page = int(level_str), int(page_str)
+    else:
+        # 格式2/3: 缩进表示层级，每2个空格为一级，制表符计为4个空格
+        indent = INDENT_PATTERN.match(line).group()
+        level = (indent.count(' ') + indent.count('\t') * 4) // 2 + 1
+        match = PAREN_PATTERN.match(stripped)
+        if match:
+            title = match.group('title').strip()
+            page_str = match.group('page')
+            if not page_str.isdigit():
+                raise ValueError(f"页码不是数字: '{page_str}'")
+            page = int(page_str)
+        else:
+            title = stripped
+            page = 1  # 默认第一页
+
+    if level < 1:
+        raise ValueError(f"层级必须从1开始: {level}")
+    if not title:
+        raise ValueError("标题为空")
+    return [level, title, page]
+
+
+def check_structure(entries, page_limit=None):
+    """检查书签之间的关系，entries为 [(行号, 行内容, [层级, 标题, 页码]), ...]，返回诊断列表
+
+    检查层级跳跃（比上一个书签深一级以上）、页码超出page_limit和页码倒退。
+    """
+    diagnostics = []
+    prev_level, prev_page = 0, 0
+    for line_num, line, (level, _, page) in entries:
+        if level > prev_level + 1:
+            if prev_level == 0:
+                message = f"第一个书签的层级应为1: {level}"
+            else:
+                message = f"层级从{prev_level}跳到{level}，每次只能深入一级"
+            diagnostics.append(BookmarkDiagnostic(line_num, message, line))
+        if page_limit is not None and page > page_limit:
+            diagnostics.append(BookmarkDiagnostic(line_num, f"页码{page}超出PDF页数范围(1-{page_limit})", line))
+        if page < prev_page:
+            diagnostics.append(BookmarkDiagnostic(line_num, f"页码{page}小于上一个书签的页码{prev_page}", line))
+        prev_level, prev_page = level, page
+    return diagnostics
+
+
+class IncrementalValidator:
+    """编辑器使用的校验器：按行内容缓存解析结果，文本变化后只重新解析改动过的行
+
+    同一实例不能被多个线程同时使用。
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def validate(self, lines, page_limit=None):
+        """校验所有行，返回 (书签数, 诊断列表)，诊断按行号排序"""
+        cache = self.cache
+        new_cache = {}
+        entries = []
+        diagnostics = []
+        for line_num, line in enumerate(lines, 1):
+            result = cache.get(line)
+            if result is None:
+                try:
+                    result = (True, parse_line(line))
+                except ValueError as e:
+                    result = (False, str(e))
+            new_cache[line] = result
+            ok, value = result
+            if not ok:
+                diagnostics.append(BookmarkDiagnostic(line_num, value, line))
+            elif value is not None:
+                entries.append((line_num, line, value))
+        # 只保留当前文本中的行，避免缓存无限增长
+        self.cache = new_cache
+
+        diagnostics.extend(check_structure(entries, page_limit))
+        diagnostics.sort(key=lambda d: d.line_num)
+        return len(entries), diagnostics
+
+
+def iter_bookmarks(bookmark_path, diagnostics=None):
+    """流式解析书签文件，逐个产出 [层级, 标题, 页码]
+
+    格式错误的行不会中断解析，而是以BookmarkDiagnostic形式追加到diagnostics列表中。
+    """
+    for line_num, line in iter_lines(bookmark_path, diagnostics):
+        try:
+            entry = parse_line(line)
+        except ValueError as e:
+            if diagnostics is not None:
+                diagnostics.append(BookmarkDiagnostic(line_num, str(e), line))
+            continue
+        if entry is not None:
+            yield entry
+
+
+def parse_bookmark_file(bookmark_path):
+    """解析整个书签文件，返回 (书签列表, 诊断列表)"""
+    diagnostics = []
+    bookmarks = list(iter_bookmarks(bookmark_path, diagnostics))
+    instrument.count_file_read(bookmark_path)
+    return bookmarks, diagnostics
@@ -2,82 +2,111 @@
 """
 PDF书签工具 - 命令行版本
 支持PDF书签应用、页面提取、书签查看等功能
+
+启动速度优先：模块级只导入标准库中的轻量模块，PyMuPDF等依赖在用到的操作中再导入，
+`--help` 和 `prompt` 不会加载PyMuPDF，也从不导入Qt。
 """
 
 import sys
 import os
 import argparse
-import pymupdf
-import re
-import shutil
+import io
+import json
+import contextlib
+import time
+import bookmark_parser
+import instrument
+
+
+# 常驻服务模式下设置为DocumentCache，在多次请求之间复用已打开的文档
+document_cache = None
+
+
+def open_pdf(pdf_path):
+    """打开PDF用于只读操作，启用文档缓存时返回缓存中的文档"""
+    with instrument.stage("open"):
+        if document_cache is not None:
+            return document_cache.open(pdf_path)
+        import pymupdf
+        instrument.count_file_read(pdf_path)
+        return pymupdf.open(pdf_path)
+
+
+def close_pdf(doc):
+    """关闭open_pdf打开的文档，缓存中的文档由缓存负责关闭"""
+    if document_cache is None:
+        doc.close()
 
 
 def load_pdf_info(pdf_path):
     """加载PDF基本信息"""
     try:
-        doc = pymupdf.open(pdf_path)
+        doc = open_pdf(pdf_path)
+        # metadata是字典，缺失的字段为空字符串
+        metadata = doc.metadata or {}
         info = f"""
 PDF基本信息:
 文件路径: {pdf_path}
 总页数: {doc.page_count}
-PDF版本: {getattr(doc.metadata, 'format', '未知')}
-标题: {getattr(doc.metadata, 'title', '未知')}
-作者: {getattr(doc.metadata, 'creator', '未知')}
-主题: {getattr(doc.metadata, 'subject', '未知')}
-关键字: {getattr(doc.metadata, 'keywords', '未知')}
-创建日期: {getattr(doc.metadata, 'creationDate', '未知')}
-修改日期: {getattr(doc.metadata, 'modDate', '未知')}
+PDF版本: {metadata.get('format') or '未知'}
+标题: {metadata.get('title') or '未知'}
+作者: {metadata.get('author') or '未知'}
+主题: {metadata.get('subject') or '未知'}
+关键字: {metadata.get('keywords') or '未知'}
+创建日期: {metadata.get('creationDate') or '未知'}
+修改日期: {metadata.get('modDate') or '未知'}
         """
         print(info.strip())
-        doc.close()
+        close_pdf(doc)
         return True
     except Exception as e:
         print(f"加载PDF信息失败: {str(e)}")
         return False
 
 
-def extract_pages(pdf_path, page_range, output_path):
-    """提取指定页面"""
-    try:
-        # 解析页面范围
-        pages = parse_page_range(page_range)
-        if not pages:
-            print("页面范围格式错误，请使用格式如: 1-5,8,10-12")
-            return False
+def extract_pages(pdf_path, page_range, output_path, profile=None):
+    """提取指定页面，profile为保存配置（fast/balanced/smallest）"""
+    import pymupdf
+    from page_range import insert_page_runs, parse_page_range, PageRangeError
+    from save_engine import atomic_save
 
+    try:
         # 打开PDF文档
-        doc = pymupdf.open(pdf_path)
-
-        # 创建新文档
-        new_doc = pymupdf.open()
-
-        # 添加指定页面
-        for page_num in pages:
-            if 0 <= page_num < doc.page_count:
-                new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
-
-        # 如果未指定输出路径，自动生成
-        if not output_path:
-            original_dir = os.path.dirname(pdf_path)
-            original_basename = os.path.splitext(os.path.basename(pdf_path))[0]
-
-            # 根据提取的页面生成智能文件名
-            if len(pages) == 1:
-                page_str = f"第{pages[0]+1}页"
-            elif len(pages) <= 5:
-                page_str = f"第{','.join(str(p+1) for p in pages)}页"
-            else:
-                page_str = f"第{pages[0]+1}-{pages[-1]+1}页({len(pages)}页)"
-
-            default_filename = f"{original_basename}_{page_str}.pdf"
-            output_path = os.path.join(original_dir, default_filename)
-
-        # 保存新文档
-        new_doc.save(output_path)
-        new_doc.close()
-        doc.close()
-
-        print(f"成功提取 {len(pages)} 页，保存至: {output_path}")
+        doc = open_pdf(pdf_path)
+        try:
+            # 解析页面范围（last、负数和开放范围需要总页数）
+            try:
+                with instrument.stage("page_range"):
+                    pages = parse_page_range(page_range, doc.page_count)
+            except PageRangeError as e:
+                print(f"页面范围格式错误: {e}，请使用格式如: 1-5,8,10-12")
+                return False
+            if not pages:
+                print(f"页面范围内没有可提取的页面（共 {doc.page_count} 页）")
+                return False
+
+            # 创建新文档
+            new_doc = pymupdf.open()
+            try:
+                # 按连续区间添加指定页面
+                with instrument.stage("insert"):
+                    insert_page_runs(new_doc, doc, pages)
+
+                # 如果未指定输出路径，根据提取的页面自动生成
+                if not output_path:
+                    original_dir = os.path.dirname(pdf_path)
+                    original_basename = os.path.splitext(os.path.basename(pdf_path))[0]
+                    output_path = os.path.join(original_dir, f"{original_basename}_{pages.label()}.pdf")
+
+                # 保存新文档
+                with instrument.stage("save"):
+                    result = atomic_save(new_doc, output_path, profile=profile)
+            finally:
+                new_doc.close()
+        finally:
+            close_pdf(doc)
+
+        print(f"成功提取 {len(pages)} 页，保存至: {output_path}（{result}）")
         return True
 
     except Exception as e:
@@ -85,36 +114,53 @@ def extract_pages(pdf_path, page_range, output_path):
         return False
 
 
-def parse_page_range(page_range):
-    """解析页面范围字符串"""
-    pages = []
-    try:
-        # 分割逗号
-        parts = page_range.split(',')
-
-        for part in parts:
-            part = part.strip()
-            if '-' in part:
-                # 处理范围
-                start, end = part.split('-')
-                start, end = int(start.strip()), int(end.strip())
-                pages.extend(range(start - 1, end))  # 转换为0基索引
-            else:
-                # 处理单个页面
-                pages.append(int(part.strip()) - 1)  # 转换为0基索引
+def adjust_bookmark_pages(doc, bookmarks, offset):
+    """按页码偏移将书签中的印刷页码转换为物理页码，超出范围的书签被丢弃
+
+    offset为印刷页码1所在的物理页码（与GUI中“页码偏移量”含义相同），为"auto"时自动检测。
+    """
+    if offset == "auto":
+        from offset_detect import detect_page_mapping
+        mapping = detect_page_mapping(doc)
+        if mapping is None:
+            print("未能从页眉页脚中识别页码，页码不做调整")
+            return bookmarks
+        print(f"自动检测页码（读取 {mapping.pages_read} 页，可信度 {mapping.confidence:.0%}）:")
+        print(mapping.describe())
+        to_physical = mapping.to_physical
+    else:
+        shift = int(offset) - 1
+        to_physical = lambda page: page + shift
 
-        return sorted(set(pages))  # 去重并排序
-    except Exception as e:
-        print(f"解析页面范围失败: {e}")
-        return []
+    adjusted = []
+    for level, title, page in bookmarks:
+        physical = to_physical(page)
+        if 1 <= physical <= doc.page_count:
+            adjusted.append([level, title, physical])
+        else:
+            print(f"跳过超出页码范围的书签: {title}（第{physical}页）")
+    return adjusted
+
+
+def apply_bookmarks(pdf_path, bookmark_path, update=False, output_path=None, offset=None, profile=None):
+    """应用书签到PDF，update为True时只修改发生变化的书签条目
 
+    指定output_path时写入新文件，原PDF保持不变；offset见adjust_bookmark_pages；
+    profile为保存配置，balanced和smallest总是完整写入。
+    """
+    import pymupdf
+    from outline_patch import patch_toc
+    from save_engine import save_document, ReplaceError
+
+    # 即将写入该文件，先释放缓存中的句柄（Windows上打开的文件无法被替换）
+    if document_cache is not None:
+        document_cache.invalidate(pdf_path)
 
-def apply_bookmarks(pdf_path, bookmark_path):
-    """应用书签到PDF"""
     doc = None
     try:
         # 解析书签文件
-        bookmarks = parse_bookmark_file(bookmark_path)
+        with instrument.stage("parse"):
+            bookmarks = parse_bookmark_file(bookmark_path)
         if not bookmarks:
             print("书签文件格式错误或为空")
             return False
@@ -122,36 +168,48 @@ def apply_bookmarks(pdf_path, bookmark_path):
         print(f"成功解析 {len(bookmarks)} 个书签，开始应用到PDF...")
 
         # 打开PDF文档
-        doc = pymupdf.open(pdf_path)
-
-        # 使用set_toc方法设置书签
+        with instrument.stage("open"):
+            instrument.count_file_read(pdf_path)
+            doc = pymupdf.open(pdf_path)
+
+        if offset is not None:
+            with instrument.stage("offset"):
+                bookmarks = adjust_bookmark_pages(doc, bookmarks, offset)
+            if not bookmarks:
+                print("没有页码在范围内的书签")
+                return False
+
+        # 使用set_toc方法设置书签，增量模式下只修改变化的条目
         try:
-            doc.set_toc(bookmarks)  # type: ignore
+            if update:
+                with instrument.stage("patch_toc"):
+                    mode, changed = patch_toc(doc, bookmarks)
+                instrument.note("toc_mode", mode)
+                if mode == "unchanged" and not output_path:
+                    print("书签没有变化，无需保存")
+                    return True
+                if mode == "patched":
+                    print(f"增量更新 {changed} 个书签条目")
+            else:
+                with instrument.stage("set_toc"):
+                    doc.set_toc(bookmarks)  # type: ignore
         except (AttributeError, Exception) as e:
             raise Exception(f"无法设置书签：{str(e)}。请确保PyMuPDF版本支持set_toc方法")
 
-        # 保存PDF文档（处理加密文件）
-        try:
-            # 尝试增量更新
-            doc.save(pdf_path, incremental=True)
-        except Exception as save_error:
-            if "encryption" in str(save_error).lower():
-                # 如果是加密问题，创建临时文件然后替换
-                temp_path = pdf_path + ".tmp"
-                doc.save(temp_path)
-                doc.close()
-
-                # 替换原文件
-                shutil.move(temp_path, pdf_path)
-                print(f"成功应用 {len(bookmarks)} 个书签到PDF文件（已处理加密文件）")
-                return True
-            else:
-                raise save_error
+        # 保存PDF文档：指定输出路径时完整写入新文件，否则增量保存，失败时原子替换原文件
+        def release():
+            nonlocal doc
+            doc.close()
+            doc = None
 
-        doc.close()
-        doc = None
+        try:
+            with instrument.stage("save"):
+                result = save_document(doc, pdf_path, output_path, release=release, profile=profile)
+        except ReplaceError as e:
+            os.remove(e.temp_path)
+            raise
 
-        print(f"成功应用 {len(bookmarks)} 个书签到PDF文件")
+        print(f"成功应用 {len(bookmarks)} 个书签到PDF文件: {result.path}（{result}）")
         return True
 
     except Exception as e:
@@ -166,66 +224,97 @@ def apply_bookmarks(pdf_path, bookmark_path):
                 pass
 
 
-def parse_bookmark_file(bookmark_path):
-    """解析书签TXT文件"""
-    bookmarks = []
+def pair_batch_files(pdf_dir, bookmark_dir=None, mapping_path=None, pattern="{stem}.txt"):
+    """按命名规则或映射文件配对PDF与书签文件，返回 [(pdf_path, bookmark_path), ...]"""
+    if mapping_path:
+        # 映射文件：JSON对象 {"a.pdf": "a.txt"} 或每行 "a.pdf|a.txt"
+        base_dir = os.path.dirname(os.path.abspath(mapping_path))
+        with open(mapping_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if content.lstrip().startswith('{'):
+            items = json.loads(content).items()
+        else:
+            items = []
+            for line in content.splitlines():
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                pdf, _, txt = line.partition('|')
+                items.append((pdf.strip(), txt.strip()))
+        pdf_root = pdf_dir or base_dir
+        txt_root = bookmark_dir or pdf_root
+        return [(os.path.join(pdf_root, pdf), os.path.join(txt_root, txt)) for pdf, txt in items]
+
+    # 命名规则：{stem} 为PDF文件名（不含扩展名）
+    txt_root = bookmark_dir or pdf_dir
+    pairs = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if not name.lower().endswith('.pdf'):
+            continue
+        stem = os.path.splitext(name)[0]
+        pairs.append((os.path.join(pdf_dir, name), os.path.join(txt_root, pattern.format(stem=stem))))
+    return pairs
+
+
+def _apply_bookmarks_worker(pdf_path, bookmark_path, update=False, offset=None, profile=None):
+    """批处理子进程：应用书签并捕获输出"""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        if not os.path.exists(bookmark_path):
+            print(f"书签文件不存在: {bookmark_path}")
+            ok = False
+        else:
+            ok = apply_bookmarks(pdf_path, bookmark_path, update, offset=offset, profile=profile)
+    return pdf_path, ok, buffer.getvalue().strip()
+
+
+def batch_apply_bookmarks(pdf_dir, bookmark_dir=None, mapping_path=None, pattern="{stem}.txt", workers=None,
+                          update=False, offset=None, profile=None):
+    """批量应用书签，使用进程池并行处理，返回失败的文件列表"""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
     try:
-        with open(bookmark_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-
-            # 解析层级和标题
-            level = 0
-            title = ""
-            page = 1
-
-            # 尝试匹配不同格式
-            # 格式1: 层级|标题|页码
-            if '|' in line:
-                parts = line.split('|')
-                if len(parts) >= 3:
-                    level = int(parts[0].strip())  # 保持1基索引（PyMuPDF要求）
-                    title = parts[1].strip()
-                    page = int(parts[2].strip())  # 页码保持1基索引（PyMuPDF要求）
-            # 格式2: 标题 (页码)
-            elif '(' in line and ')' in line:
-                # 找到最后一个括号对
-                paren_start = line.rfind('(')
-                paren_end = line.rfind(')')
-                if paren_start < paren_end:
-                    title = line[:paren_start].strip()
-                    page_str = line[paren_start + 1:paren_end].strip()
-                    page = int(page_str)  # 页码保持1基索引（PyMuPDF要求）
-                    level = 1  # 默认层级为1
-            # 格式3: 缩进表示层级
-            else:
-                # 计算缩进层级
-                indent_count = 0
-                for char in line:
-                    if char == ' ':
-                        indent_count += 1
-                    elif char == '\t':
-                        indent_count += 4
-                    else:
-                        break
-                level = (indent_count // 2) + 1  # 每2个空格为一级，从1开始
-                title = line.strip()
-
-                # 尝试从标题中提取页码
-                page_match = re.search(r'\((\d+)\)$', title)
-                if page_match:
-                    page = int(page_match.group(1))
-                    title = title[:page_match.start()].strip()
-                else:
-                    page = 1  # 默认第一页
-
-            if title:  # 只有当标题不为空时才添加
-                bookmarks.append([level, title, page])
+        with instrument.stage("pair"):
+            pairs = pair_batch_files(pdf_dir, bookmark_dir, mapping_path, pattern)
+    except Exception as e:
+        print(f"配对书签文件失败: {str(e)}")
+        return None
 
+    if not pairs:
+        print("未找到需要处理的PDF文件")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    print(f"共 {len(pairs)} 个文件，使用 {workers} 个进程处理...")
+
+    failed = []
+    with instrument.stage("apply"), ProcessPoolExecutor(max_workers=min(workers, len(pairs))) as executor:
+        futures = {executor.submit(_apply_bookmarks_worker, pdf, txt, update, offset, profile): pdf
+                   for pdf, txt in pairs}
+        for future in as_completed(futures):
+            try:
+                pdf_path, ok, message = future.result()
+            except Exception as e:
+                # 工作进程异常退出（如BrokenProcessPool）时没有返回值，按提交时的文件报告
+                pdf_path, ok, message = futures[future], False, str(e) or type(e).__name__
+            status = "成功" if ok else "失败"
+            last_line = message.splitlines()[-1] if message else ""
+            print(f"[{status}] {pdf_path}: {last_line}")
+            if not ok:
+                failed.append(pdf_path)
+
+    print(f"\n批处理完成: 成功 {len(pairs) - len(failed)} 个，失败 {len(failed)} 个")
+    for pdf_path in failed:
+        print(f"  失败: {pdf_path}")
+    return failed
+
+
+def parse_bookmark_file(bookmark_path):
+    """解析书签TXT文件，格式错误的行会被跳过并输出行号"""
+    try:
+        bookmarks, diagnostics = bookmark_parser.parse_bookmark_file(bookmark_path)
+        for diagnostic in diagnostics:
+            print(f"跳过无效书签 {diagnostic}")
         return bookmarks
     except Exception as e:
         print(f"解析书签文件失败: {str(e)}")
@@ -236,12 +325,13 @@ def view_pdf_bookmarks(pdf_path):
     """查看PDF书签信息"""
     doc = None
     try:
-        doc = pymupdf.open(pdf_path)
+        doc = open_pdf(pdf_path)
 
         # 获取PDF书签
         toc = []
         try:
-            toc = doc.get_toc() # type: ignore
+            with instrument.stage("get_toc"):
+                toc = doc.get_toc() # type: ignore
         except (AttributeError, Exception):
             try:
                 toc = doc.get_toc() # type: ignore
@@ -273,11 +363,12 @@ def view_pdf_bookmarks(pdf_path):
             return False
 
         # 格式化书签信息
-        print("PDF书签信息：\n")
+        with instrument.stage("print"):
+            print("PDF书签信息：\n")
 
-        for i, (level, title, page) in enumerate(toc, 1):
-            indent = "  " * (level - 1)  # 根据层级计算缩进
-            print(f"{i:2d}. {indent}{title} (第{page}页)")
+            for i, (level, title, page) in enumerate(toc, 1):
+                indent = "  " * (level - 1)  # 根据层级计算缩进
+                print(f"{i:2d}. {indent}{title} (第{page}页)")
 
         print(f"\n总计: {len(toc)} 个书签")
         return True
@@ -288,11 +379,198 @@ def view_pdf_bookmarks(pdf_path):
     finally:
         if doc is not None:
             try:
-                doc.close()
+                close_pdf(doc)
             except Exception:
                 pass
 
 
+def autogen_bookmarks(pdf_path, output_path=None, max_levels=3, workers=None, use_index=True):
+    """根据字号自动识别标题，生成书签TXT文件"""
+    import autogen
+
+    try:
+        instrument.count_file_read(pdf_path)
+        with instrument.stage("generate"):
+            bookmarks = autogen.generate_bookmarks(pdf_path, max_levels, workers, use_index)
+        if not bookmarks:
+            print("未识别到标题，无法生成书签")
+            return False
+
+        # 如果未指定输出路径，自动生成
+        if not output_path:
+            original_dir = os.path.dirname(pdf_path)
+            original_basename = os.path.splitext(os.path.basename(pdf_path))[0]
+            output_path = os.path.join(original_dir, f"{original_basename}_书签.txt")
+
+        with instrument.stage("write"):
+            autogen.write_bookmark_file(bookmarks, output_path)
+        instrument.count_written(os.path.getsize(output_path))
+        print(f"成功生成 {len(bookmarks)} 个书签，保存至: {output_path}")
+        return True
+
+    except Exception as e:
+        print(f"自动生成书签失败: {str(e)}")
+        return False
+
+
+def verify_bookmarks(pdf_path, bookmark_path, offset=None, output_path=None, workers=None, use_index=True):
+    """检查每个书签标题是否出现在目标页上，输出不匹配的书签和建议页码
+
+    指定output_path时按建议页码写出修正后的书签文件。全部匹配时返回True。
+    """
+    import verify
+    import autogen
+
+    try:
+        with instrument.stage("parse"):
+            bookmarks = parse_bookmark_file(bookmark_path)
+        if not bookmarks:
+            print("书签文件格式错误或为空")
+            return False
+
+        doc = open_pdf(pdf_path)
+        try:
+            if offset is not None:
+                with instrument.stage("offset"):
+                    bookmarks = adjust_bookmark_pages(doc, bookmarks, offset)
+            page_count = doc.page_count
+        finally:
+            close_pdf(doc)
+
+        with instrument.stage("verify"):
+            results = verify.verify_bookmarks(pdf_path, bookmarks, page_count, workers=workers, use_index=use_index)
+        mismatched = [r for r in results if not r.ok]
+        print(f"校验 {len(results)} 个书签: 匹配 {len(results) - len(mismatched)} 个，不匹配 {len(mismatched)} 个")
+        for result in mismatched:
+            print(f"  {result}")
+
+        shift = verify.common_shift(results)
+        if shift:
+            print(f"多数不匹配的书签相差 {shift:+d} 页，书签页码可能整体偏移")
+
+        if output_path:
+            corrected = [[r.level, r.title, r.suggestion or r.page] for r in results]
+            with instrument.stage("write"):
+                autogen.write_bookmark_file(corrected, output_path)
+            instrument.count_written(os.path.getsize(output_path))
+            print(f"修正后的书签已保存至: {output_path}")
+        return not mismatched
+
+    except Exception as e:
+        print(f"校验书签失败: {str(e)}")
+        return False
+
+
+def merge_pdfs(inputs, output_path, titles=None, profile=None):
+    """按顺序合并多个PDF，每个输入的书签挂在以文件名命名的顶级书签下"""
+    import merge
+    from save_engine import format_size
+
+    missing = [path for path in inputs if not os.path.isfile(path)]
+    if missing:
+        print(f"输入文件不存在: {', '.join(missing)}")
+        return False
+    try:
+        def progress(done, total):
+            if done % 50 == 0 or done == total:
+                print(f"已合并 {done}/{total} 个文件")
+
+        started = time.perf_counter()
+        with instrument.stage("merge"):
+            page_count, entry_count = merge.merge_pdfs(inputs, output_path, titles, progress, profile)
+        print(f"成功合并 {len(inputs)} 个文件，共 {page_count} 页、{entry_count} 个书签，保存至: {output_path}"
+              f"（{format_size(os.path.getsize(output_path))}，耗时 {time.perf_counter() - started:.2f} 秒）")
+        return True
+    except Exception as e:
+        print(f"合并PDF失败: {str(e)}")
+        return False
+
+
+def split_pdf(pdf_path, output_dir=None, level=1, bookmark_path=None, offset=None, workers=None, profile=None):
+    """按第level级书签将PDF拆分为多个文件，书签默认取自PDF本身，也可以使用书签TXT文件"""
+    import split
+    from save_engine import format_size
+
+    try:
+        doc = open_pdf(pdf_path)
+        try:
+            if bookmark_path:
+                with instrument.stage("parse"):
+                    toc = parse_bookmark_file(bookmark_path)
+                if offset is not None:
+                    with instrument.stage("offset"):
+                        toc = adjust_bookmark_pages(doc, toc, offset)
+            else:
+                with instrument.stage("get_toc"):
+                    toc = doc.get_toc(simple=True)
+            page_count = doc.page_count
+        finally:
+            close_pdf(doc)
+
+        with instrument.stage("plan"):
+            sections = split.plan_sections(toc, level, page_count)
+        if not sections:
+            print(f"没有第{level}级书签，无法拆分")
+            return False
+
+        if not output_dir:
+            original_dir = os.path.dirname(pdf_path)
+            original_basename = os.path.splitext(os.path.basename(pdf_path))[0]
+            output_dir = os.path.join(original_dir, f"{original_basename}_拆分")
+
+        def progress(done, total):
+            print(f"已写出 {done}/{total} 个文件")
+
+        print(f"共 {len(sections)} 个章节，开始拆分...")
+        started = time.perf_counter()
+        with instrument.stage("write"):
+            paths = split.split_pdf(pdf_path, sections, output_dir, workers, progress, profile)
+        total_size = sum(os.path.getsize(path) for path in paths)
+        instrument.count_written(total_size)
+        print(f"成功拆分为 {len(paths)} 个文件，保存至: {output_dir}"
+              f"（共 {format_size(total_size)}，耗时 {time.perf_counter() - started:.2f} 秒）")
+        return True
+
+    except Exception as e:
+        print(f"拆分PDF失败: {str(e)}")
+        return False
+
+
+def run_manifest(manifest_path, journal_path=None, workers=None):
+    """执行任务清单，全部任务成功时返回True"""
+    import manifest
+
+    try:
+        with instrument.stage("run"):
+            done, failed, skipped = manifest.run_manifest(manifest_path, journal_path, workers)
+    except manifest.ManifestError as e:
+        print(f"清单格式错误: {str(e)}")
+        return False
+    except Exception as e:
+        print(f"执行清单失败: {str(e)}")
+        return False
+    print(f"清单执行完成: 成功 {done} 个，失败 {failed} 个，跳过 {skipped} 个")
+    return not failed and not skipped
+
+
+def inventory_pdfs(roots, output_path=None, deep=False, workers=None, resume=False):
+    """遍历目录生成PDF清单（NDJSON），未指定output_path时输出到标准输出"""
+    import inventory
+
+    if resume and not output_path:
+        print("断点续传需要指定 --output", file=sys.stderr)
+        return False
+    try:
+        with instrument.stage("scan"):
+            processed, failed = inventory.run_inventory(roots, output_path, deep, workers, resume)
+    except Exception as e:
+        print(f"生成清单失败: {str(e)}", file=sys.stderr)
+        return False
+    # 统计信息输出到标准错误，不混入NDJSON
+    print(f"清单完成: 处理 {processed} 个文件，其中 {failed} 个无法读取", file=sys.stderr)
+    return True
+
+
 def show_ai_prompt():
     """显示AI提示词"""
     prompt_text = """请分析这个PDF文档，为我生成一个书签TXT文件。书签应该按照以下格式组织：
@@ -335,21 +613,191 @@ def show_ai_prompt():
     print(prompt_text)
 
 
+def offset_argument(value):
+    """--offset 参数：正整数或 auto"""
+    if value == 'auto':
+        return value
+    try:
+        offset = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("必须是正整数或 auto")
+    if offset < 1:
+        raise argparse.ArgumentTypeError("必须是正整数或 auto")
+    return offset
+
+
 def main():
     parser = argparse.ArgumentParser(description="PDF书签工具 - 命令行版本")
     parser.add_argument('--pdf', help='PDF文件路径')
     parser.add_argument('--bookmarks', help='书签TXT文件路径')
-    parser.add_argument('--operation', choices=['info', 'apply', 'extract', 'view', 'prompt'],
-                       help='操作类型: info(显示PDF信息), apply(应用书签), extract(提取页面), view(查看书签), prompt(显示AI提示词)')
-    parser.add_argument('--pages', help='要提取的页面范围 (例如: 1-5,8,10-12)')
-    parser.add_argument('--output', help='输出文件路径 (用于提取页面)')
+    parser.add_argument('--operation', choices=['info', 'apply', 'extract', 'view', 'prompt', 'batch', 'serve', 'client',
+                                                'autogen', 'verify', 'inventory', 'merge', 'split', 'watch', 'run-manifest'],
+                       help='操作类型: info(显示PDF信息), apply(应用书签), extract(提取页面), view(查看书签), prompt(显示AI提示词), '
+                            'batch(批量应用书签), serve(启动常驻服务), client(向常驻服务发送请求), '
+                            'autogen(按字号自动生成书签), verify(校验书签标题是否出现在目标页), '
+                            'inventory(遍历目录输出PDF清单), merge(合并PDF并合并书签), split(按书签拆分PDF), '
+                            'watch(监视目录，PDF与书签文件都写完后自动应用书签), run-manifest(按任务清单批量执行操作)')
+    parser.add_argument('--pages', help='要提取的页面范围 (例如: 1-5,8,10-12；也支持 5-、-10、last、-3-、odd、even、'
+                                        '1-20:2 和排除项 !50-60，详见 README_CLI.md)')
+    parser.add_argument('--output', help='输出文件路径 (用于提取页面和自动生成书签；应用书签时指定则写入新文件，不修改原PDF；'
+                                         '校验书签时写出修正后的书签文件；拆分时为输出目录)')
+    parser.add_argument('--pdf-dir', help='PDF文件目录 (用于批量应用书签和生成清单；合并时按文件名顺序合并目录中的PDF)')
+    parser.add_argument('--inputs', nargs='+', help='按顺序合并的PDF文件 (用于 merge)')
+    parser.add_argument('--input-list', help='合并列表文件，每行 "文件路径" 或 "文件路径|书签标题" (用于 merge)')
+    parser.add_argument('--bookmark-dir', help='书签TXT文件目录，默认与PDF目录相同 (用于批量应用书签)')
+    parser.add_argument('--mapping', help='PDF与书签的映射文件，JSON对象或每行 "a.pdf|a.txt" (用于批量应用书签)')
+    parser.add_argument('--pattern', default='{stem}.txt', help='书签文件命名规则，{stem}为PDF文件名 (默认: {stem}.txt)')
+    parser.add_argument('--workers', type=int, help='并行进程数，默认为CPU核心数')
+    parser.add_argument('--update', action='store_true',
+                       help='增量更新书签：只修改标题或页码变化的条目，层级结构变化时自动重建 (用于应用书签)')
+    parser.add_argument('--offset', type=offset_argument,
+                       help='印刷页码1所在的物理页码，书签页码按此换算；auto 表示从页眉页脚自动检测 (用于应用书签，'
+                            '以及按书签TXT文件拆分)')
+    parser.add_argument('--no-index', action='store_true',
+                       help='不使用页面文本索引，每次重新提取文本 (用于 autogen/verify；索引位置可用环境变量 PDF_BM_INDEX 指定)')
+    parser.add_argument('--deep', action='store_true',
+                       help='清单中包含需要读取页面内容的信息：文字层抽样、是否经过修复、附件数 (用于 inventory)')
+    parser.add_argument('--resume', action='store_true',
+                       help='跳过输出文件中已有记录的PDF并追加写入，用于中断后继续 (用于 inventory)')
+    parser.add_argument('--watch-dir', action='append',
+                       help='要监视的目录，可重复指定；未指定时监视 --pdf-dir (用于 watch)')
+    parser.add_argument('--manifest', help='任务清单文件，JSON或YAML (用于 run-manifest)')
+    parser.add_argument('--journal',
+                       help='任务日志文件，记录已完成的任务，重新运行时跳过 (用于 watch，默认: 第一个监视目录中的 '
+                            '.pdf_bm_watch.jsonl；用于 run-manifest，默认: 清单文件名加 .journal.jsonl)')
+    parser.add_argument('--poll', action='store_true',
+                       help='轮询目录而不使用inotify，用于网络共享等收不到文件系统事件的目录 (用于 watch)')
+    parser.add_argument('--settle', type=float, default=2.0,
+                       help='文件大小和修改时间保持不变多少秒后视为写完 (用于 watch，默认: 2)')
+    parser.add_argument('--split-level', type=int, default=1,
+                       help='按第几级书签拆分，每个该级书签输出一个文件 (用于 split，默认: 1)')
+    parser.add_argument('--save-profile', choices=['fast', 'balanced', 'smallest'],
+                       help='保存配置: fast(不压缩，最快), balanced(清理未引用对象并压缩), '
+                            'smallest(合并重复对象、压缩图片字体、使用对象流，最慢) '
+                            '(用于 apply/batch/extract/split/merge；应用书签时选择 balanced/smallest 会完整重写文件)')
+    parser.add_argument('--levels', type=int, default=3, help='自动生成书签的最大层级数 (默认: 3)')
+    parser.add_argument('--socket', help='常驻服务的Unix套接字路径 (用于 serve/client，默认位于系统临时目录)')
+    parser.add_argument('--cache', action='store_true', help='常驻服务在请求之间复用已打开的文档 (用于 serve)')
+    parser.add_argument('--method', choices=['info', 'view', 'apply', 'extract', 'ping'],
+                       help='客户端请求的操作 (用于 client)')
+    parser.add_argument('--profile', action='store_true',
+                       help='性能剖析：操作结束后将各阶段耗时、读写字节数和峰值内存以JSON输出到标准错误 '
+                            '(用于 client 时由服务进程剖析该请求)')
+    parser.add_argument('--profile-output', help='将性能剖析结果追加写入该文件（每次一行JSON），而不是标准错误')
+    parser.add_argument('--pstats', help='性能剖析时同时运行cProfile，并将统计数据保存到该文件 (可用 python -m pstats 查看)')
 
     args = parser.parse_args()
+    profiling = args.profile or args.profile_output or args.pstats
+    if profiling and args.operation == 'serve':
+        parser.error("serve 操作不支持性能剖析，请在 client 请求中指定 --profile，由服务进程剖析单个请求")
+    if args.pstats and args.operation == 'client':
+        parser.error("--pstats 不能用于 client 操作")
+    if not profiling or args.operation == 'client':
+        run_operation(parser, args)
+        return
+
+    profiler = instrument.Profiler(args.operation, args.pstats)
+    try:
+        with profiler:
+            # 单独计时PyMuPDF的导入，不计入第一个打开文档的阶段
+            if args.operation not in (None, 'prompt'):
+                with instrument.stage("import"):
+                    import pymupdf  # noqa: F401
+            run_operation(parser, args)
+    finally:
+        profiler.write(args.profile_output)
+
 
+def run_operation(parser, args):
+    """执行命令行参数指定的操作"""
     if args.operation == 'prompt':
         show_ai_prompt()
         return
 
+    if args.operation in ('serve', 'client'):
+        import server
+        socket_path = args.socket or server.DEFAULT_SOCKET
+        if args.operation == 'serve':
+            ok = server.serve(socket_path, args.workers, args.cache)
+        else:
+            if not args.method:
+                parser.error("--method 参数是必需的用于 client 操作")
+            # 服务进程的工作目录可能不同，路径统一转换为绝对路径
+            params = {key: os.path.abspath(value) for key, value in
+                      (('pdf', args.pdf), ('bookmarks', args.bookmarks), ('output', args.output)) if value}
+            if args.pages:
+                params['pages'] = args.pages
+            if args.update:
+                params['update'] = True
+            if args.offset is not None:
+                params['offset'] = args.offset
+            if args.save_profile:
+                params['profile'] = args.save_profile
+            if args.profile or args.profile_output:
+                params['instrument'] = True
+            ok = server.run_client(socket_path, args.method, params, args.profile_output)
+        if not ok:
+            sys.exit(1)
+        return
+
+    if args.operation == 'batch':
+        if not args.pdf_dir and not args.mapping:
+            parser.error("--pdf-dir 或 --mapping 参数是必需的用于 batch 操作")
+        failed = batch_apply_bookmarks(args.pdf_dir, args.bookmark_dir, args.mapping, args.pattern, args.workers,
+                                       args.update, args.offset, args.save_profile)
+        if failed is None or failed:
+            sys.exit(1)
+        return
+
+    if args.operation == 'merge':
+        import merge
+        titles = None
+        if args.input_list:
+            inputs, titles = merge.read_input_list(args.input_list)
+        elif args.inputs:
+            inputs = args.inputs
+        elif args.pdf_dir:
+            inputs = [os.path.join(args.pdf_dir, name) for name in sorted(os.listdir(args.pdf_dir))
+                      if name.lower().endswith('.pdf')]
+        else:
+            parser.error("--inputs、--input-list 或 --pdf-dir 参数是必需的用于 merge 操作")
+        if not args.output:
+            parser.error("--output 参数是必需的用于 merge 操作")
+        if not inputs:
+            print("没有需要合并的PDF文件")
+            sys.exit(1)
+        if not merge_pdfs(inputs, args.output, titles, args.save_profile):
+            sys.exit(1)
+        return
+
+    if args.operation == 'watch':
+        import watch
+        directories = args.watch_dir or ([args.pdf_dir] if args.pdf_dir else [])
+        if not directories:
+            parser.error("--watch-dir 或 --pdf-dir 参数是必需的用于 watch 操作")
+        missing = [directory for directory in directories if not os.path.isdir(directory)]
+        if missing:
+            print(f"目录不存在: {', '.join(missing)}")
+            sys.exit(1)
+        watch.run_watch(directories, args.bookmark_dir, args.pattern, args.workers, args.update, args.offset,
+                        args.save_profile, args.journal, args.poll, args.settle)
+        return
+
+    if args.operation == 'run-manifest':
+        if not args.manifest:
+            parser.error("--manifest 参数是必需的用于 run-manifest 操作")
+        if not run_manifest(args.manifest, args.journal, args.workers):
+            sys.exit(1)
+        return
+
+    if args.operation == 'inventory':
+        roots = [path for path in (args.pdf_dir, args.pdf) if path]
+        if not roots:
+            parser.error("--pdf-dir 或 --pdf 参数是必需的用于 inventory 操作")
+        if not inventory_pdfs(roots, args.output, args.deep, args.workers, args.resume):
+            sys.exit(1)
+        return
+
     if not args.pdf and args.operation != 'prompt':
         parser.error("--pdf 参数是必需的，除非操作是 prompt")
 
@@ -359,19 +807,35 @@ def main():
     elif args.operation == 'apply':
         if not args.bookmarks:
             parser.error("--bookmarks 参数是必需的用于 apply 操作")
-        if not apply_bookmarks(args.pdf, args.bookmarks):
+        if not apply_bookmarks(args.pdf, args.bookmarks, args.update, args.output, args.offset, args.save_profile):
             sys.exit(1)
     elif args.operation == 'extract':
         if not args.pages:
             parser.error("--pages 参数是必需的用于 extract 操作")
-        if not extract_pages(args.pdf, args.pages, args.output):
+        if not extract_pages(args.pdf, args.pages, args.output, args.save_profile):
             sys.exit(1)
     elif args.operation == 'view':
         if not view_pdf_bookmarks(args.pdf):
             sys.exit(1)
+    elif args.operation == 'autogen':
+        if not autogen_bookmarks(args.pdf, args.output, args.levels, args.workers, not args.no_index):
+            sys.exit(1)
+    elif args.operation == 'verify':
+        if not args.bookmarks:
+            parser.error("--bookmarks 参数是必需的用于 verify 操作")
+        if not verify_bookmarks(args.pdf, args.bookmarks, args.offset, args.output, args.workers,
+                                not args.no_index):
+            sys.exit(1)
+    elif args.operation == 'split':
+        if not split_pdf(args.pdf, args.output, args.split_level, args.bookmarks, args.offset, args.workers,
+                         args.save_profile):
+            sys.exit(1)
     else:
         parser.print_help()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 打包后的程序中，进程池的工作进程需要此调用才能正常启动
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
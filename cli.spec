@@ -0,0 +1,46 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 命令行版本的轻量打包配置：不包含Qt，使用onedir（不必每次启动解压）且不使用UPX，以缩短启动时间
+# 用法: pyinstaller cli.spec
+
+
+a = Analysis(
+    ['cli.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=['pymupdf'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['PySide6', 'shiboken6', 'tkinter', 'unittest', 'pydoc', 'doctest'],
+    noarchive=False,
+    optimize=2,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='pdf_bm_cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='pdf_bm_cli',
+)
@@ -0,0 +1,79 @@
+"""
+PDF书签工具 - 文档缓存
+按路径缓存已打开的PDF文档，文件修改时间或大小变化时自动重新打开
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pymupdf
+
+import instrument
+
+
+class DocumentCache:
+    """已打开PDF文档的LRU缓存
+
+    缓存键为绝对路径，并以 (mtime_ns, size) 校验文件是否被外部修改。
+    总大小按文件字节数估算，超过max_bytes或max_entries时淘汰最久未使用的文档。
+    缓存返回的文档由缓存负责关闭，调用方不要自行close；写入文件后应调用invalidate。
+    """
+
+    def __init__(self, max_entries=4, max_bytes=1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> (signature, doc)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def open(self, path):
+        """返回path对应的已打开文档，必要时重新打开"""
+        key = os.path.abspath(path)
+        signature = self._signature(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_signature, doc = entry
+                if cached_signature == signature and not doc.is_closed:
+                    self._entries.move_to_end(key)
+                    return doc
+                self._close_entry(key)
+
+            doc = pymupdf.open(key)
+            instrument.count_read(signature[1])
+            self._entries[key] = (signature, doc)
+            self._evict()
+            return doc
+
+    def invalidate(self, path):
+        """关闭并移除path对应的缓存文档，在写入该文件后调用"""
+        with self._lock:
+            self._close_entry(os.path.abspath(path))
+
+    def clear(self):
+        """关闭所有缓存文档"""
+        with self._lock:
+            for key in list(self._entries):
+                self._close_entry(key)
+
+    def _total_bytes(self):
+        return sum(signature[1] for signature, _ in self._entries.values())
+
+    def _evict(self):
+        # 始终保留最近打开的文档，即使它本身超过内存上限
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                          or self._total_bytes() > self.max_bytes):
+            self._close_entry(next(iter(self._entries)))
+
+    def _close_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            try:
+                entry[1].close()
+            except Exception:
+                pass
@@ -0,0 +1,222 @@
+"""
+PDF书签工具 - 性能剖析
+记录一次操作中各阶段的耗时、读写的字节数和峰值内存，结果输出为JSON，可选保存cProfile统计；
+未启用剖析时各记录函数直接返回，只用到标准库，不影响命令行版本的启动速度
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+# 每个线程当前的剖析器，GUI的后台任务与主线程互不干扰
+_local = threading.local()
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def peak_rss_kb():
+    """返回当前进程的峰值常驻内存（KB）"""
+    try:
+        import resource
+    except ImportError:
+        # Windows: 通过GetProcessMemoryInfo读取PeakWorkingSetSize
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize // 1024
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS返回字节，Linux返回KB
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def children_peak_rss_kb():
+    """已结束的子进程（如进程池工作进程）中最大的峰值常驻内存（KB），Windows上返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def _reset_peak_rss():
+    """重置进程的峰值内存记录（Linux 4.0+），使峰值只反映本次操作；不支持时返回False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:.1f} 毫秒" if seconds < 1 else f"{seconds:.2f} 秒"
+
+
+class Profiler:
+    """一次操作的剖析记录，用作上下文管理器，在同一线程中生效
+
+    阶段可以嵌套，嵌套阶段的名称以 / 连接，如 save/incremental；同名阶段多次进入时累加耗时与次数。
+    指定pstats_path时同时运行cProfile，结束时将统计写入该文件（可用 python -m pstats 查看）。
+    """
+
+    def __init__(self, operation, pstats_path=None):
+        self.operation = operation
+        self.pstats_path = pstats_path
+        self.stages = {}  # 阶段名称 -> [耗时, 次数]
+        self.notes = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.ok = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_kb = None
+        self.children_peak_rss_kb = None
+        self._stack = []
+        self._profile = None
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'profiler', None)
+        _local.profiler = self
+        self._rss_reset = _reset_peak_rss()
+        self._children_rss_before = children_peak_rss_kb()
+        if self.pstats_path:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.process_time() - self._cpu_started
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.pstats_path)
+        _local.profiler = self._previous
+        self.peak_rss_kb = peak_rss_kb()
+        children = children_peak_rss_kb()
+        # RUSAGE_CHILDREN是进程生命周期内的最大值，没有增长说明本次操作的子进程未超过之前的峰值
+        if children and children != self._children_rss_before:
+            self.children_peak_rss_kb = children
+        if self.ok is None:
+            self.ok = exc_type is None
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._stack.append(name)
+        # 进入时登记，阶段按首次进入的顺序排列，外层阶段在其嵌套阶段之前
+        entry = self.stages.setdefault("/".join(self._stack), [0.0, 0])
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[0] += time.perf_counter() - started
+            entry[1] += 1
+            self._stack.pop()
+
+    def report(self):
+        """剖析结果，可直接序列化为JSON"""
+        top_level = sum(seconds for name, (seconds, _) in self.stages.items() if "/" not in name)
+        report = {
+            "operation": self.operation,
+            "ok": self.ok,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "stages": [{"name": name, "seconds": round(seconds, 4), "count": count}
+                       for name, (seconds, count) in self.stages.items()],
+            # 不属于任何阶段的耗时，如模块导入和输出
+            "unstaged_seconds": round(max(self.wall_seconds - top_level, 0.0), 4),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_kb": self.peak_rss_kb,
+            # operation: 本次操作期间的峰值；process: 进程启动以来的峰值（无法重置峰值记录的平台）
+            "peak_rss_scope": "operation" if self._rss_reset else "process",
+        }
+        if self.children_peak_rss_kb is not None:
+            report["children_peak_rss_kb"] = self.children_peak_rss_kb
+        if self.notes:
+            report["notes"] = self.notes
+        if self.pstats_path:
+            report["pstats"] = self.pstats_path
+        return report
+
+    def summary(self):
+        """单行文字摘要，用于GUI状态栏"""
+        from save_engine import format_size
+
+        stages = "，".join(f"{name} {_format_seconds(seconds)}" for name, (seconds, _) in self.stages.items())
+        text = (f"耗时 {_format_seconds(self.wall_seconds)}（{stages or '无阶段记录'}）；"
+                f"读取 {format_size(self.bytes_read)}，写入 {format_size(self.bytes_written)}；"
+                f"峰值内存 {format_size(self.peak_rss_kb * 1024)}")
+        if self.notes:
+            text += "；" + "，".join(f"{key}={value}" for key, value in self.notes.items())
+        return text
+
+    def write(self, output_path=None):
+        write_report(self.report(), output_path)
+
+
+def write_report(report, output_path=None):
+    """输出JSON结果：指定output_path时追加一行到该文件，否则写到标准错误"""
+    line = json.dumps(report, ensure_ascii=False)
+    if output_path:
+        with open(output_path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    elif sys.stderr is not None:
+        # 打包为无控制台的程序时没有标准错误
+        print(line, file=sys.stderr)
+
+
+def stage(name):
+    """记录一个阶段的耗时：with instrument.stage("open"): ..."""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+
+def count_read(size):
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.bytes_read += size
+
+
+def count_written(size):
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.bytes_written += size
+
+
+def count_file_read(path):
+    """按文件大小计入读取的字节数"""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        try:
+            profiler.bytes_read += os.path.getsize(path)
+        except OSError:
+            pass
+
+
+def note(key, value):
+    """附加一项说明，如实际使用的保存方式"""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.notes[key] = value
@@ -0,0 +1,177 @@
+"""
+PDF书签工具 - PDF清单
+遍历目录，在进程池中读取每个PDF的页数、元数据、加密状态和书签规模，每个文件输出一行JSON（NDJSON）；
+输出文件可断点续传，已记录的文件不再处理
+"""
+
+import json
+import os
+import sys
+import time
+
+
+# 每个任务处理的文件数，减少进程间通信次数
+BATCH_SIZE = 32
+# 每个工作进程同时排队的任务数
+QUEUE_DEPTH = 4
+# 详细模式下检查文字层时抽样的页数
+TEXT_SAMPLE_PAGES = 3
+PROGRESS_INTERVAL = 1000
+
+
+def iter_pdf_files(roots):
+    """逐个产出目录（递归）中的PDF文件路径，不预先收集整个列表"""
+    for root in roots:
+        # 使用绝对路径，续传时不受当前目录影响
+        root = os.path.abspath(root)
+        if os.path.isfile(root):
+            yield root
+            continue
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = sorted(entries, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+            # 倒序入栈，保持按名称顺序遍历
+            stack.extend(reversed(subdirs))
+
+
+def _outline_stats(doc):
+    """书签条目数和最大深度"""
+    toc = doc.get_toc(simple=True)
+    return len(toc), max((entry[0] for entry in toc), default=0)
+
+
+def _text_stats(doc):
+    """抽样检查文字层：返回 (抽样页数, 有文字的页数)"""
+    count = doc.page_count
+    if count == 0:
+        return 0, 0
+    samples = sorted({0, count // 2, count - 1})[:TEXT_SAMPLE_PAGES]
+    with_text = sum(1 for page_num in samples if doc[page_num].get_text("text").strip())
+    return len(samples), with_text
+
+
+def inspect_pdf(path, deep=False):
+    """读取单个PDF的清单记录；打不开的文件记录error字段而不是抛出异常"""
+    import pymupdf
+
+    record = {"path": path}
+    try:
+        stat = os.stat(path)
+        record["size"] = stat.st_size
+        record["mtime"] = int(stat.st_mtime)
+        with pymupdf.open(path) as doc:
+            record["encrypted"] = bool(doc.is_encrypted)
+            record["needs_password"] = bool(doc.needs_pass)
+            if doc.needs_pass:
+                # 没有密码时无法读取页数和书签
+                return record
+            record["pages"] = doc.page_count
+            metadata = doc.metadata or {}
+            record["version"] = metadata.get("format") or None
+            record["metadata"] = {key: value for key, value in metadata.items()
+                                  if value and key not in ("format", "encryption")}
+            record["outline_entries"], record["outline_depth"] = _outline_stats(doc)
+            if deep:
+                record["repaired"] = bool(doc.is_repaired)
+                record["text_sampled"], record["text_pages"] = _text_stats(doc)
+                record["embedded_files"] = doc.embfile_count()
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def inspect_batch(paths, deep=False):
+    """工作进程入口：处理一批文件"""
+    import pymupdf
+    # 损坏的文件会产生大量MuPDF警告，清单中只记录结果
+    pymupdf.TOOLS.mupdf_display_errors(False)
+    return [inspect_pdf(path, deep) for path in paths]
+
+
+def read_done_paths(output_path):
+    """读取已有输出中的文件路径；中断时写了一半的最后一行会被截掉"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_end = 0
+    with open(output_path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                break
+            valid_end += len(line)
+    if valid_end != os.path.getsize(output_path):
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_end)
+    return done
+
+
+def _batches(paths, done):
+    batch = []
+    for path in paths:
+        if path in done:
+            continue
+        batch.append(path)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_inventory(roots, output=None, deep=False, workers=None, resume=False):
+    """生成清单，返回 (处理的文件数, 出错的文件数)
+
+    output为None时写到标准输出；resume为True时跳过输出文件中已有的记录并追加写入。
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    done = read_done_paths(output) if output and resume else set()
+    out = open(output, 'a' if resume else 'w', encoding='utf-8') if output else sys.stdout
+    workers = workers or os.cpu_count() or 1
+    processed = failed = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = _batches(iter_pdf_files(roots), done)
+            in_flight = set()
+            while True:
+                # 按需遍历目录，排队的任务数有上限，内存占用与文件总数无关
+                for batch in batches:
+                    in_flight.add(executor.submit(inspect_batch, batch, deep))
+                    if len(in_flight) >= workers * QUEUE_DEPTH:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for record in future.result():
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        processed += 1
+                        failed += "error" in record
+                        if processed % PROGRESS_INTERVAL == 0:
+                            elapsed = time.perf_counter() - started
+                            print(f"已处理 {processed} 个文件（{processed / elapsed:.0f} 个/秒）", file=sys.stderr)
+                # 每批结果写完后刷新，中断时最多丢失正在处理的批次
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return processed, failed
@@ -1,12 +1,38 @@
 import sys
 import os
+import multiprocessing
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QLabel, QFileDialog,
                                QTextEdit, QLineEdit, QMessageBox, QGroupBox,
-                               QFormLayout, QDialog)
-from PySide6.QtGui import QDragEnterEvent, QDropEvent
+                               QFormLayout, QDialog, QProgressBar, QCheckBox, QTreeView,
+                               QAbstractItemView, QPlainTextEdit, QListWidget, QListWidgetItem,
+                               QSplitter, QListView, QScrollArea, QComboBox)
+from PySide6.QtCore import Qt, QThreadPool, QTimer, Slot
+from PySide6.QtGui import QDragEnterEvent, QDropEvent, QColor, QTextCursor, QTextFormat, QImage, QPixmap
 import pymupdf
-import re
+import shutil
+from page_range import insert_page_runs, parse_page_range, PageRangeError
+import bookmark_parser
+import instrument
+from doc_cache import DocumentCache
+from workers import Worker
+from outline_patch import patch_toc
+from save_engine import save_document, atomic_save, ReplaceError
+from offset_detect import detect_page_mapping
+from outline_model import OutlineTree, OutlineModel
+from thumbnails import PageRenderer, PixmapCache, ThumbnailModel, THUMB_SIZE, THUMB_WIDTH
+
+
+# 过滤结果不超过该条数时自动展开全部匹配项
+FILTER_EXPAND_LIMIT = 500
+# 预览图按该宽度的整数倍渲染，避免窗口缩放时产生过多不同尺寸
+PREVIEW_WIDTH_STEP = 100
+# 编辑器停止输入多久后开始校验（毫秒）
+VALIDATE_DELAY_MS = 300
+# 保存配置下拉框的选项：(显示名称, 配置名)
+SAVE_PROFILE_CHOICES = (("快速（不压缩）", "fast"), ("均衡", "balanced"), ("最小体积（最慢）", "smallest"))
+# 编辑器中最多列出和标记的问题数
+MAX_LISTED_DIAGNOSTICS = 500
 
 
 class PDFBookmarkTool(QMainWindow):
@@ -14,12 +40,25 @@ class PDFBookmarkTool(QMainWindow):
         super().__init__()
         self.pdf_path = ""
         self.bookmark_path = ""
+        self.doc_cache = DocumentCache()  # 缓存已打开的PDF，避免每次操作重新打开
+        # PyMuPDF文档对象不是线程安全的，后台任务串行执行
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(1)
+        self.worker = None
+        self.worker_callbacks = None
+        self.worker_profiler = None  # 启用性能剖析时当前后台任务的Profiler
+        self.page_mapping = None  # 自动检测到的页码对应关系 (PDF路径, PageMapping)
+        # 页面缩略图与预览：渲染在工作进程中进行，像素图缓存有内存上限
+        self.pixmap_cache = PixmapCache()
+        self.page_renderer = PageRenderer(parent=self)
+        self.page_renderer.rendered.connect(self.on_page_rendered)
+        self.preview_page = None
         self.init_ui()
 
     def init_ui(self):
         """初始化用户界面"""
         self.setWindowTitle("PDF书签工具")
-        self.setGeometry(100, 100, 800, 600)
+        self.setGeometry(100, 100, 1000, 700)
         self.setAcceptDrops(True)  # 启用拖拽功能
 
         # 创建中央窗口部件
@@ -52,10 +91,58 @@ class PDFBookmarkTool(QMainWindow):
         # PDF信息显示区域
         info_group = QGroupBox("PDF信息")
         info_layout = QVBoxLayout()
+        info_panel = QWidget()
+        panel_layout = QVBoxLayout(info_panel)
+        panel_layout.setContentsMargins(0, 0, 0, 0)
 
         self.info_text = QTextEdit()
         self.info_text.setReadOnly(True)
-        info_layout.addWidget(self.info_text)
+        panel_layout.addWidget(self.info_text)
+
+        # 书签树：懒加载模型，只为可见行创建数据，大型书签也能立即显示
+        self.outline_filter = QLineEdit()
+        self.outline_filter.setPlaceholderText("输入关键字过滤书签标题")
+        self.outline_filter.setClearButtonEnabled(True)
+        self.outline_filter.setVisible(False)
+        self.outline_filter_timer = QTimer(self)
+        self.outline_filter_timer.setSingleShot(True)
+        self.outline_filter_timer.setInterval(150)
+        self.outline_filter_timer.timeout.connect(self.apply_outline_filter)
+        self.outline_filter.textChanged.connect(self.outline_filter_timer.start)
+        self.outline_model = OutlineModel(parent=self)
+        self.outline_view = QTreeView()
+        self.outline_view.setModel(self.outline_model)
+        self.outline_view.setUniformRowHeights(True)
+        self.outline_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.outline_view.setVisible(False)
+        self.outline_view.clicked.connect(self.on_outline_clicked)
+        panel_layout.addWidget(self.outline_filter)
+        panel_layout.addWidget(self.outline_view)
+
+        # 缩略图列表：只有滚动到可见区域的页面才会渲染
+        self.thumbnail_model = ThumbnailModel(self.page_renderer, self.pixmap_cache, self)
+        self.thumbnail_view = QListView()
+        self.thumbnail_view.setModel(self.thumbnail_model)
+        self.thumbnail_view.setUniformItemSizes(True)
+        self.thumbnail_view.setIconSize(THUMB_SIZE)
+        self.thumbnail_view.setFixedWidth(THUMB_WIDTH + 40)
+        self.thumbnail_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.thumbnail_view.clicked.connect(lambda index: self.show_preview(index.row()))
+
+        # 预览：先放大显示缩略图，清晰的预览图渲染完成后替换
+        self.preview_label = QLabel("点击缩略图或书签预览页面")
+        self.preview_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview_area = QScrollArea()
+        self.preview_area.setWidget(self.preview_label)
+        self.preview_area.setWidgetResizable(True)
+
+        splitter = QSplitter()
+        splitter.addWidget(info_panel)
+        splitter.addWidget(self.thumbnail_view)
+        splitter.addWidget(self.preview_area)
+        splitter.setStretchFactor(0, 2)
+        splitter.setStretchFactor(2, 3)
+        info_layout.addWidget(splitter)
 
         info_group.setLayout(info_layout)
         main_layout.addWidget(info_group)
@@ -68,6 +155,10 @@ class PDFBookmarkTool(QMainWindow):
         extract_layout = QVBoxLayout()
         extract_label = QLabel("页面提取（例如：1-5,8,10-12）:")
         self.extract_input = QLineEdit()
+        self.extract_input.setToolTip("逗号分隔多个范围：\n"
+                                      "5- 第5页到最后一页，-10 第1到10页，last 最后一页\n"
+                                      "-3- 最后3页（负数从末尾倒数），odd/even 奇数页/偶数页\n"
+                                      "1-20:2 每2页取一页，!50-60 排除第50到60页")
         self.extract_button = QPushButton("提取页面")
         self.extract_button.clicked.connect(self.extract_pages)
 
@@ -89,10 +180,17 @@ class PDFBookmarkTool(QMainWindow):
         self.offset_input = QLineEdit()
         self.offset_input.setText("0")
         offset_label = QLabel("页码偏移量：")
+        self.detect_offset_button = QPushButton("自动检测")
+        self.detect_offset_button.setToolTip("从页眉页脚中的印刷页码检测正文第1页所在的物理页码")
+        self.detect_offset_button.clicked.connect(self.detect_offset)
 
         bookmark_layout.addWidget(self.bookmark_button_apply)
         bookmark_layout.addWidget(offset_label)
         bookmark_layout.addWidget(self.offset_input)
+        bookmark_layout.addWidget(self.detect_offset_button)
+        self.update_toc_checkbox = QCheckBox("只更新变化的书签")
+        self.update_toc_checkbox.setChecked(True)
+        bookmark_layout.addWidget(self.update_toc_checkbox)
         bookmark_layout.addWidget(self.bookmark_view_button)
         bookmark_layout.addWidget(self.edit_bookmark_button)
 
@@ -102,6 +200,22 @@ class PDFBookmarkTool(QMainWindow):
         self.prompt_button.clicked.connect(self.show_ai_prompt)
         prompt_layout.addWidget(self.prompt_button)
 
+        # 保存配置：提取页面和应用书签时使用
+        self.save_profile_combo = QComboBox()
+        for label, profile in SAVE_PROFILE_CHOICES:
+            self.save_profile_combo.addItem(label, profile)
+        self.save_profile_combo.setToolTip("快速：不压缩，应用书签时增量保存\n"
+                                           "均衡：清理未引用的对象并压缩内容流\n"
+                                           "最小体积：合并重复对象、压缩图片和字体，耗时最长；应用书签时完整重写文件")
+        prompt_layout.addWidget(QLabel("保存配置："))
+        prompt_layout.addWidget(self.save_profile_combo)
+
+        # 性能剖析：后台任务结束后在状态信息中显示各阶段耗时，JSON结果输出到标准错误
+        self.instrument_checkbox = QCheckBox("性能剖析")
+        self.instrument_checkbox.setToolTip("记录每个操作各阶段的耗时、读写字节数和峰值内存，\n"
+                                            "结束后显示在状态信息中，同时以JSON输出到标准错误")
+        prompt_layout.addWidget(self.instrument_checkbox)
+
         button_layout.addLayout(extract_layout)
         button_layout.addLayout(bookmark_layout)
         button_layout.addLayout(prompt_layout)
@@ -118,6 +232,17 @@ class PDFBookmarkTool(QMainWindow):
         self.status_text.setMaximumHeight(100)
         status_layout.addWidget(self.status_text)
 
+        # 后台任务进度与取消
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_task)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        status_layout.addLayout(progress_layout)
+
         status_group.setLayout(status_layout)
         main_layout.addWidget(status_group)
 
@@ -171,27 +296,139 @@ class PDFBookmarkTool(QMainWindow):
             self.bookmark_path = file_path
             self.bookmark_label.setText(f"书签文件: {os.path.basename(file_path)}")
 
+    def run_task(self, description, task, on_finished, on_failed=None, on_cancelled=None):
+        """在线程池中执行task(worker)，完成后在主线程调用on_finished(result)"""
+        if self.worker is not None:
+            self.status_text.setText("有操作正在进行，请等待完成或取消")
+            return False
+
+        profiler = None
+        if self.instrument_checkbox.isChecked():
+            # 在后台线程中进入Profiler，只记录该任务的阶段
+            profiler = instrument.Profiler(description.removeprefix("正在").rstrip("."))
+
+            def profiled(worker, task=task):
+                with profiler:
+                    return task(worker)
+            task = profiled
+
+        worker = Worker(task)
+        worker.signals.progress.connect(self.on_task_progress)
+        worker.signals.finished.connect(self.on_task_finished)
+        worker.signals.failed.connect(self.on_task_failed)
+        worker.signals.cancelled.connect(self.on_task_cancelled)
+        self.worker = worker
+        self.worker_callbacks = (on_finished, on_failed, on_cancelled)
+        self.worker_profiler = profiler
+
+        self.set_busy(True)
+        self.status_text.setText(description)
+        self.thread_pool.start(worker)
+        return True
+
+    def set_busy(self, busy):
+        """切换后台任务运行状态：禁用操作按钮，显示进度条和取消按钮"""
+        for button in (self.pdf_button, self.extract_button, self.bookmark_button_apply,
+                       self.bookmark_view_button, self.detect_offset_button):
+            button.setEnabled(not busy)
+        self.progress_bar.setRange(0, 0)  # 总数未知时显示忙碌动画
+        self.progress_bar.setVisible(busy)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setVisible(busy)
+
+    def cancel_task(self):
+        """取消正在进行的后台任务"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.status_text.setText("正在取消...")
+
+    def finish_task(self):
+        """结束当前后台任务，返回其回调"""
+        callbacks = self.worker_callbacks
+        self.worker = None
+        self.worker_callbacks = None
+        self.set_busy(False)
+        return callbacks
+
+    def show_profile(self, profiler):
+        """在状态信息末尾显示性能剖析摘要，并将JSON结果输出到标准错误"""
+        if profiler is None:
+            return
+        self.status_text.append(f"性能剖析（{profiler.operation}）: {profiler.summary()}")
+        profiler.write()
+
+    @Slot(int, int, str)
+    def on_task_progress(self, done, total, text):
+        if total > 0:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+        if text:
+            self.status_text.setText(text)
+
+    @Slot(object)
+    def on_task_finished(self, result):
+        profiler = self.worker_profiler
+        on_finished, _, _ = self.finish_task()
+        on_finished(result)
+        self.show_profile(profiler)
+
+    @Slot(str)
+    def on_task_failed(self, error):
+        profiler = self.worker_profiler
+        _, on_failed, _ = self.finish_task()
+        if on_failed is not None:
+            on_failed(error)
+        else:
+            self.status_text.setText(error)
+        self.show_profile(profiler)
+
+    @Slot()
+    def on_task_cancelled(self):
+        profiler = self.worker_profiler
+        _, _, on_cancelled = self.finish_task()
+        self.status_text.setText("操作已取消")
+        if on_cancelled is not None:
+            on_cancelled()
+        self.show_profile(profiler)
+
     def load_pdf_info(self):
         """加载PDF基本信息"""
-        try:
-            doc = pymupdf.open(self.pdf_path)
+        pdf_path = self.pdf_path
+
+        def task(worker):
+            with instrument.stage("open"):
+                doc = self.doc_cache.open(pdf_path)
+            # metadata是字典，缺失的字段为空字符串
+            metadata = doc.metadata or {}
             info = f"""
 PDF基本信息:
-文件路径: {self.pdf_path}
+文件路径: {pdf_path}
 总页数: {doc.page_count}
-PDF版本: {getattr(doc.metadata, 'format', '未知')}
-标题: {getattr(doc.metadata, 'title', '未知')}
-作者: {getattr(doc.metadata, 'creator', '未知')}
-主题: {getattr(doc.metadata, 'subject', '未知')}
-关键字: {getattr(doc.metadata, 'keywords', '未知')}
-创建日期: {getattr(doc.metadata, 'creationDate', '未知')}
-修改日期: {getattr(doc.metadata, 'modDate', '未知')}
+PDF版本: {metadata.get('format') or '未知'}
+标题: {metadata.get('title') or '未知'}
+作者: {metadata.get('author') or '未知'}
+主题: {metadata.get('subject') or '未知'}
+关键字: {metadata.get('keywords') or '未知'}
+创建日期: {metadata.get('creationDate') or '未知'}
+修改日期: {metadata.get('modDate') or '未知'}
             """
-            self.info_text.setText(info.strip())
-            self.status_text.setText("PDF信息加载成功")
-            doc.close()
-        except Exception as e:
-            self.status_text.setText(f"加载PDF信息失败: {str(e)}")
+            return info.strip(), doc.page_count
+
+        self.run_task("正在加载PDF信息...", task, lambda result: self.on_pdf_info_loaded(pdf_path, *result),
+                      on_failed=lambda error: self.status_text.setText(f"加载PDF信息失败: {error}"))
+
+    def show_outline(self, visible):
+        """在PDF信息文本与书签树之间切换"""
+        self.info_text.setVisible(not visible)
+        self.outline_filter.setVisible(visible)
+        self.outline_view.setVisible(visible)
+
+    def on_pdf_info_loaded(self, pdf_path, info, page_count):
+        self.show_outline(False)
+        self.info_text.setText(info)
+        self.load_thumbnails(pdf_path, page_count)
+        self.status_text.setText("PDF信息加载成功")
 
     def extract_pages(self):
         """提取指定页面"""
@@ -204,76 +441,90 @@ PDF版本: {getattr(doc.metadata, 'format', '未知')}
             QMessageBox.warning(self, "警告", "请输入要提取的页面范围")
             return
 
-        try:
-            # 解析页面范围
-            pages = self.parse_page_range(page_range)
-            if not pages:
-                QMessageBox.warning(self, "警告", "页面范围格式错误，请使用格式如: 1-5,8,10-12")
-                return
+        # 后台任务可能正在使用文档，PyMuPDF不是线程安全的
+        if self.worker is not None:
+            self.status_text.setText("有操作正在进行，请等待完成或取消")
+            return
 
-            # 打开PDF文档
-            doc = pymupdf.open(self.pdf_path)
+        # 解析页面范围（last、负数和开放范围需要总页数）
+        try:
+            page_count = self.doc_cache.open(self.pdf_path).page_count
+            pages = parse_page_range(page_range, page_count)
+        except PageRangeError as e:
+            QMessageBox.warning(self, "警告", f"页面范围格式错误: {e}\n请使用格式如: 1-5,8,10-12")
+            return
+        except Exception as e:
+            QMessageBox.warning(self, "警告", f"无法打开PDF文件: {e}")
+            return
+        if not pages:
+            QMessageBox.warning(self, "警告", f"页面范围内没有可提取的页面（共 {page_count} 页）")
+            return
 
-            # 创建新文档
-            new_doc = pymupdf.open()
+        # 根据提取的页面自动生成保存路径和文件名
+        original_dir = os.path.dirname(self.pdf_path)
+        original_basename = os.path.splitext(os.path.basename(self.pdf_path))[0]
+        default_path = os.path.join(original_dir, f"{original_basename}_{pages.label()}.pdf")
 
-            # 添加指定页面
-            for page_num in pages:
-                if 0 <= page_num < doc.page_count:
-                    new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        # 先选择保存位置，再在后台提取
+        save_path, _ = QFileDialog.getSaveFileName(
+            self, "保存提取的PDF", default_path, "PDF files (*.pdf)"
+        )
+        if not save_path:
+            return
 
-            # 自动生成保存路径和文件名
-            original_dir = os.path.dirname(self.pdf_path)
-            original_basename = os.path.splitext(os.path.basename(self.pdf_path))[0]
+        pdf_path = self.pdf_path
+        profile = self.save_profile_combo.currentData()
 
-            # 根据提取的页面生成智能文件名
-            if len(pages) == 1:
-                page_str = f"第{pages[0]+1}页"
-            elif len(pages) <= 5:
-                page_str = f"第{','.join(str(p+1) for p in pages)}页"
-            else:
-                page_str = f"第{pages[0]+1}-{pages[-1]+1}页({len(pages)}页)"
+        def task(worker):
+            with instrument.stage("open"):
+                doc = self.doc_cache.open(pdf_path)
+            new_doc = pymupdf.open()
+            try:
+                # 按连续区间添加指定页面，每个区间后上报进度
+                with instrument.stage("insert"):
+                    copied = insert_page_runs(
+                        new_doc, doc, pages,
+                        progress=lambda done, total: worker.report(done, total, f"已复制 {done}/{total} 页"))
+                worker.report(copied, copied, "正在保存...")
+                with instrument.stage("save"):
+                    result = atomic_save(new_doc, save_path, profile=profile)
+            finally:
+                new_doc.close()
+            return copied, result
 
-            default_filename = f"{original_basename}_{page_str}.pdf"
-            default_path = os.path.join(original_dir, default_filename)
+        def on_finished(result):
+            copied, save_result = result
+            self.status_text.setText(f"成功提取 {copied} 页，保存至: {save_path}（{save_result}）")
 
-            # 保存新文档
-            save_path, _ = QFileDialog.getSaveFileName(
-                self, "保存提取的PDF", default_path, "PDF files (*.pdf)"
-            )
+        self.run_task("正在提取页面...", task, on_finished,
+                      on_failed=lambda error: self.status_text.setText(f"页面提取失败: {error}"))
 
-            if save_path:
-                new_doc.save(save_path)
-                new_doc.close()
-                self.status_text.setText(f"成功提取 {len(pages)} 页，保存至: {save_path}")
+    def detect_offset(self):
+        """自动检测页码偏移量并填入输入框"""
+        if not self.pdf_path:
+            QMessageBox.warning(self, "警告", "请先选择PDF文件")
+            return
 
-            doc.close()
+        pdf_path = self.pdf_path
 
-        except Exception as e:
-            self.status_text.setText(f"页面提取失败: {str(e)}")
+        def task(worker):
+            with instrument.stage("open"):
+                doc = self.doc_cache.open(pdf_path)
+            with instrument.stage("detect"):
+                return detect_page_mapping(doc)
 
-    def parse_page_range(self, page_range):
-        """解析页面范围字符串"""
-        pages = []
-        try:
-            # 分割逗号
-            parts = page_range.split(',')
-
-            for part in parts:
-                part = part.strip()
-                if '-' in part:
-                    # 处理范围
-                    start, end = part.split('-')
-                    start, end = int(start.strip()), int(end.strip())
-                    pages.extend(range(start - 1, end))  # 转换为0基索引
-                else:
-                    # 处理单个页面
-                    pages.append(int(part.strip()) - 1)  # 转换为0基索引
+        self.run_task("正在检测页码偏移量...", task, lambda mapping: self.on_offset_detected(pdf_path, mapping),
+                      on_failed=lambda error: self.status_text.setText(f"检测页码偏移量失败: {error}"))
 
-            return sorted(set(pages))  # 去重并排序
-        except Exception as e:
-            print(f"解析页面范围失败: {e}")
-            return []
+    def on_offset_detected(self, pdf_path, mapping):
+        self.page_mapping = (pdf_path, mapping) if mapping is not None else None
+        if mapping is None:
+            self.status_text.setText("未能从页眉页脚中识别页码，请手动填写页码偏移量")
+            return
+        self.offset_input.setText(str(mapping.body_start))
+        self.status_text.setText(f"检测到正文第1页位于物理第{mapping.body_start}页"
+                                 f"（读取 {mapping.pages_read} 页，可信度 {mapping.confidence:.0%}）\n"
+                                 f"{mapping.describe()}")
 
     def apply_bookmarks(self):
         """应用书签到PDF"""
@@ -285,34 +536,48 @@ PDF版本: {getattr(doc.metadata, 'format', '未知')}
             QMessageBox.warning(self, "警告", "请先选择书签TXT文件")
             return
 
-        doc = None
+        # 获取偏移量
         try:
-            # 解析书签文件
-            bookmarks = self.parse_bookmark_file()
+            offset = int(self.offset_input.text().strip()) - 1
+        except ValueError:
+            QMessageBox.warning(self, "警告", "页码偏移量必须是整数")
+            return
+
+        # 偏移量仍是自动检测的结果时按分段对应关系换算（正文中间有无页码插页时各段偏移不同）
+        to_physical = lambda page: page + offset
+        if self.page_mapping is not None:
+            mapping_path, mapping = self.page_mapping
+            if mapping_path == self.pdf_path and mapping.body_start == offset + 1:
+                to_physical = mapping.to_physical
+
+        pdf_path = self.pdf_path
+        bookmark_path = self.bookmark_path
+        update = self.update_toc_checkbox.isChecked()
+        profile = self.save_profile_combo.currentData()
+
+        # 第一步（后台）：解析书签文件并读取页数
+        def parse_task(worker):
+            with instrument.stage("parse"):
+                bookmarks, diagnostics = bookmark_parser.parse_bookmark_file(bookmark_path)
+            worker.report(0, 0, f"成功解析 {len(bookmarks)} 个书签，正在检查页码...")
+            with instrument.stage("open"):
+                doc = self.doc_cache.open(pdf_path)
+            return bookmarks, diagnostics, doc.page_count
+
+        def on_parsed(result):
+            bookmarks, diagnostics, max_page = result
+            if diagnostics:
+                self.show_bookmark_diagnostics(diagnostics)
             if not bookmarks:
                 QMessageBox.warning(self, "警告", "书签文件格式错误或为空")
                 return
 
-            # 获取偏移量
-            try:
-                offset = int(self.offset_input.text().strip()) - 1
-            except ValueError:
-                QMessageBox.warning(self, "警告", "页码偏移量必须是整数")
-                return
-
-            # 显示解析结果
-            self.status_text.setText(f"成功解析 {len(bookmarks)} 个书签，开始应用到PDF...")
-
-            # 打开PDF文档
-            doc = pymupdf.open(self.pdf_path)
-
             # 验证书签页码范围
-            max_page = doc.page_count
             invalid_bookmarks = []
             valid_bookmarks = []
 
             for i, (level, title, page) in enumerate(bookmarks):
-                adjusted_page = page + offset
+                adjusted_page = to_physical(page)
                 if 1 <= adjusted_page <= max_page:
                     valid_bookmarks.append([level, title, adjusted_page])
                 else:
@@ -325,159 +590,115 @@ PDF版本: {getattr(doc.metadata, 'format', '未知')}
                                            f"发现 {len(invalid_bookmarks)} 个书签的页码超出PDF页数范围 (1-{max_page})：\n\n{invalid_info}\n\n是否继续应用有效书签？",
                                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
                 if reply == QMessageBox.StandardButton.No:
-                    doc.close()
                     return
 
+            # 渲染进程打开着该文件，写入前先停止（Windows上打开的文件无法被替换）
+            self.page_renderer.shutdown()
+            self.run_task(f"正在应用 {len(valid_bookmarks)} 个书签...",
+                          lambda worker: self.write_bookmarks(worker, pdf_path, valid_bookmarks, update, profile),
+                          lambda result: self.on_bookmarks_written(result, pdf_path, valid_bookmarks),
+                          on_failed=self.on_apply_failed)
+
+        self.run_task("正在解析书签文件...", parse_task, on_parsed, on_failed=self.on_apply_failed)
+
+    def write_bookmarks(self, worker, pdf_path, bookmarks, update=False, profile=None):
+        """后台写入书签，返回 (状态, SaveResult, 临时文件路径)
+
+        update为True时只修改标题或页码变化的条目，层级结构变化时自动重建；profile为保存配置。
+        """
+        with instrument.stage("open"):
+            doc = self.doc_cache.open(pdf_path)
+        try:
             # 使用set_toc方法设置书签（只使用有效书签）
             # PyMuPDF格式的书签数据：[层级, 标题, 页码, ...]
             # 注意：层级从1开始，页码从1开始
             try:
-                doc.set_toc(valid_bookmarks)  # type: ignore
+                if update:
+                    with instrument.stage("patch_toc"):
+                        mode, _ = patch_toc(doc, bookmarks)
+                    instrument.note("toc_mode", mode)
+                    if mode == "unchanged":
+                        return "unchanged", None, None
+                else:
+                    with instrument.stage("set_toc"):
+                        doc.set_toc(bookmarks)  # type: ignore
             except (AttributeError, Exception) as e:
                 raise Exception(f"无法设置书签：{str(e)}。请确保PyMuPDF版本支持set_toc方法")
 
-            # 保存PDF文档（处理加密和权限问题）
+            # 保存前最后一个取消检查点
+            worker.report(0, 0, "正在保存PDF...")
+
+            # 保存PDF文档：先尝试增量保存，失败时写入同目录临时文件并原子替换
             try:
-                # 尝试增量更新
-                doc.save(self.pdf_path, incremental=True)
-            except Exception as save_error:
-                error_str = str(save_error).lower()
-                if "encryption" in error_str or "permission denied" in error_str or "permission" in error_str:
-                    # 如果是加密或权限问题，创建临时文件然后替换
-                    import shutil
-                    temp_path = self.pdf_path + ".tmp"
-                    doc.save(temp_path)
-                    doc.close()
+                with instrument.stage("save"):
+                    result = save_document(doc, pdf_path, release=lambda: self.doc_cache.invalidate(pdf_path),
+                                           profile=profile)
+                return "saved", result, None
+            except ReplaceError as e:
+                # 原文件被锁定，临时文件交给主线程处理
+                return "locked", None, e.temp_path
+        finally:
+            # 书签可能已被修改，丢弃缓存中的文档
+            self.doc_cache.invalidate(pdf_path)
 
+    def on_bookmarks_written(self, result, pdf_path, bookmarks):
+        """书签写入完成后在主线程提示结果"""
+        status, save_result, temp_path = result
+
+        if status == "locked":
+            # 如果移动失败，让用户选择新保存位置
+            save_path, _ = QFileDialog.getSaveFileName(
+                self, "选择保存位置（原文件被锁定）",
+                os.path.join(os.path.dirname(pdf_path), f"{os.path.splitext(os.path.basename(pdf_path))[0]}_with_bookmarks.pdf"),
+                "PDF files (*.pdf)"
+            )
+            if save_path:
+                try:
+                    shutil.move(temp_path, save_path)
+                    self.status_text.setText(f"成功保存带书签的PDF到: {save_path}")
+                    QMessageBox.information(self, "保存成功",
+                                           f"由于原文件被锁定，已保存到新位置：\n{save_path}\n\n您可以使用PDF阅读器打开此新文件查看书签。")
+                    return
+                except Exception as rename_error:
                     try:
-                        # 替换原文件
-                        shutil.move(temp_path, self.pdf_path)
-                        self.status_text.setText(f"成功应用 {len(valid_bookmarks)} 个书签到PDF文件（已处理权限/加密问题）")
-                        return
+                        os.remove(temp_path)
                     except Exception:
-                        # 如果移动失败，让用户选择新保存位置
-                        save_path, _ = QFileDialog.getSaveFileName(
-                            self, "选择保存位置（原文件被锁定）",
-                            os.path.join(os.path.dirname(self.pdf_path), f"{os.path.splitext(os.path.basename(self.pdf_path))[0]}_with_bookmarks.pdf"),
-                            "PDF files (*.pdf)"
-                        )
-                        if save_path:
-                            try:
-                                os.rename(temp_path, save_path)
-                                self.status_text.setText(f"成功保存带书签的PDF到: {save_path}")
-                                QMessageBox.information(self, "保存成功",
-                                                       f"由于原文件被锁定，已保存到新位置：\n{save_path}\n\n您可以使用PDF阅读器打开此新文件查看书签。")
-                                return
-                            except Exception as rename_error:
-                                try:
-                                    os.remove(temp_path)
-                                except Exception:
-                                    pass
-                                raise Exception(f"无法保存到新位置：{str(rename_error)}")
-                        else:
-                            # 用户取消，清理临时文件
-                            try:
-                                os.remove(temp_path)
-                            except Exception:
-                                pass
-                            raise Exception("用户取消保存操作。")
-                else:
-                    raise save_error
+                        pass
+                    self.on_apply_failed(f"无法保存到新位置：{str(rename_error)}")
+            else:
+                # 用户取消，清理临时文件
+                try:
+                    os.remove(temp_path)
+                except Exception:
+                    pass
+                self.on_apply_failed("用户取消保存操作。")
+            return
 
-            doc.close() # type: ignore
-            doc = None
+        if status == "unchanged":
+            self.status_text.setText("书签没有变化，无需保存")
+            return
 
-            # 显示成功消息
-            self.status_text.setText(f"成功应用 {len(valid_bookmarks)} 个书签到PDF文件")
+        # 显示成功消息
+        self.status_text.setText(f"成功应用 {len(bookmarks)} 个书签到PDF文件（{save_result}）")
 
-            QMessageBox.information(self, "书签应用成功",
-                                  f"已成功将 {len(valid_bookmarks)} 个书签应用到PDF文件。\n\n"
-                                  f"文件: {os.path.basename(self.pdf_path)}\n"
-                                  "现在可以使用PDF阅读器查看书签了。")
+        QMessageBox.information(self, "书签应用成功",
+                              f"已成功将 {len(bookmarks)} 个书签应用到PDF文件。\n\n"
+                              f"文件: {os.path.basename(pdf_path)}\n"
+                              "现在可以使用PDF阅读器查看书签了。")
 
-        except Exception as e:
-            error_msg = f"应用书签失败: {str(e)}"
-            self.status_text.setText(error_msg)
+    def on_apply_failed(self, error):
+        error_msg = f"应用书签失败: {error}"
+        self.status_text.setText(error_msg)
 
-            # 显示错误详情
-            QMessageBox.critical(self, "书签应用失败", error_msg)
-        finally:
-            # 确保文档被正确关闭
-            if doc is not None:
-                try:
-                    doc.close()
-                except Exception:
-                    # 忽略关闭时的错误
-                    pass
+        # 显示错误详情
+        QMessageBox.critical(self, "书签应用失败", error_msg)
 
-    def parse_bookmark_file(self):
-        """解析书签TXT文件"""
-        bookmarks = []
-        try:
-            with open(self.bookmark_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line:
-                    continue
-
-                # 解析层级和标题
-                # 假设格式: 层级|标题|页码
-                # 或者: 标题 (页码)
-                # 或者: 空格缩进表示层级
-
-                level = 0
-                title = ""
-                page = 1
-
-                # 尝试匹配不同格式
-                # 格式1: 层级|标题|页码
-                if '|' in line:
-                    parts = line.split('|')
-                    if len(parts) >= 3:
-                        level = int(parts[0].strip())  # 保持1基索引（PyMuPDF要求）
-                        title = parts[1].strip()
-                        page = int(parts[2].strip())  # 页码保持1基索引（PyMuPDF要求）
-                # 格式2: 标题 (页码)
-                elif '(' in line and ')' in line:
-                    # 找到最后一个括号对
-                    paren_start = line.rfind('(')
-                    paren_end = line.rfind(')')
-                    if paren_start < paren_end:
-                        title = line[:paren_start].strip()
-                        page_str = line[paren_start + 1:paren_end].strip()
-                        page = int(page_str)  # 页码保持1基索引（PyMuPDF要求）
-                        level = 1  # 默认层级为1
-                # 格式3: 缩进表示层级
-                else:
-                    # 计算缩进层级
-                    indent_count = 0
-                    for char in line:
-                        if char == ' ':
-                            indent_count += 1
-                        elif char == '\t':
-                            indent_count += 4
-                        else:
-                            break
-                    level = (indent_count // 2) + 1  # 每2个空格为一级，从1开始
-                    title = line.strip()
-
-                    # 尝试从标题中提取页码
-                    page_match = re.search(r'\((\d+)\)$', title)
-                    if page_match:
-                        page = int(page_match.group(1))
-                        title = title[:page_match.start()].strip()
-                    else:
-                        page = 1  # 默认第一页
-
-                if title:  # 只有当标题不为空时才添加
-                    bookmarks.append([level, title, page])
-
-            return bookmarks
-        except Exception as e:
-            self.status_text.setText(f"解析书签文件失败: {str(e)}")
-            return []
+    def show_bookmark_diagnostics(self, diagnostics):
+        """在状态区显示被跳过的无效书签行"""
+        details = "\n".join(str(d) for d in diagnostics[:20])
+        if len(diagnostics) > 20:
+            details += f"\n... 另有 {len(diagnostics) - 20} 行"
+        self.status_text.setText(f"已跳过 {len(diagnostics)} 行无效书签:\n{details}")
 
     def show_ai_prompt(self):
         """显示AI提示词"""
@@ -565,16 +786,19 @@ PDF版本: {getattr(doc.metadata, 'format', '未知')}
             QMessageBox.warning(self, "警告", "请先选择PDF文件")
             return
 
-        doc = None
-        try:
-            doc = pymupdf.open(self.pdf_path)
+        pdf_path = self.pdf_path
+
+        def task(worker):
+            with instrument.stage("open"):
+                doc = self.doc_cache.open(pdf_path)
 
             # 获取PDF书签
             # PyMuPDF中获取书签的标准方法
             toc = []
             try:
                 # 尝试使用get_toc()方法（新版本）
-                toc = doc.get_toc()  # type: ignore
+                with instrument.stage("get_toc"):
+                    toc = doc.get_toc()  # type: ignore
             except (AttributeError, Exception):
                 # 如果get_toc()失败，尝试getToC()（旧版本方法）
                 try:
@@ -604,51 +828,142 @@ PDF版本: {getattr(doc.metadata, 'format', '未知')}
                     except Exception:
                         toc = []
 
-            if not toc:
-                self.info_text.setText("此PDF文档没有书签信息。")
-                self.status_text.setText("PDF中未找到书签")
-                return
-
-            # 格式化书签信息
-            bookmark_info = "PDF书签信息：\n\n"
-
-            for i, (level, title, page) in enumerate(toc, 1):
-                indent = "  " * (level - 1)  # 根据层级计算缩进
-                bookmark_info += f"{i:2d}. {indent}{title} (第{page}页)\n"
-
-            bookmark_info += f"\n总计: {len(toc)} 个书签"
-
-            # 显示书签信息
-            self.info_text.setText(bookmark_info)
-            self.status_text.setText(f"成功加载 {len(toc)} 个书签信息")
-
-        except Exception as e:
-            error_msg = f"查看书签失败: {str(e)}"
-            self.status_text.setText(error_msg)
-            # 如果是document closed错误，提供更友好的提示
-            if "document closed" in str(e).lower():
-                self.info_text.setText("PDF文档已在其他操作中关闭，请重新选择PDF文件。")
+            # 在后台构建树结构，主线程只负责显示
+            with instrument.stage("outline_tree"):
+                return OutlineTree(toc)
+
+        self.run_task("正在读取PDF书签...", task, self.on_bookmarks_loaded,
+                      on_failed=self.on_view_bookmarks_failed)
+
+    def load_thumbnails(self, pdf_path, page_count):
+        """切换缩略图列表到新文档"""
+        self.page_renderer.set_document(pdf_path)
+        self.pixmap_cache.clear()
+        self.thumbnail_model.set_page_count(page_count)
+        self.preview_page = None
+        self.preview_label.setPixmap(QPixmap())
+        self.preview_label.setText("点击缩略图或书签预览页面")
+
+    def preview_width(self):
+        width = max(self.preview_area.viewport().width() - 20, PREVIEW_WIDTH_STEP)
+        return width // PREVIEW_WIDTH_STEP * PREVIEW_WIDTH_STEP
+
+    def show_preview(self, page_num):
+        """预览页面（0基），并在缩略图列表中选中该页"""
+        if not 0 <= page_num < self.thumbnail_model.page_count:
+            return
+        self.preview_page = page_num
+        index = self.thumbnail_model.index(page_num)
+        self.thumbnail_view.setCurrentIndex(index)
+        self.thumbnail_view.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtCenter)
+
+        width = self.preview_width()
+        pixmap = self.pixmap_cache.get((page_num, width))
+        if pixmap is None:
+            # 先显示放大的缩略图，再请求清晰的预览图
+            thumbnail = self.pixmap_cache.get((page_num, THUMB_WIDTH))
+            if thumbnail is not None:
+                self.preview_label.setPixmap(thumbnail.scaledToWidth(width))
             else:
-                self.info_text.setText(f"获取书签信息时出错: {str(e)}")
-        finally:
-            # 确保文档被正确关闭
-            if doc is not None:
-                try:
-                    doc.close()
-                except Exception:
-                    # 忽略关闭时的错误
-                    pass
+                self.preview_label.setPixmap(QPixmap())
+                self.preview_label.setText(f"正在渲染第{page_num + 1}页...")
+            self.page_renderer.request(page_num, width)
+        else:
+            self.preview_label.setPixmap(pixmap)
+
+    @Slot(int, int, QImage)
+    def on_page_rendered(self, page_num, width, image):
+        if width == THUMB_WIDTH:
+            # 缩略图先于预览图完成时，先用它占位
+            if page_num == self.preview_page and self.preview_label.pixmap().isNull():
+                self.preview_label.setPixmap(QPixmap.fromImage(image).scaledToWidth(self.preview_width()))
+            return
+        pixmap = QPixmap.fromImage(image)
+        self.pixmap_cache.put((page_num, width), pixmap)
+        if page_num == self.preview_page:
+            self.preview_label.setPixmap(pixmap)
+
+    def on_outline_clicked(self, index):
+        """点击书签跳转到目标页"""
+        page = self.outline_model.tree.pages[index.internalId()]
+        if page >= 1:
+            self.show_preview(page - 1)
+
+    def on_bookmarks_loaded(self, tree):
+        if not len(tree):
+            self.show_outline(False)
+            self.info_text.setText("此PDF文档没有书签信息。")
+            self.status_text.setText("PDF中未找到书签")
+            return
+
+        # 显示书签树
+        self.outline_filter.blockSignals(True)
+        self.outline_filter.clear()
+        self.outline_filter.blockSignals(False)
+        self.outline_model.set_tree(tree)
+        self.show_outline(True)
+        self.outline_view.resizeColumnToContents(1)
+        self.status_text.setText(f"成功加载 {len(tree)} 个书签信息")
+
+    def apply_outline_filter(self):
+        """按输入的关键字过滤书签树"""
+        text = self.outline_filter.text()
+        count = self.outline_model.set_filter(text)
+        if not text.strip():
+            self.status_text.setText(f"共 {count} 个书签")
+            return
+        if count <= FILTER_EXPAND_LIMIT:
+            self.outline_view.expandAll()
+        self.status_text.setText(f"匹配 {count} 个书签")
+
+    def on_view_bookmarks_failed(self, error):
+        error_msg = f"查看书签失败: {error}"
+        self.show_outline(False)
+        self.status_text.setText(error_msg)
+        # 如果是document closed错误，提供更友好的提示
+        if "document closed" in error.lower():
+            self.info_text.setText("PDF文档已在其他操作中关闭，请重新选择PDF文件。")
+        else:
+            self.info_text.setText(f"获取书签信息时出错: {error}")
 
     def edit_bookmark_txt(self):
         """编辑书签TXT文件"""
-        dialog = BookmarkEditorDialog(self.bookmark_path, self)
+        dialog = BookmarkEditorDialog(self.bookmark_path, self, page_limit=self.bookmark_page_limit())
         dialog.exec()
 
+    def bookmark_page_limit(self):
+        """书签页码的上限（PDF页数按页码偏移量换算），无法确定时返回None"""
+        # 后台任务可能正在使用文档，PyMuPDF不是线程安全的
+        if not self.pdf_path or self.worker is not None:
+            return None
+        try:
+            page_count = self.doc_cache.open(self.pdf_path).page_count
+            offset = int(self.offset_input.text().strip()) - 1
+        except Exception:
+            return None
+        return page_count - offset
+
+    def closeEvent(self, event):
+        """关闭窗口时取消后台任务并释放缓存的文档"""
+        if self.worker is not None:
+            self.worker.cancel()
+        self.thread_pool.waitForDone()
+        self.doc_cache.clear()
+        self.page_renderer.shutdown()
+        super().closeEvent(event)
+
 
 class BookmarkEditorDialog(QDialog):
-    def __init__(self, bookmark_path, parent=None):
+    def __init__(self, bookmark_path, parent=None, page_limit=None):
         super().__init__(parent)
         self.bookmark_path = bookmark_path
+        self.page_limit = page_limit
+        # 校验在后台线程中串行执行，校验期间的新修改等本次完成后再校验
+        self.validator = bookmark_parser.IncrementalValidator()
+        self.validation_pool = QThreadPool(self)
+        self.validation_pool.setMaxThreadCount(1)
+        self.validation_worker = None
+        self.validation_pending = False
         self.init_ui()
 
     def init_ui(self):
@@ -687,9 +1002,24 @@ class BookmarkEditorDialog(QDialog):
 
         layout.addLayout(toolbar_layout)
 
-        # 文本编辑器
-        self.text_edit = QTextEdit()
-        layout.addWidget(self.text_edit)
+        # 文本编辑器：纯文本控件，大文件也能流畅编辑
+        self.text_edit = QPlainTextEdit()
+        self.text_edit.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        layout.addWidget(self.text_edit, 1)
+
+        # 停止输入后延迟校验
+        self.validate_timer = QTimer(self)
+        self.validate_timer.setSingleShot(True)
+        self.validate_timer.setInterval(VALIDATE_DELAY_MS)
+        self.validate_timer.timeout.connect(self.start_validation)
+        self.text_edit.textChanged.connect(self.validate_timer.start)
+
+        # 问题列表，双击跳转到对应行
+        self.diagnostic_list = QListWidget()
+        self.diagnostic_list.setMaximumHeight(120)
+        self.diagnostic_list.setVisible(False)
+        self.diagnostic_list.itemActivated.connect(self.goto_diagnostic)
+        layout.addWidget(self.diagnostic_list)
 
         # 状态标签
         self.status_label = QLabel("")
@@ -699,6 +1029,82 @@ class BookmarkEditorDialog(QDialog):
         if self.bookmark_path and os.path.exists(self.bookmark_path):
             self.load_file()
 
+    def start_validation(self):
+        """在后台线程中校验当前文本"""
+        if self.validation_worker is not None:
+            self.validation_pending = True
+            return
+
+        lines = self.text_edit.toPlainText().split('\n')
+        page_limit = self.page_limit
+        worker = Worker(lambda worker: self.validator.validate(lines, page_limit))
+        worker.signals.finished.connect(self.on_validated)
+        worker.signals.failed.connect(self.on_validation_failed)
+        self.validation_worker = worker
+        self.validation_pool.start(worker)
+
+    def finish_validation(self):
+        """结束本次校验；校验期间文本又被修改时丢弃结果并重新校验，返回是否需要丢弃"""
+        self.validation_worker = None
+        if self.validation_pending:
+            self.validation_pending = False
+            self.start_validation()
+            return True
+        return False
+
+    @Slot(object)
+    def on_validated(self, result):
+        if self.finish_validation():
+            return
+        count, diagnostics = result
+        self.show_diagnostics(count, diagnostics)
+
+    @Slot(str)
+    def on_validation_failed(self, error):
+        if not self.finish_validation():
+            self.status_label.setText(f"校验失败: {error}")
+
+    def show_diagnostics(self, count, diagnostics):
+        """列出问题并在编辑器中标记对应行"""
+        listed = diagnostics[:MAX_LISTED_DIAGNOSTICS]
+        self.diagnostic_list.clear()
+        for diagnostic in listed:
+            item = QListWidgetItem(str(diagnostic))
+            item.setData(Qt.ItemDataRole.UserRole, diagnostic.line_num)
+            self.diagnostic_list.addItem(item)
+        self.diagnostic_list.setVisible(bool(diagnostics))
+
+        selections = []
+        document = self.text_edit.document()
+        for line_num in sorted({d.line_num for d in listed}):
+            selection = QTextEdit.ExtraSelection()
+            selection.format.setBackground(QColor(255, 220, 220))
+            selection.format.setProperty(QTextFormat.Property.FullWidthSelection, True)
+            selection.cursor = QTextCursor(document.findBlockByNumber(line_num - 1))
+            selections.append(selection)
+        self.text_edit.setExtraSelections(selections)
+
+        if diagnostics:
+            more = f"（仅列出前 {len(listed)} 个）" if len(diagnostics) > len(listed) else ""
+            self.status_label.setText(f"共 {count} 个书签，发现 {len(diagnostics)} 个问题{more}")
+        else:
+            self.status_label.setText(f"共 {count} 个书签，未发现问题")
+
+    def goto_diagnostic(self, item):
+        """跳转到问题所在行"""
+        line_num = item.data(Qt.ItemDataRole.UserRole)
+        cursor = QTextCursor(self.text_edit.document().findBlockByNumber(line_num - 1))
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.centerCursor()
+        self.text_edit.setFocus()
+
+    def done(self, result):
+        """关闭前等待正在进行的校验结束"""
+        self.validate_timer.stop()
+        self.validation_pending = False
+        self.validation_pool.waitForDone()
+        super().done(result)
+
     def load_file(self):
         """加载书签文件"""
         if not self.bookmark_path:
@@ -711,8 +1117,9 @@ class BookmarkEditorDialog(QDialog):
                 return
 
         try:
-            with open(self.bookmark_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            with open(self.bookmark_path, 'rb') as f:
+                data = f.read()
+            content = bookmark_parser.decode_text(data)
             self.text_edit.setPlainText(content)
             self.status_label.setText(f"已加载文件: {os.path.basename(self.bookmark_path)}")
         except Exception as e:
@@ -775,4 +1182,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序中，缩略图渲染进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+PDF书签工具 - 任务清单
+按清单文件（JSON或YAML）批量执行操作：涉及同一文件的任务按清单顺序依次执行，不同文件的任务在进程池中并行，
+工作进程缓存已打开的文档供后续任务复用；完成情况追加记录到日志中，中断后重新运行会跳过已完成的任务
+"""
+
+import collections
+import contextlib
+import io
+import json
+import os
+import time
+
+import cli
+
+
+# 操作名 -> (必需参数, 可选参数)
+OPERATIONS = {
+    'info': (('pdf',), ()),
+    'view': (('pdf',), ()),
+    'apply': (('pdf', 'bookmarks'), ('update', 'output', 'offset', 'profile')),
+    'extract': (('pdf', 'pages'), ('output', 'profile')),
+    'verify': (('pdf', 'bookmarks'), ('offset', 'output')),
+    'autogen': (('pdf',), ('output', 'levels')),
+    'split': (('pdf',), ('output', 'level', 'bookmarks', 'offset', 'profile')),
+}
+# 值为路径的参数，相对路径相对于清单文件所在目录
+PATH_PARAMS = ('pdf', 'bookmarks', 'output')
+# 会写入的参数：写入某个文件的任务与读取该文件的任务视为同一组，按清单顺序执行
+WRITE_PARAMS = {'apply': ('pdf', 'output'), 'extract': ('output',), 'verify': ('output',),
+                'autogen': ('output',), 'split': ('output',)}
+# 每次提交给工作进程的同组任务数
+CHUNK_SIZE = 50
+# 每个工作进程同时排队的任务块数
+QUEUE_DEPTH = 2
+# 日志每隔多少秒fsync一次（每条记录都会立即flush，进程崩溃不会丢失记录）
+JOURNAL_SYNC_INTERVAL = 1.0
+
+
+class ManifestError(Exception):
+    """清单格式错误"""
+
+
+def load_manifest(manifest_path):
+    """读取清单，返回 (任务列表, 默认参数)
+
+    清单为任务列表，或包含 jobs（任务列表）和 defaults（所有任务共用的参数）的对象；
+    每个任务包含 op 和该操作的参数，可选的 id 用于在日志中标识任务（默认为任务在清单中的序号）。
+    """
+    with open(manifest_path, 'r', encoding='utf-8-sig') as f:
+        if manifest_path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ManifestError("读取YAML清单需要安装PyYAML（pip install pyyaml），或改用JSON清单")
+            data = yaml.safe_load(f)
+        else:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise ManifestError(f"JSON解析失败: {e}")
+
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get('defaults') or {}
+        data = data.get('jobs')
+    if not isinstance(data, list) or not isinstance(defaults, dict):
+        raise ManifestError("清单应为任务列表，或包含 jobs 列表的对象")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    seen = set()
+    for index, entry in enumerate(data, 1):
+        if not isinstance(entry, dict):
+            raise ManifestError(f"第{index}个任务不是对象")
+        job = {**defaults, **entry}
+        op = job.pop('op', None)
+        if op not in OPERATIONS:
+            raise ManifestError(f"第{index}个任务的操作无效: {op}（可选: {', '.join(OPERATIONS)}）")
+        job_id = str(job.pop('id', index))
+        if job_id in seen:
+            raise ManifestError(f"任务id重复: {job_id}")
+        seen.add(job_id)
+
+        required, optional = OPERATIONS[op]
+        missing = [name for name in required if not job.get(name)]
+        if missing:
+            raise ManifestError(f"任务 {job_id} 缺少参数: {', '.join(missing)}")
+        # defaults中的参数只用于支持它的操作
+        params = {name: value for name, value in job.items() if name in required or name in optional}
+        unknown = set(entry) - set(params) - {'op', 'id'}
+        if unknown:
+            raise ManifestError(f"任务 {job_id} 包含未知参数: {', '.join(sorted(unknown))}")
+        for name in PATH_PARAMS:
+            if params.get(name):
+                params[name] = os.path.normpath(os.path.join(base_dir, params[name]))
+        jobs.append((job_id, op, params))
+    return jobs, defaults
+
+
+def group_jobs(jobs):
+    """按涉及的文件分组：处理同一PDF或读写同一文件（如一个任务的输出是另一个任务的输入）的任务在同一组
+
+    返回组列表，每组为按清单顺序排列的任务序号。
+    """
+    parent = {}
+
+    def find(key):
+        root = key
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    written = {params[name] for _, op, params in jobs for name in WRITE_PARAMS.get(op, ()) if params.get(name)}
+    for index, (_, op, params) in enumerate(jobs):
+        files = [params['pdf']] + [params[name] for name in WRITE_PARAMS.get(op, ()) if params.get(name)]
+        # 只读的书签文件可被多个PDF共用，只有清单中有任务写入它时才需要排序
+        if params.get('bookmarks') in written:
+            files.append(params['bookmarks'])
+        root = find(('job', index))
+        for path in files:
+            parent[find(('file', path))] = root
+
+    groups = collections.OrderedDict()
+    for index in range(len(jobs)):
+        groups.setdefault(find(('job', index)), []).append(index)
+    return list(groups.values())
+
+
+def _init_worker():
+    """进程池初始化：同一进程中的任务复用已打开的文档"""
+    from doc_cache import DocumentCache
+    cli.document_cache = DocumentCache()
+
+
+def run_job(op, params):
+    """执行单个任务并捕获输出，返回 (是否成功, 输出)"""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            pdf = params['pdf']
+            if op == 'info':
+                ok = cli.load_pdf_info(pdf)
+            elif op == 'view':
+                ok = cli.view_pdf_bookmarks(pdf)
+            elif op == 'apply':
+                ok = cli.apply_bookmarks(pdf, params['bookmarks'], params.get('update', False), params.get('output'),
+                                         params.get('offset'), params.get('profile'))
+            elif op == 'extract':
+                ok = cli.extract_pages(pdf, str(params['pages']), params.get('output'), params.get('profile'))
+            elif op == 'verify':
+                ok = cli.verify_bookmarks(pdf, params['bookmarks'], params.get('offset'), params.get('output'),
+                                          workers=1)
+            elif op == 'autogen':
+                ok = cli.autogen_bookmarks(pdf, params.get('output'), params.get('levels', 3), workers=1)
+            else:
+                ok = cli.split_pdf(pdf, params.get('output'), params.get('level', 1), params.get('bookmarks'),
+                                   params.get('offset'), workers=1, profile=params.get('profile'))
+        except Exception as e:
+            print(f"执行失败: {e}")
+            ok = False
+    return ok, buffer.getvalue().strip()
+
+
+def run_chunk(chunk):
+    """工作进程入口：依次执行同一组中的一段任务，遇到失败即停止，返回 [(序号, 是否成功, 输出), ...]"""
+    results = []
+    for index, op, params in chunk:
+        ok, output = run_job(op, params)
+        results.append((index, ok, output))
+        if not ok:
+            break
+    return results
+
+
+class Journal:
+    """只追加的任务日志，每行一个JSON记录 {"job": id, "status": "done"/"failed", ...}"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        valid_end = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                        if record["status"] == "done":
+                            self.done.add(record["job"])
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    valid_end += len(line)
+            # 中断时写了一半的最后一行被截掉
+            if valid_end != os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.last_sync = time.monotonic()
+
+    def record(self, job_id, status, output=""):
+        record = {"job": job_id, "status": status, "time": round(time.time(), 3)}
+        if output:
+            record["output"] = output
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if time.monotonic() - self.last_sync >= JOURNAL_SYNC_INTERVAL:
+            os.fsync(self.file.fileno())
+            self.last_sync = time.monotonic()
+        if status == "done":
+            self.done.add(job_id)
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def run_manifest(manifest_path, journal_path=None, workers=None, progress_interval=1000):
+    """执行清单中尚未完成的任务，返回 (完成数, 失败数, 因前序任务失败而跳过的数)"""
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+
+    jobs, _ = load_manifest(manifest_path)
+    journal = Journal(journal_path or manifest_path + '.journal.jsonl')
+    # 每组剩余的任务，已完成的任务不再执行
+    pending = collections.deque()
+    skipped_done = 0
+    for group in group_jobs(jobs):
+        remaining = [index for index in group if jobs[index][0] not in journal.done]
+        skipped_done += len(group) - len(remaining)
+        if remaining:
+            pending.append(collections.deque(remaining))
+    total = sum(len(group) for group in pending)
+    if skipped_done:
+        print(f"日志中已有 {skipped_done} 个任务完成，跳过")
+    print(f"共 {total} 个任务待执行，{len(pending)} 组可并行")
+
+    workers = workers or os.cpu_count() or 1
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    executor = None
+    broken = False  # 有工作进程异常退出后进程池不能再提交任务，等在途任务结束后换一个新的进程池
+    in_flight = {}
+
+    def submit(group):
+        chunk = [(index, *jobs[index][1:]) for index in
+                 (group.popleft() for _ in range(min(CHUNK_SIZE, len(group))))]
+        in_flight[executor.submit(run_chunk, chunk)] = (group, chunk)
+
+    try:
+        while pending or in_flight:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            while not broken and pending and len(in_flight) < workers * QUEUE_DEPTH:
+                submit(pending.popleft())
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                group, chunk = in_flight.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # 工作进程异常退出（如BrokenProcessPool）时本段任务全部记为失败，其他组继续执行
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    message = str(e) or type(e).__name__
+                    for index, _, _ in chunk:
+                        journal.record(jobs[index][0], "failed", message)
+                    counts["failed"] += len(chunk)
+                    print(f"[失败] {jobs[chunk[0][0]][0]} 等 {len(chunk)} 个任务: {message}")
+                    results = None
+                else:
+                    for index, ok, output in results:
+                        job_id = jobs[index][0]
+                        journal.record(job_id, "done" if ok else "failed", output.splitlines()[-1] if output else "")
+                        counts["done" if ok else "failed"] += 1
+                        if not ok:
+                            print(f"[失败] {job_id}: {output.splitlines()[-1] if output else ''}")
+                        finished_count = counts["done"] + counts["failed"]
+                        if finished_count % progress_interval == 0:
+                            elapsed = time.perf_counter() - started
+                            print(f"已完成 {finished_count}/{total} 个任务（{finished_count / elapsed:.0f} 个/秒）")
+                if results is None or len(results) < len(chunk) or not results[-1][1]:
+                    # 同组后续任务依赖失败的任务，本次不再执行，下次运行时重试
+                    dropped = len(group) + (len(chunk) - len(results) if results is not None else 0)
+                    counts["skipped"] += dropped
+                    if dropped:
+                        print(f"  跳过同一文件的后续 {dropped} 个任务")
+                elif group:
+                    # 同组的下一段任务在本段完成后提交，保证执行顺序
+                    if broken:
+                        pending.appendleft(group)
+                    else:
+                        submit(group)
+            if broken and not in_flight:
+                executor.shutdown()
+                executor = None
+                broken = False
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        journal.close()
+    return counts["done"], counts["failed"], counts["skipped"]
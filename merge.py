@@ -0,0 +1,120 @@
+"""
+PDF书签工具 - 合并PDF
+按顺序整本复制多个PDF并合并书签：每个输入生成一个顶级书签，原有书签挂在其下并按累计页数平移；
+输入文件逐个打开和关闭，累计页数较多时先写入临时文件再继续，内存占用与输入数量无关
+"""
+
+import os
+import tempfile
+
+import pymupdf
+
+import instrument
+from save_engine import _copy_mode, _fsync_path, atomic_save, profile_options
+
+
+# 内存中累计这么多页后写入临时文件，之后的输入以增量保存追加
+FLUSH_PAGES = 2000
+
+
+def shift_toc(toc, offset, title, page_count):
+    """将一个输入的书签挂到标题为title的顶级书签下，页码加上offset
+
+    没有目标页的书签（页码<=0）保持原样。
+    """
+    entries = [[1, title, offset + 1 if page_count else -1]]
+    for level, entry_title, page in toc:
+        entries.append([level + 1, entry_title, page + offset if page > 0 else page])
+    return entries
+
+
+def _flush(new_doc, temp_path, saved):
+    """写出已合并的内容并重新打开，释放内存中的页面"""
+    size_before = os.path.getsize(temp_path)
+    with instrument.stage("flush"):
+        if saved:
+            new_doc.saveIncr()
+        else:
+            new_doc.save(temp_path)
+        new_doc.close()
+    instrument.count_written(os.path.getsize(temp_path) - size_before)
+    return pymupdf.open(temp_path)
+
+
+def merge_pdfs(inputs, output_path, titles=None, progress=None, profile=None):
+    """合并inputs到output_path，返回 (总页数, 书签条目数)
+
+    titles为每个输入的顶级书签标题，默认为文件名；progress(已合并数, 总数)在每个输入后调用。
+    先写入同目录临时文件，完成后再替换output_path。profile为保存配置，默认为balanced；
+    已写入过临时文件时，除fast和默认配置外需要再完整重写一次。
+    """
+    output_path = os.path.abspath(output_path)
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(output_path) + '.',
+                                     suffix='.tmp', dir=os.path.dirname(output_path))
+    os.close(fd)
+
+    new_doc = pymupdf.open()
+    saved = False
+    unsaved_pages = 0
+    offset = 0
+    toc = []
+    try:
+        for i, path in enumerate(inputs):
+            title = titles[i] if titles and titles[i] else os.path.splitext(os.path.basename(path))[0]
+            instrument.count_file_read(path)
+            with instrument.stage("insert"), pymupdf.open(path) as doc:
+                page_count = doc.page_count
+                # 整本插入，一次调用即可复制全部页面及共享资源
+                new_doc.insert_pdf(doc)
+                toc.extend(shift_toc(doc.get_toc(simple=True), offset, title, page_count))
+            offset += page_count
+            unsaved_pages += page_count
+
+            if unsaved_pages >= FLUSH_PAGES:
+                new_doc = _flush(new_doc, temp_path, saved)
+                saved = True
+                unsaved_pages = 0
+            if progress is not None:
+                progress(i + 1, len(inputs))
+
+        with instrument.stage("set_toc"):
+            new_doc.set_toc(toc)
+        size_before = os.path.getsize(temp_path)
+        with instrument.stage("save"):
+            if saved and profile in (None, "fast"):
+                new_doc.saveIncr()
+            elif saved:
+                # 增量保存无法压缩已写入的对象，按配置完整写入输出文件
+                atomic_save(new_doc, output_path, profile=profile)
+                new_doc.close()
+                os.remove(temp_path)
+                return offset, len(toc)
+            else:
+                new_doc.save(temp_path, **profile_options(profile or "balanced"))
+            new_doc.close()
+            _fsync_path(temp_path)
+        instrument.count_written(os.path.getsize(temp_path) - size_before)
+        _copy_mode(temp_path, output_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if not new_doc.is_closed:
+            new_doc.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return offset, len(toc)
+
+
+def read_input_list(list_path):
+    """读取输入列表文件：每行 "文件路径" 或 "文件路径|书签标题"，相对路径相对于列表文件所在目录"""
+    base_dir = os.path.dirname(os.path.abspath(list_path))
+    inputs, titles = [], []
+    with open(list_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path, _, title = line.partition('|')
+            inputs.append(os.path.join(base_dir, path.strip()))
+            titles.append(title.strip() or None)
+    return inputs, titles
@@ -0,0 +1,206 @@
+"""
+PDF书签工具 - 页码偏移检测
+抽样读取页眉页脚中印刷的页码，求出物理页码与印刷页码的对应关系；
+相邻样本偏移不一致时二分查找分界页，支持罗马数字前言与正文分段编号
+"""
+
+import re
+from collections import Counter
+
+
+# 页眉页脚区域占页面高度的比例
+BAND_RATIO = 0.12
+SAMPLE_COUNT = 24
+# 前言通常较短，在文档开头这个比例的范围内加密抽样
+FRONT_RATIO = 0.1
+FRONT_SAMPLE_COUNT = 12
+# 分界页附近没有页码时，向两侧探测的页数
+PROBE_DISTANCE = 3
+# 同一标签至少被这么多页支持才被采信，避免年份等数字造成干扰
+MIN_VOTES = 2
+
+ARABIC_PATTERN = re.compile(r'^\D{0,3}?(\d{1,5})\D{0,3}$')
+ROMAN_PATTERN = re.compile(r'^[\W_]{0,2}([ivxlcdm]{1,8})[\W_]{0,2}$', re.IGNORECASE)
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100, 'd': 500, 'm': 1000}
+
+
+def roman_to_int(text):
+    """罗马数字转整数，不规范的写法返回None"""
+    text = text.lower()
+    total = 0
+    for i, char in enumerate(text):
+        value = ROMAN_VALUES[char]
+        if i + 1 < len(text) and ROMAN_VALUES[text[i + 1]] > value:
+            total -= value
+        else:
+            total += value
+    return total if total > 0 and int_to_roman(total) == text else None
+
+
+def int_to_roman(value):
+    result = []
+    for number, symbol in ((1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'), (90, 'xc'),
+                           (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i')):
+        while value >= number:
+            result.append(symbol)
+            value -= number
+    return ''.join(result)
+
+
+def read_page_labels(doc, page_num):
+    """读取页眉页脚中可能是页码的数字，返回 [(类型, 偏移), ...]
+
+    类型为 "arabic" 或 "roman"，偏移 = 物理页码(1基) - 印刷页码。
+    """
+    page = doc[page_num]
+    rect = page.rect
+    band = rect.height * BAND_RATIO
+    labels = []
+    for clip in (rect + (0, 0, 0, band - rect.height), rect + (0, rect.height - band, 0, 0)):
+        for word in page.get_text("words", clip=clip):
+            token = word[4]
+            match = ARABIC_PATTERN.match(token)
+            if match:
+                value = int(match.group(1))
+                if 1 <= value <= doc.page_count:
+                    labels.append(("arabic", page_num + 1 - value))
+                continue
+            match = ROMAN_PATTERN.match(token)
+            if match:
+                value = roman_to_int(match.group(1))
+                if value is not None and value <= 100:
+                    labels.append(("roman", page_num + 1 - value))
+    return labels
+
+
+class PageMapping:
+    """物理页码与印刷页码的分段对应关系
+
+    segments为 [(起始物理页, 结束物理页, 类型, 偏移), ...]，页码均从1开始。
+    """
+
+    def __init__(self, segments, pages_read, confidence):
+        self.segments = segments
+        self.pages_read = pages_read
+        self.confidence = confidence
+
+    @property
+    def main_segment(self):
+        """正文分段：包含印刷页码1的阿拉伯数字分段，没有时取覆盖页数最多的"""
+        arabic = [s for s in self.segments if s[2] == "arabic"]
+        if not arabic:
+            return None
+        for segment in arabic:
+            if segment[0] <= segment[3] + 1 <= segment[1]:
+                return segment
+        return max(arabic, key=lambda s: s[1] - s[0])
+
+    @property
+    def offset(self):
+        segment = self.main_segment
+        return segment[3] if segment else 0
+
+    @property
+    def body_start(self):
+        """印刷页码1所在的物理页码，即GUI中“页码偏移量”的取值"""
+        return self.offset + 1
+
+    def to_physical(self, printed):
+        """将书签中的印刷页码（阿拉伯数字）转换为物理页码"""
+        for start, end, kind, offset in self.segments:
+            if kind == "arabic" and start <= printed + offset <= end:
+                return printed + offset
+        return printed + self.offset
+
+    def describe(self):
+        lines = []
+        for start, end, kind, offset in self.segments:
+            first = max(start - offset, 1)
+            last = end - offset
+            if kind == "roman":
+                first, last = int_to_roman(first), int_to_roman(last)
+            lines.append(f"物理第{start}-{end}页: {'罗马数字' if kind == 'roman' else '阿拉伯数字'}页码 {first}-{last}")
+        return "\n".join(lines)
+
+
+class _LabelReader:
+    """读取页码标签并缓存，按全局投票给每页选出最可信的标签"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.cache = {}
+        self.votes = Counter()
+
+    def candidates(self, page_num):
+        if page_num not in self.cache:
+            labels = read_page_labels(self.doc, page_num)
+            self.cache[page_num] = labels
+            self.votes.update(set(labels))
+        return self.cache[page_num]
+
+    def label(self, page_num):
+        supported = [label for label in self.candidates(page_num) if self.votes[label] >= MIN_VOTES]
+        if not supported:
+            return None
+        return max(supported, key=lambda label: self.votes[label])
+
+    def label_near(self, page_num, low, high):
+        """page_num没有页码时（如章首页），在 (low, high) 范围内向两侧探测"""
+        for distance in range(PROBE_DISTANCE + 1):
+            for candidate in (page_num + distance, page_num - distance):
+                if low < candidate < high:
+                    label = self.label(candidate)
+                    if label is not None:
+                        return candidate, label
+        return page_num, None
+
+
+def detect_page_mapping(doc, sample_count=SAMPLE_COUNT):
+    """抽样检测页码对应关系，无法检测时返回None"""
+    page_count = doc.page_count
+    if page_count == 0:
+        return None
+
+    reader = _LabelReader(doc)
+    step = max(1, page_count // sample_count)
+    front_end = max(1, int(page_count * FRONT_RATIO))
+    front_step = max(1, front_end // FRONT_SAMPLE_COUNT)
+    samples = sorted(set(range(0, page_count, step)) | set(range(0, front_end, front_step)) | {page_count - 1})
+    for page_num in samples:
+        reader.candidates(page_num)
+
+    labelled = [(page_num, reader.label(page_num)) for page_num in samples]
+    labelled = [(page_num, label) for page_num, label in labelled if label is not None]
+    if not labelled:
+        return None
+
+    # 相邻样本标签不同时，二分查找分界页；分界放在最后一个确认属于前一段的页之后，
+    # 两段之间没有页码的页（插页、章首页）归入后一段
+    def find_boundaries(low, low_label, high, high_label):
+        while high - low > 1:
+            mid, label = reader.label_near((low + high) // 2, low, high)
+            if label is None:
+                break
+            if label == low_label:
+                low = mid
+            elif label == high_label:
+                high = mid
+            else:
+                # 两个样本之间还有第三种标签（如罗马数字 -> 插页 -> 阿拉伯数字），两侧分别查找分界
+                return find_boundaries(low, low_label, mid, label) + find_boundaries(mid, label, high, high_label)
+        return [(low + 1, high_label)]
+
+    boundaries = []
+    for (low, low_label), (high, high_label) in zip(labelled, labelled[1:]):
+        if low_label != high_label:
+            boundaries.extend(find_boundaries(low, low_label, high, high_label))
+
+    segments = []
+    start, label = 0, labelled[0][1]
+    for boundary, next_label in boundaries:
+        segments.append((start + 1, boundary, label[0], label[1]))
+        start, label = boundary, next_label
+    segments.append((start + 1, page_count, label[0], label[1]))
+
+    # 可信度：抽样页中识别出可信页码的比例
+    return PageMapping(segments, len(reader.cache), len(labelled) / len(samples))
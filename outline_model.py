@@ -0,0 +1,165 @@
+"""
+PDF书签工具 - 书签树模型
+为QTreeView提供书签大纲的懒加载模型：行按需创建，展开节点时才分批加载子行，支持按标题增量过滤
+"""
+
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+
+# 展开节点时每批加载的子行数
+FETCH_BATCH = 1000
+
+ROOT = -1
+
+
+class OutlineTree:
+    """由 [[层级, 标题, 页码], ...] 构建的父子关系，在后台线程中构建，O(n)"""
+
+    def __init__(self, toc):
+        self.titles = [entry[1] for entry in toc]
+        self.pages = [entry[2] for entry in toc]
+        self.parents = []
+        self.rows = []  # 条目在父节点子行中的行号
+        self.children = {ROOT: []}
+        # 当前路径上各层级的条目，层级跳跃时挂到最近的上级
+        stack = []
+        for i, entry in enumerate(toc):
+            level = entry[0]
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            parent = stack[-1][1] if stack else ROOT
+            self.parents.append(parent)
+            siblings = self.children.setdefault(parent, [])
+            self.rows.append(len(siblings))
+            siblings.append(i)
+            stack.append((level, i))
+        # 过滤用的小写标题
+        self.keys = [title.lower() for title in self.titles]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def match(self, text, candidates=None):
+        """标题包含text的条目；candidates为上一次的匹配结果时只在其中查找"""
+        text = text.lower()
+        if candidates is None:
+            return [i for i, key in enumerate(self.keys) if text in key]
+        return [i for i in candidates if text in self.keys[i]]
+
+    def filtered_children(self, matches):
+        """只保留匹配条目及其祖先，返回 (子节点表, 行号表)"""
+        visible = set()
+        for i in matches:
+            while i != ROOT and i not in visible:
+                visible.add(i)
+                i = self.parents[i]
+        children = {ROOT: []}
+        rows = {}
+        for i in sorted(visible):
+            siblings = children.setdefault(self.parents[i], [])
+            rows[i] = len(siblings)
+            siblings.append(i)
+        return children, rows
+
+
+class OutlineModel(QAbstractItemModel):
+    """两列（标题、页码）的书签树模型，内部ID为条目序号"""
+
+    HEADERS = ("标题", "页码")
+
+    def __init__(self, tree=None, parent=None):
+        super().__init__(parent)
+        self.tree = tree or OutlineTree([])
+        self.children = self.tree.children
+        self.rows = self.tree.rows
+        self.fetched = {}
+        self.filter_text = ""
+        self.matches = None
+
+    def set_tree(self, tree):
+        self.beginResetModel()
+        self.tree = tree
+        self.children = tree.children
+        self.rows = tree.rows
+        self.fetched = {}
+        self.filter_text = ""
+        self.matches = None
+        self.endResetModel()
+
+    def set_filter(self, text):
+        """按标题过滤，返回匹配条目数；新文本以旧文本开头时只在上次的结果中查找"""
+        text = text.strip()
+        if text == self.filter_text:
+            return len(self.tree) if self.matches is None else len(self.matches)
+
+        self.beginResetModel()
+        if not text:
+            self.matches = None
+            self.children = self.tree.children
+            self.rows = self.tree.rows
+        else:
+            candidates = self.matches if self.filter_text and text.startswith(self.filter_text) else None
+            self.matches = self.tree.match(text, candidates)
+            self.children, self.rows = self.tree.filtered_children(self.matches)
+        self.filter_text = text
+        self.fetched = {}
+        self.endResetModel()
+        return len(self.tree) if self.matches is None else len(self.matches)
+
+    def _node(self, index):
+        return index.internalId() if index.isValid() else ROOT
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        children = self.children.get(node, ())
+        if row < 0 or row >= self.fetched.get(node, 0) or column < 0 or column >= len(self.HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = self.tree.parents[index.internalId()]
+        if parent == ROOT:
+            return QModelIndex()
+        return self.createIndex(self.rows[parent], 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return self.fetched.get(self._node(parent), 0)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        return bool(self.children.get(self._node(parent)))
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return self.fetched.get(node, 0) < len(self.children.get(node, ()))
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        start = self.fetched.get(node, 0)
+        end = min(start + FETCH_BATCH, len(self.children.get(node, ())))
+        if end <= start:
+            return
+        self.beginInsertRows(parent, start, end - 1)
+        self.fetched[node] = end
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            i = index.internalId()
+            return self.tree.titles[i] if index.column() == 0 else str(self.tree.pages[i])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
@@ -0,0 +1,97 @@
+"""
+PDF书签工具 - 书签增量更新
+对比PDF中现有书签与新书签，只修改发生变化的条目，避免set_toc重建整个大纲
+"""
+
+import pymupdf
+
+
+# 修改的条目超过该比例时，逐条修改不再划算，直接重建大纲
+PATCH_RATIO_LIMIT = 0.25
+
+
+def diff_toc(old_toc, new_toc):
+    """对比新旧书签，返回需要修改的条目 [(索引, 新标题或None, 新页码或None), ...]
+
+    增量修改只能更新已有条目的标题和目标页，层级结构（条目数和各条目层级）
+    发生变化时无法原地修改，返回None。
+    """
+    if len(old_toc) != len(new_toc):
+        return None
+
+    changes = []
+    for idx, (old, new) in enumerate(zip(old_toc, new_toc)):
+        if old[0] != new[0]:
+            return None
+        title = new[1] if old[1] != new[1] else None
+        page = new[2] if old[2] != new[2] else None
+        if title is not None or page is not None:
+            changes.append((idx, title, page))
+    return changes
+
+
+def _xref_of(doc, xref, key):
+    """读取字典中的间接引用，返回xref编号，不存在时返回0"""
+    kind, value = doc.xref_get_key(xref, key)
+    if kind != 'xref':
+        return 0
+    return int(value.split()[0])
+
+
+def outline_xrefs(doc):
+    """按get_toc的顺序（深度优先）返回所有书签条目的xref
+
+    PyMuPDF的get_outline_xrefs在大纲很大时非常慢，这里直接沿 /First、/Next 链遍历。
+    """
+    xrefs = []
+    root = _xref_of(doc, doc.pdf_catalog(), 'Outlines')
+    if not root:
+        return xrefs
+
+    stack = [_xref_of(doc, root, 'First')]
+    while stack:
+        xref = stack.pop()
+        if not xref:
+            continue
+        xrefs.append(xref)
+        # 先处理子条目，再处理后续兄弟条目
+        stack.append(_xref_of(doc, xref, 'Next'))
+        stack.append(_xref_of(doc, xref, 'First'))
+    return xrefs
+
+
+def _set_item(doc, xref, title, page):
+    """原地修改单个书签条目的标题和/或目标页（页码从1开始）"""
+    if title is not None:
+        doc.xref_set_key(xref, 'Title', pymupdf.get_pdf_str(title))
+    if page is not None:
+        if not 1 <= page <= doc.page_count:
+            raise ValueError(f"页码超出范围: {page}")
+        page_xref = doc.page_xref(page - 1)
+        top = doc.page_cropbox(page - 1).height - 36
+        doc.xref_set_key(xref, 'Dest', 'null')
+        doc.xref_set_key(xref, 'A', f"<</S/GoTo/D[{page_xref} 0 R/XYZ 72 {top:g} 0]>>")
+
+
+def patch_toc(doc, bookmarks):
+    """将书签增量应用到文档，返回 (模式, 修改条目数)
+
+    模式为 "unchanged"（无需修改）、"patched"（逐条修改）或 "rebuilt"（回退到set_toc重建）。
+    """
+    changes = diff_toc(doc.get_toc(), bookmarks)
+    if changes is None or len(changes) > max(1, len(bookmarks) * PATCH_RATIO_LIMIT):
+        doc.set_toc(bookmarks)
+        return "rebuilt", len(bookmarks)
+
+    if not changes:
+        return "unchanged", 0
+
+    xrefs = outline_xrefs(doc)
+    if len(xrefs) != len(bookmarks):
+        # 大纲中有get_toc未列出的条目，无法按索引对应
+        doc.set_toc(bookmarks)
+        return "rebuilt", len(bookmarks)
+
+    for idx, title, page in changes:
+        _set_item(doc, xrefs[idx], title, page)
+    return "patched", len(changes)
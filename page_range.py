@@ -0,0 +1,217 @@
+"""
+PDF书签工具 - 页面范围工具
+命令行版本与GUI版本共用的页面范围解析、页面合并与批量复制逻辑；
+页面选择按合并后的区间存储，开销与区间数有关，与页数无关
+"""
+
+import re
+from bisect import bisect_right
+
+
+# 单个范围：起止页可为正数、负数（-1为最后一页）或last，可带步长 :k、:odd、:even
+RANGE_PATTERN = re.compile(r'^(?P<start>-?\d+|last)?(?P<dash>-)?(?P<end>-?\d+|last)?(?::(?P<step>\d+|odd|even))?$')
+# 单独的 -N 表示第1到N页，而不是倒数第N页
+OPEN_START_PATTERN = re.compile(r'^-\d+$')
+# 范围符号两侧的空白，如 1 - 5、1-20 : 2
+SEPARATOR_SPACE_PATTERN = re.compile(r'\s*([-:])\s*')
+
+
+class PageRangeError(ValueError):
+    """页面范围格式错误"""
+
+
+def _merge(intervals):
+    """排序并合并重叠或相邻的区间"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class PageSet:
+    """页面集合：有序、互不重叠的0基闭区间 [(start, end), ...]"""
+
+    __slots__ = ("intervals",)
+
+    def __init__(self, intervals=()):
+        self.intervals = _merge(intervals)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __contains__(self, page):
+        i = bisect_right(self.intervals, (page, float('inf'))) - 1
+        return i >= 0 and self.intervals[i][0] <= page <= self.intervals[i][1]
+
+    def __eq__(self, other):
+        return isinstance(other, PageSet) and self.intervals == other.intervals
+
+    def __repr__(self):
+        return f"PageSet({self})"
+
+    def __str__(self):
+        """1基的范围文本，如 1-5,8"""
+        return ",".join(str(start + 1) if start == end else f"{start + 1}-{end + 1}"
+                        for start, end in self.intervals)
+
+    @property
+    def first(self):
+        return self.intervals[0][0] if self.intervals else None
+
+    @property
+    def last(self):
+        return self.intervals[-1][1] if self.intervals else None
+
+    def label(self):
+        """用于默认文件名的页面说明，如 第3页、第1,3,5页、第1-100页(60页)"""
+        count = len(self)
+        if count <= 5:
+            return f"第{','.join(str(page + 1) for page in self)}页"
+        return f"第{self.first + 1}-{self.last + 1}页({count}页)"
+
+    def union(self, other):
+        return PageSet(self.intervals + other.intervals)
+
+    def difference(self, other):
+        """去掉other中的页面，两个区间列表各遍历一次"""
+        result = []
+        removed = other.intervals
+        j = 0
+        for start, end in self.intervals:
+            while j < len(removed) and removed[j][1] < start:
+                j += 1
+            k = j
+            while k < len(removed) and removed[k][0] <= end:
+                if removed[k][0] > start:
+                    result.append((start, removed[k][0] - 1))
+                start = max(start, removed[k][1] + 1)
+                k += 1
+            if start <= end:
+                result.append((start, end))
+        return PageSet(result)
+
+    def clamp(self, page_count):
+        """只保留 0 到 page_count-1 之间的页面"""
+        return PageSet((max(start, 0), min(end, page_count - 1)) for start, end in self.intervals
+                       if end >= 0 and start < page_count)
+
+
+def _resolve(value, page_count):
+    """将范围端点转换为1基页码：负数从末尾倒数，last为最后一页"""
+    if value == 'last':
+        return page_count
+    number = int(value)
+    if number == 0:
+        raise PageRangeError("页码从1开始")
+    return page_count + number + 1 if number < 0 else number
+
+
+def _parse_range(text, page_count):
+    """解析单个范围（不含排除符号），返回0基区间列表"""
+    if text in ('odd', 'even'):
+        text = '1-:' + text
+    if OPEN_START_PATTERN.match(text):
+        text = '1' + text
+    match = RANGE_PATTERN.match(text)
+    if not match or not (match.group('start') or match.group('end')):
+        raise PageRangeError(f"无法识别 '{text}'")
+
+    start, end = match.group('start'), match.group('end')
+    if not match.group('dash'):
+        if end is not None:
+            raise PageRangeError(f"无法识别 '{text}'")
+        start = end = _resolve(start, page_count)
+    elif start and end:
+        # 起止页都写明时允许倒序，如 10-5
+        start, end = sorted((_resolve(start, page_count), _resolve(end, page_count)))
+    else:
+        start = _resolve(start, page_count) if start else 1
+        end = _resolve(end, page_count) if end else page_count
+    start, end = max(start, 1), min(end, page_count)
+    if start > end:
+        return []
+
+    step = match.group('step')
+    if step is None:
+        return [(start - 1, end - 1)]
+    if step in ('odd', 'even'):
+        # 调整到第一个奇数页或偶数页
+        if (start % 2 == 1) != (step == 'odd'):
+            start += 1
+        step = 2
+    else:
+        step = int(step)
+        if step == 0:
+            raise PageRangeError("步长必须大于0")
+    if step == 1:
+        return [(start - 1, end - 1)]
+    return [(page - 1, page - 1) for page in range(start, end + 1, step)]
+
+
+def parse_page_range(page_range, page_count):
+    """解析页面范围文本，返回PageSet（0基，已按page_count截断）
+
+    逗号分隔多个范围：N、A-B、A-（到最后一页）、-B（从第1页开始）、last；负数从末尾倒数（-1为最后一页，
+    如 -3- 为最后3页、5--2 为第5页到倒数第2页）；odd/even为全部奇数页/偶数页；A-B:k 每k页取一页，
+    A-B:odd/even 取范围内的奇数页/偶数页；以 ! 开头的范围从结果中排除，只有排除项时从全部页面中排除。
+    起止页写反时自动调换，超出页数的部分被忽略。格式错误时抛出PageRangeError。
+    """
+    included, excluded = [], []
+    has_include = False
+    for part in page_range.split(','):
+        part = SEPARATOR_SPACE_PATTERN.sub(r'\1', part.strip().lower())
+        if not part:
+            continue
+        if part.startswith('!'):
+            excluded.extend(_parse_range(part[1:].strip(), page_count))
+        else:
+            has_include = True
+            included.extend(_parse_range(part, page_count))
+    if not has_include and not excluded:
+        raise PageRangeError("页面范围为空")
+    if not has_include and page_count > 0:
+        included = [(0, page_count - 1)]
+    return PageSet(included).difference(PageSet(excluded))
+
+
+def page_runs(pages):
+    """将已排序的0基页码列表合并为连续区间 [(start, end), ...]，end为闭区间"""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        elif not runs or page > runs[-1][1]:
+            runs.append([page, page])
+    return [(start, end) for start, end in runs]
+
+
+def insert_page_runs(new_doc, doc, pages, progress=None):
+    """按连续区间将页面复制到新文档，每个区间只调用一次insert_pdf
+
+    pages为PageSet或已排序的0基页码列表。
+    同一源文档的多次insert_pdf共享PyMuPDF的graft映射，字体和图片等资源只复制一次。
+    progress(已复制页数, 总页数) 在每个区间复制完成后调用。返回实际复制的页数。
+    """
+    if isinstance(pages, PageSet):
+        runs = pages.clamp(doc.page_count).intervals
+    else:
+        runs = page_runs([p for p in pages if 0 <= p < doc.page_count])
+    total = sum(end - start + 1 for start, end in runs)
+    copied = 0
+    for start, end in runs:
+        new_doc.insert_pdf(doc, from_page=start, to_page=end)
+        copied += end - start + 1
+        if progress is not None:
+            progress(copied, total)
+    return copied
@@ -0,0 +1,173 @@
+"""
+PDF书签工具 - 保存引擎
+增量保存与原子替换：先写入同目录临时文件并fsync，再用os.replace一次性替换目标文件；
+完整写入时可选择保存配置，在速度与文件大小之间取舍
+"""
+
+import os
+import stat
+import tempfile
+import time
+from collections import namedtuple
+
+import pymupdf
+
+import instrument
+
+
+# 保存配置：fast不做任何压缩和清理；balanced删除未引用的对象并压缩内容流；
+# smallest合并重复对象、压缩图片和字体、清理内容流并使用对象流，耗时最长
+SAVE_PROFILES = {
+    "fast": {},
+    "balanced": {"garbage": 1, "deflate": True},
+    "smallest": {"garbage": 4, "clean": True, "deflate": True, "deflate_images": True, "deflate_fonts": True,
+                 "use_objstms": 1},
+}
+
+
+def profile_options(profile):
+    """保存配置对应的doc.save参数，profile为None时使用PyMuPDF默认参数"""
+    if profile is None:
+        return {}
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"未知的保存配置: {profile}（可选: {', '.join(SAVE_PROFILES)}）")
+    return dict(SAVE_PROFILES[profile])
+
+
+class SaveResult(namedtuple('SaveResult', ['path', 'mode', 'bytes_written', 'elapsed', 'profile'],
+                            defaults=[None])):
+    """保存结果：mode为 "incremental"（增量追加）或 "rewrite"（完整写入），profile为使用的保存配置"""
+
+    def __str__(self):
+        mode = "增量保存" if self.mode == "incremental" else "完整写入"
+        text = f"{mode} {format_size(self.bytes_written)}，耗时 {self.elapsed:.2f} 秒"
+        return f"{text}，保存配置 {self.profile}" if self.profile else text
+
+
+def format_size(size):
+    """字节数转换为便于阅读的大小"""
+    for unit in ("字节", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "字节" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ReplaceError(Exception):
+    """临时文件已写好，但无法替换目标文件（例如目标被其他程序锁定）
+
+    temp_path指向已fsync的完整临时文件，调用方可以将其移动到其他位置或删除。
+    """
+
+    def __init__(self, message, temp_path):
+        super().__init__(message)
+        self.temp_path = temp_path
+
+
+def _fsync_path(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path):
+    # Windows不支持对目录fsync
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_umask():
+    """读取进程的umask：Linux上从/proc读取，其他平台只能先设置再恢复"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# 导入时读取一次：os.umask是进程级设置，保存时临时修改会与GUI后台线程中新建的文件相互影响
+_UMASK = _read_umask()
+
+
+def _copy_mode(temp_path, target_path):
+    """mkstemp创建的文件权限为0600，替换前沿用目标文件权限，新文件则按umask设置"""
+    try:
+        mode = stat.S_IMODE(os.stat(target_path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp_path, mode)
+
+
+def atomic_save(doc, target_path, release=None, profile=None, **save_options):
+    """将文档完整写入target_path：同目录临时文件 -> fsync -> os.replace
+
+    如果target_path就是文档自身的源文件，release会在替换前被调用，用于关闭文档
+    （Windows上打开的文件无法被替换）。替换失败时抛出ReplaceError并保留临时文件。
+    profile为SAVE_PROFILES中的保存配置，save_options中的参数优先。
+    """
+    save_options = {**profile_options(profile), **save_options}
+    start = time.perf_counter()
+    target_path = os.path.abspath(target_path)
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(target_path) + '.',
+                                     suffix='.tmp', dir=os.path.dirname(target_path))
+    os.close(fd)
+    try:
+        with instrument.stage("rewrite"):
+            doc.save(temp_path, **save_options)
+        with instrument.stage("fsync"):
+            _fsync_path(temp_path)
+        _copy_mode(temp_path, target_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    bytes_written = os.path.getsize(temp_path)
+    instrument.count_written(bytes_written)
+    instrument.note("save_mode", "rewrite")
+    if release is not None:
+        release()
+    try:
+        os.replace(temp_path, target_path)
+    except OSError as e:
+        raise ReplaceError(f"无法替换文件 {target_path}: {e}", temp_path)
+    _fsync_dir(target_path)
+    return SaveResult(target_path, "rewrite", bytes_written, time.perf_counter() - start, profile)
+
+
+def save_document(doc, pdf_path, output_path=None, release=None, profile=None, **save_options):
+    """保存从pdf_path打开的文档
+
+    指定output_path（且不同于源文件）时直接完整写入output_path，源文件不会被复制或修改；
+    否则先尝试增量保存，失败时回退到原子替换。release在需要关闭文档时调用。
+    指定balanced或smallest配置时总是完整写入，增量保存无法压缩或清理已有的对象。
+    """
+    if output_path and os.path.abspath(output_path) != os.path.abspath(pdf_path):
+        return atomic_save(doc, output_path, profile=profile, **save_options)
+    if profile not in (None, "fast"):
+        return atomic_save(doc, pdf_path, release=release, profile=profile, **save_options)
+
+    start = time.perf_counter()
+    size_before = os.path.getsize(pdf_path)
+    try:
+        # 增量保存必须保留原有加密设置
+        with instrument.stage("incremental"):
+            doc.save(pdf_path, incremental=True, encryption=pymupdf.PDF_ENCRYPT_KEEP)
+    except Exception as e:
+        # 加密、修复过的文件等无法增量保存，完整写入后原子替换
+        instrument.note("incremental_error", str(e))
+        return atomic_save(doc, pdf_path, release=release, profile=profile, **save_options)
+    with instrument.stage("fsync"):
+        _fsync_path(pdf_path)
+    bytes_written = os.path.getsize(pdf_path) - size_before
+    instrument.count_written(bytes_written)
+    instrument.note("save_mode", "incremental")
+    return SaveResult(os.path.abspath(pdf_path), "incremental",
+                      bytes_written, time.perf_counter() - start, profile)
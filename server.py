@@ -0,0 +1,234 @@
+"""
+PDF书签工具 - 常驻服务
+通过Unix域套接字提供JSON-RPC 2.0服务（每行一个JSON消息），请求在预热的进程池中并发执行，
+省去每次调用时启动解释器、导入PyMuPDF和打开文档的开销
+"""
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+import cli
+import instrument
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'pdf_bm_tools.sock')
+
+# JSON-RPC 2.0 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+# 方法名 -> (必需参数, 可选参数)
+METHODS = {
+    'ping': ((), ()),
+    'info': (('pdf',), ('instrument',)),
+    'view': (('pdf',), ('instrument',)),
+    'apply': (('pdf', 'bookmarks'), ('update', 'output', 'offset', 'profile', 'instrument')),
+    'extract': (('pdf', 'pages'), ('output', 'profile', 'instrument')),
+}
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _init_worker(cache):
+    """进程池初始化：预先导入PyMuPDF，按需启用文档缓存"""
+    import pymupdf  # noqa: F401
+    if cache:
+        from doc_cache import DocumentCache
+        cli.document_cache = DocumentCache()
+
+
+def _execute(method, params):
+    """在工作进程中执行操作，捕获输出；instrument为真时在结果中附带性能剖析（profile）"""
+    if method == 'ping':
+        return {'ok': True, 'output': 'pong', 'pid': os.getpid()}
+
+    profiler = instrument.Profiler(method) if params.get('instrument') else contextlib.nullcontext()
+    buffer = io.StringIO()
+    with profiler, contextlib.redirect_stdout(buffer):
+        if method == 'info':
+            ok = cli.load_pdf_info(params['pdf'])
+        elif method == 'view':
+            ok = cli.view_pdf_bookmarks(params['pdf'])
+        elif method == 'apply':
+            ok = cli.apply_bookmarks(params['pdf'], params['bookmarks'],
+                                     params.get('update', False), params.get('output'), params.get('offset'),
+                                     params.get('profile'))
+        else:
+            ok = cli.extract_pages(params['pdf'], params['pages'], params.get('output'), params.get('profile'))
+    result = {'ok': ok, 'output': buffer.getvalue().strip()}
+    if params.get('instrument'):
+        profiler.ok = ok
+        result['profile'] = profiler.report()
+    return result
+
+
+def _validate(request):
+    if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or 'method' not in request:
+        raise RpcError(INVALID_REQUEST, "无效的JSON-RPC请求")
+    method = request['method']
+    if method not in METHODS:
+        raise RpcError(METHOD_NOT_FOUND, f"未知方法: {method}")
+    params = request.get('params') or {}
+    if not isinstance(params, dict):
+        raise RpcError(INVALID_PARAMS, "params必须是对象")
+    required, optional = METHODS[method]
+    missing = [name for name in required if not params.get(name)]
+    if missing:
+        raise RpcError(INVALID_PARAMS, f"缺少参数: {', '.join(missing)}")
+    unknown = set(params) - set(required) - set(optional)
+    if unknown:
+        raise RpcError(INVALID_PARAMS, f"未知参数: {', '.join(sorted(unknown))}")
+    return method, params
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """每个连接一个线程，逐行读取请求；实际工作交给进程池"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.dispatch(line)
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class BookmarkServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, executor):
+        self.executor = executor
+        self._write_locks = {}
+        self._locks_guard = threading.Lock()
+        super().__init__(socket_path, RequestHandler)
+
+    def _write_lock(self, path):
+        """同一文件的写操作串行执行"""
+        key = os.path.abspath(path)
+        with self._locks_guard:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def dispatch(self, line):
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RpcError(PARSE_ERROR, "JSON解析失败")
+            if isinstance(request, dict):
+                request_id = request.get('id')
+            method, params = _validate(request)
+
+            if method == 'ping':
+                # 直接在主进程中应答，工作进程全部忙碌时也能确认服务在运行
+                result = {'ok': True, 'output': 'pong', 'pid': os.getpid()}
+            elif method == 'apply':
+                with self._write_lock(params.get('output') or params['pdf']):
+                    result = self.executor.submit(_execute, method, params).result()
+            else:
+                result = self.executor.submit(_execute, method, params).result()
+            return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        except RpcError as e:
+            return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': SERVER_ERROR, 'message': str(e)}}
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(socket_path=DEFAULT_SOCKET, workers=None, cache=False):
+    """启动常驻服务，直到收到Ctrl+C"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print("当前系统不支持Unix域套接字")
+        return False
+
+    # 清理上次异常退出留下的套接字文件
+    if os.path.exists(socket_path):
+        try:
+            call(socket_path, 'ping', timeout=1)
+            print(f"服务已在运行: {socket_path}")
+            return False
+        except (ConnectionRefusedError, FileNotFoundError):
+            # 没有进程在监听，是残留的套接字文件
+            os.remove(socket_path)
+        except OSError as e:
+            # 超时等情况下服务可能仍在运行，删除套接字会使其无法访问
+            print(f"套接字 {socket_path} 已存在，但无法确认服务是否在运行（{e}），请确认后手动删除或使用其他 --socket")
+            return False
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache,)) as executor:
+        # 在主线程中预热所有工作进程
+        for future in [executor.submit(_execute, 'ping', {}) for _ in range(workers)]:
+            future.result()
+
+        server = BookmarkServer(socket_path, executor)
+        # SIGTERM与Ctrl+C一样正常退出并删除套接字文件
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        print(f"服务已启动: {socket_path}（{workers} 个工作进程{'，启用文档缓存' if cache else ''}）", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n服务已停止")
+        finally:
+            server.server_close()
+            try:
+                os.remove(socket_path)
+            except OSError:
+                pass
+    return True
+
+
+def call(socket_path, method, params=None, timeout=None):
+    """向常驻服务发送一个请求，返回响应字典"""
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params or {}}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("服务未返回响应")
+    return json.loads(line)
+
+
+def run_client(socket_path, method, params, profile_output=None):
+    """命令行客户端：打印结果，成功返回True
+
+    结果中带有性能剖析时写入profile_output，未指定时输出到标准错误。
+    """
+    try:
+        response = call(socket_path, method, params)
+    except OSError as e:
+        print(f"无法连接服务 {socket_path}: {e}", file=sys.stderr)
+        return False
+
+    if 'error' in response:
+        print(f"请求失败: {response['error']['message']}", file=sys.stderr)
+        return False
+    result = response['result']
+    if result.get('output'):
+        print(result['output'])
+    if result.get('profile'):
+        instrument.write_report(result['profile'], profile_output)
+    return bool(result.get('ok'))
@@ -0,0 +1,145 @@
+"""
+PDF书签工具 - 按书签拆分PDF
+按指定层级的书签将PDF拆分为多个文件，每个文件带有重新映射页码的子书签；
+各工作进程只读打开同一个源文件，分别写出连续的一批章节
+"""
+
+import os
+import re
+
+
+# 每个工作进程分到的批次数，批次越多负载越均衡，但每批都要重新打开源文件
+BATCHES_PER_WORKER = 4
+# 文件名中标题部分的最大长度
+MAX_TITLE_LENGTH = 80
+
+INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class Section:
+    """拆分出的一个文件：源文档中 [start, end] 页（0基，闭区间）及其子书签"""
+
+    __slots__ = ("index", "title", "start", "end", "toc")
+
+    def __init__(self, index, title, start, end, toc):
+        self.index = index
+        self.title = title
+        self.start = start
+        self.end = end
+        self.toc = toc
+
+    @property
+    def page_count(self):
+        return self.end - self.start + 1
+
+    def filename(self):
+        title = INVALID_FILENAME_CHARS.sub('_', self.title).strip(' ._')[:MAX_TITLE_LENGTH]
+        return f"{self.index:03d}_{title or '未命名'}.pdf"
+
+
+def plan_sections(toc, level, page_count):
+    """按层级为level的书签划分章节
+
+    每个章节从该书签的页码开始，到下一个同级或更高级书签的前一页结束，最后一个章节到文档末尾。
+    章节内的下级书签层级上移、页码换算为新文件中的页码，章节书签本身成为新文件的顶级书签。
+    没有目标页的书签和第一个章节之前的页面不会输出。
+    """
+    heads = [i for i, (entry_level, _, page) in enumerate(toc)
+             if entry_level == level and 1 <= page <= page_count]
+    sections = []
+    for number, i in enumerate(heads, 1):
+        start = toc[i][2] - 1
+        # 章节范围到下一个同级或更高级（有目标页的）书签为止
+        end = page_count - 1
+        j = i + 1
+        while j < len(toc):
+            if toc[j][0] <= level and toc[j][2] > 0:
+                end = max(start, toc[j][2] - 2)
+                break
+            j += 1
+
+        sub_toc = [[1, toc[i][1], 1]]
+        skipped_level = None  # 被丢弃的书签的层级，其下级书签一并丢弃
+        for entry_level, title, page in toc[i + 1:j]:
+            if skipped_level is not None:
+                if entry_level > skipped_level:
+                    continue
+                skipped_level = None
+            if entry_level <= level:
+                continue
+            if page > 0 and not start < page <= end + 1:
+                skipped_level = entry_level
+                continue
+            # 层级不能一次跳过多级（书签TXT文件中可能出现），否则set_toc会拒绝整个目录
+            new_level = min(entry_level - level + 1, sub_toc[-1][0] + 1)
+            sub_toc.append([new_level, title, page - start if page > 0 else page])
+        sections.append(Section(number, toc[i][1], start, end, sub_toc))
+    return sections
+
+
+def write_sections(pdf_path, sections, output_dir, profile=None):
+    """工作进程入口：打开一次源文件，依次写出一批章节，返回写出的文件路径"""
+    import pymupdf
+    from save_engine import profile_options
+
+    # 未指定保存配置时只清理未引用的对象
+    options = profile_options(profile) if profile else {"garbage": 1}
+
+    paths = []
+    with pymupdf.open(pdf_path) as doc:
+        for section in sections:
+            new_doc = pymupdf.open()
+            try:
+                new_doc.insert_pdf(doc, from_page=section.start, to_page=section.end)
+                new_doc.set_toc(section.toc)
+                path = os.path.join(output_dir, section.filename())
+                new_doc.save(path, **options)
+            finally:
+                new_doc.close()
+            paths.append(path)
+    return paths
+
+
+def _batches(sections, count):
+    """将章节按页数均分为count个连续批次"""
+    total = sum(section.page_count for section in sections)
+    target = total / count
+    batches = [[]]
+    pages = 0
+    for section in sections:
+        if batches[-1] and pages >= target * len(batches):
+            batches.append([])
+        batches[-1].append(section)
+        pages += section.page_count
+    return batches
+
+
+def split_pdf(pdf_path, sections, output_dir, workers=None, progress=None, profile=None):
+    """并行写出各章节，返回写出的文件路径列表（按章节顺序）
+
+    progress(已写出数, 总数) 在每批完成后调用；profile为保存配置。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if not sections:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(sections))
+    if workers == 1:
+        paths = write_sections(pdf_path, sections, output_dir, profile)
+        if progress is not None:
+            progress(len(paths), len(sections))
+        return paths
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    batches = _batches(sections, min(workers * BATCHES_PER_WORKER, len(sections)))
+    results = {}
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(write_sections, pdf_path, batch, output_dir, profile): n
+                   for n, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            done += len(results[futures[future]])
+            if progress is not None:
+                progress(done, len(sections))
+    return [path for n in range(len(batches)) for path in results[n]]
@@ -0,0 +1,62 @@
+"""
+PDF书签工具 - 自动生成书签测试
+"""
+
+from collections import Counter
+
+import pytest
+
+import autogen
+
+TEST_PDF = "test_files/test.pdf"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("第一章本指南概述入门知识", ("第", "章")),
+    ("第12节 小结", ("第", "节")),
+    ("Chapter 3 Results", ("chapter",)),
+    ("2.1 理解基本概念", ("dotted", 2)),
+    ("2.1.1 定义", ("dotted", 3)),
+    ("1. 引言", ("dotted", 1)),
+    ("3D打印", None),
+    ("空的", None),
+])
+def test_numbering_key(text, expected):
+    assert autogen.numbering_key(text) == expected
+
+
+def test_test_pdf_headings():
+    """封面文字不作为标题，字号不一致的各章同为1级，x.y.z标题在3级"""
+    bookmarks = autogen.generate_bookmarks(TEST_PDF, use_index=False)
+    titles = [title for _, title, _ in bookmarks]
+    assert not {"空的", "还是空的", "下一页才是"} & set(titles)
+    chapters = [bookmark for bookmark in bookmarks if bookmark[1].startswith("第")]
+    assert [(level, page) for level, _, page in chapters] == [(1, 4), (1, 5), (1, 9), (1, 14)]
+    assert [2, "2.1 理解基本概念的重要性", 5] in bookmarks
+    assert [3, "2.1.1 定义基本概念的含义", 5] in bookmarks
+    assert sum(1 for level, _, _ in bookmarks if level == 3) == 8
+
+
+def line(page, ordinal, text, size, top=0.0):
+    return (page, ordinal, text, size, False, top, top + size)
+
+
+def test_single_page_style_ignored():
+    lines = [line(0, 0, "封面大字", 40.0)]
+    for page in range(1, 5):
+        lines.append(line(page, 0, f"标题{page}", 20.0))
+    bookmarks = autogen.detect_headings(5, Counter({10.0: 1000}), lines)
+    assert [title for _, title, _ in bookmarks] == ["标题1", "标题2", "标题3", "标题4"]
+
+
+def test_nearby_sizes_merged():
+    lines = [line(0, 0, "甲", 20.0), line(1, 0, "乙", 20.5), line(2, 0, "丙", 16.0), line(3, 0, "丁", 16.0)]
+    bookmarks = autogen.detect_headings(4, Counter({10.0: 1000}), lines)
+    assert bookmarks == [[1, "甲", 1], [1, "乙", 2], [2, "丙", 3], [2, "丁", 4]]
+
+
+def test_wrapped_title_joined():
+    lines = [line(0, 0, "很长的标题", 20.0, 100.0), line(0, 1, "第二行", 20.0, 122.0),
+             line(1, 0, "另一个标题", 20.0, 100.0)]
+    bookmarks = autogen.detect_headings(2, Counter({10.0: 1000}), lines)
+    assert bookmarks == [[1, "很长的标题 第二行", 1], [1, "另一个标题", 2]]
@@ -0,0 +1,81 @@
+"""
+PDF书签工具 - 书签文件解析测试
+"""
+
+import codecs
+
+import pytest
+
+import bookmark_parser
+from bookmark_parser import check_structure, parse_bookmark_file, parse_line
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1|第一章 引言|1", [1, "第一章 引言", 1]),
+    ("  2 | 2.1 基本概念 | 5 ", [2, "2.1 基本概念", 5]),
+    ("第二章 基础知识 (5)", [1, "第二章 基础知识", 5]),
+    ("    3.1.1 详细说明（12）", [3, "3.1.1 详细说明", 12]),
+    ("\t2.1 制表符缩进 (3)", [3, "2.1 制表符缩进", 3]),
+    ("没有页码的标题", [1, "没有页码的标题", 1]),
+    ("", None),
+    ("# 注释", None),
+])
+def test_parse_line(line, expected):
+    assert parse_line(line) == expected
+
+
+@pytest.mark.parametrize("line", ["a|标题|1", "1|标题|x", "0|标题|1", "1||1", "标题 (五)"])
+def test_parse_line_errors(line):
+    with pytest.raises(ValueError):
+        parse_line(line)
+
+
+def test_check_structure():
+    entries = [(1, "", [1, "a", 1]), (2, "", [3, "b", 2]), (3, "", [1, "c", 9]), (4, "", [1, "d", 4])]
+    messages = [(d.line_num, d.message) for d in check_structure(entries, page_limit=8)]
+    assert messages == [(2, "层级从1跳到3，每次只能深入一级"),
+                        (3, "页码9超出PDF页数范围(1-8)"),
+                        (4, "页码4小于上一个书签的页码9")]
+
+
+def test_first_entry_must_be_level_one():
+    diagnostics = check_structure([(1, "", [2, "a", 1])])
+    assert [d.message for d in diagnostics] == ["第一个书签的层级应为1: 2"]
+
+
+def test_invalid_lines_do_not_stop_parsing(tmp_path):
+    path = tmp_path / "toc.txt"
+    path.write_text("1|a|1\n1|b|x\n1|c|3\n", encoding="utf-8")
+    bookmarks, diagnostics = parse_bookmark_file(str(path))
+    assert bookmarks == [[1, "a", 1], [1, "c", 3]]
+    assert [d.line_num for d in diagnostics] == [2]
+
+
+def test_gbk_line_after_ascii_sample(tmp_path):
+    """采样范围内全是ASCII、之后才出现GBK行时逐行解码，不中断解析"""
+    path = tmp_path / "toc.txt"
+    ascii_part = b"1|Introduction|1\n" * (bookmark_parser.SNIFF_SIZE // 16 + 1)
+    path.write_bytes(ascii_part + "1|第二章 概述|5\n".encode("gbk") + "1|第三章|7\n".encode("utf-8"))
+    bookmarks, diagnostics = parse_bookmark_file(str(path))
+    assert bookmarks[-2:] == [[1, "第二章 概述", 5], [1, "第三章", 7]]
+    assert diagnostics == []
+
+
+def test_undecodable_line_reported(tmp_path):
+    path = tmp_path / "toc.txt"
+    path.write_bytes(b"1|a|1\n1|\xff\xfe\xff|2\n1|b|3\n")
+    bookmarks, diagnostics = parse_bookmark_file(str(path))
+    assert bookmarks == [[1, "a", 1], [1, "b", 3]]
+    assert [d.line_num for d in diagnostics] == [2]
+
+
+@pytest.mark.parametrize("data", [
+    "1|第一章|1\n".encode("gbk"),
+    codecs.BOM_UTF8 + "1|第一章|1\n".encode("utf-8"),
+    "1|第一章|1\n".encode("utf-16"),
+])
+def test_encodings(tmp_path, data):
+    path = tmp_path / "toc.txt"
+    path.write_bytes(data)
+    assert parse_bookmark_file(str(path)) == ([[1, "第一章", 1]], [])
+    assert bookmark_parser.decode_text(data).lstrip("﻿") == "1|第一章|1\n"
@@ -0,0 +1,21 @@
+"""
+PDF书签工具 - 命令行版本测试
+"""
+
+import os
+
+import cli
+
+
+def _crashing_worker(pdf_path, bookmark_path, update=False, offset=None, profile=None):
+    os._exit(1)
+
+
+def test_batch_reports_path_when_worker_dies(tmp_path, monkeypatch, capsys):
+    """工作进程异常退出时按提交时的文件报告失败，而不是 ?"""
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n")
+    monkeypatch.setattr(cli, "_apply_bookmarks_worker", _crashing_worker)
+    failed = cli.batch_apply_bookmarks(str(tmp_path), workers=1)
+    assert sorted(failed) == [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+    assert "?" not in capsys.readouterr().out
@@ -0,0 +1,40 @@
+"""
+PDF书签工具 - 任务清单测试
+"""
+
+import json
+import os
+
+import manifest
+
+
+def _fake_run_job(op, params):
+    if os.path.basename(params["pdf"]) == "crash.pdf":
+        os._exit(1)
+    return True, "ok"
+
+
+def _write_manifest(tmp_path, names):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps([{"op": "info", "pdf": name, "id": name} for name in names]), encoding="utf-8")
+    return str(path)
+
+
+def test_worker_crash_fails_chunk_and_continues(tmp_path, monkeypatch):
+    """工作进程崩溃时在途任务记为失败，尚未提交的组在新的进程池中继续执行"""
+    monkeypatch.setattr(manifest, "run_job", _fake_run_job)
+    path = _write_manifest(tmp_path, ["crash.pdf", "b.pdf", "c.pdf", "d.pdf"])
+    done, failed, skipped = manifest.run_manifest(path, workers=1)
+
+    with open(path + ".journal.jsonl", encoding="utf-8") as f:
+        records = {record["job"]: record["status"] for record in map(json.loads, f)}
+    # 单个工作进程时crash.pdf与b.pdf同时在途，随进程池一起失败
+    assert records == {"crash.pdf": "failed", "b.pdf": "failed", "c.pdf": "done", "d.pdf": "done"}
+    assert (done, failed, skipped) == (2, 2, 0)
+
+
+def test_journal_skips_done_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "run_job", _fake_run_job)
+    path = _write_manifest(tmp_path, ["a.pdf", "b.pdf"])
+    assert manifest.run_manifest(path, workers=1) == (2, 0, 0)
+    assert manifest.run_manifest(path, workers=1) == (0, 0, 0)
@@ -0,0 +1,49 @@
+"""
+PDF书签工具 - 页码偏移检测测试
+"""
+
+import pytest
+
+import offset_detect
+
+
+class FakeDoc:
+    def __init__(self, page_count):
+        self.page_count = page_count
+
+
+def _labels(segments):
+    """按 [(结束物理页(0基,不含), 类型, 偏移), ...] 生成read_page_labels的替身"""
+    def read_page_labels(doc, page_num):
+        for end, kind, offset in segments:
+            if page_num < end:
+                return [(kind, offset)]
+        return []
+    return read_page_labels
+
+
+def test_two_segments(monkeypatch):
+    monkeypatch.setattr(offset_detect, "read_page_labels", _labels([(37, "roman", 0), (1000, "arabic", 37)]))
+    mapping = offset_detect.detect_page_mapping(FakeDoc(1000))
+    assert mapping.segments == [(1, 37, "roman", 0), (38, 1000, "arabic", 37)]
+    assert mapping.body_start == 38
+    assert mapping.to_physical(10) == 47
+
+
+def test_third_label_between_samples(monkeypatch):
+    """两个抽样页之间还有第三种标签时，两侧的分界都能找到"""
+    monkeypatch.setattr(offset_detect, "read_page_labels",
+                        _labels([(110, "roman", 0), (120, "arabic", 110), (1000, "arabic", 120)]))
+    mapping = offset_detect.detect_page_mapping(FakeDoc(1000))
+    assert mapping.segments == [(1, 110, "roman", 0), (111, 120, "arabic", 110), (121, 1000, "arabic", 120)]
+    assert mapping.pages_read < 100
+
+
+def test_no_labels(monkeypatch):
+    monkeypatch.setattr(offset_detect, "read_page_labels", _labels([]))
+    assert offset_detect.detect_page_mapping(FakeDoc(50)) is None
+
+
+@pytest.mark.parametrize("text, value", [("iv", 4), ("XII", 12), ("mcmxc", 1990), ("iiii", None)])
+def test_roman_to_int(text, value):
+    assert offset_detect.roman_to_int(text) == value
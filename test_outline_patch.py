@@ -0,0 +1,46 @@
+"""
+PDF书签工具 - 书签增量更新测试
+"""
+
+import pymupdf
+
+from outline_patch import diff_toc, patch_toc
+
+
+OLD = [[1, "第一章", 1], [2, "1.1", 2], [1, "第二章", 3]]
+
+
+def test_diff_toc():
+    assert diff_toc(OLD, OLD) == []
+    new = [[1, "第一章 概述", 1], [2, "1.1", 2], [1, "第二章", 4]]
+    assert diff_toc(OLD, new) == [(0, "第一章 概述", None), (2, None, 4)]
+
+
+def test_diff_toc_structure_change():
+    assert diff_toc(OLD, OLD[:2]) is None
+    assert diff_toc(OLD, [[1, "第一章", 1], [1, "1.1", 2], [1, "第二章", 3]]) is None
+
+
+def _doc(toc, pages=8):
+    doc = pymupdf.open()
+    for _ in range(pages):
+        doc.new_page()
+    doc.set_toc(toc)
+    return doc
+
+
+def test_patch_toc():
+    toc = [[1, f"第{i}章", i] for i in range(1, 9)]
+    with _doc(toc) as doc:
+        assert patch_toc(doc, toc) == ("unchanged", 0)
+        new = [list(entry) for entry in toc]
+        new[3] = [1, "第四章 改名", 5]
+        assert patch_toc(doc, new) == ("patched", 1)
+        assert doc.get_toc(simple=True) == new
+
+
+def test_patch_toc_rebuilds_on_structure_change():
+    with _doc(OLD) as doc:
+        new = OLD + [[1, "第三章", 5]]
+        assert patch_toc(doc, new) == ("rebuilt", 4)
+        assert doc.get_toc(simple=True) == new
@@ -0,0 +1,58 @@
+"""
+PDF书签工具 - 页面范围测试
+"""
+
+import pytest
+
+from page_range import PageRangeError, PageSet, page_runs, parse_page_range
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1-5", "1-5"),
+    ("1 - 5", "1-5"),
+    (" 2 ,4 - 6 ", "2,4-6"),
+    ("1-20 : 2", "1,3,5,7,9"),
+    ("-3", "1-3"),
+    ("-3-", "8-10"),
+    ("5--2", "5-9"),
+    ("10-5", "5-10"),
+    ("last", "10"),
+    ("3-100", "3-10"),
+    ("odd", "1,3,5,7,9"),
+    ("1-:even", "2,4,6,8,10"),
+    ("!2-3", "1,4-10"),
+    ("1-10,!4", "1-3,5-10"),
+    ("1-10, ! 4 - 5", "1-3,6-10"),
+])
+def test_parse_page_range(text, expected):
+    assert str(parse_page_range(text, 10)) == expected
+
+
+@pytest.mark.parametrize("text", ["1 2", "0", "a", "1-5:0", "", " , "])
+def test_parse_page_range_errors(text):
+    with pytest.raises(PageRangeError):
+        parse_page_range(text, 10)
+
+
+def test_page_set():
+    pages = PageSet([(8, 9), (0, 2), (3, 4)])
+    assert pages.intervals == [(0, 4), (8, 9)]
+    assert len(pages) == 7
+    assert list(pages) == [0, 1, 2, 3, 4, 8, 9]
+    assert 4 in pages and 5 not in pages and -1 not in pages
+    assert (pages.first, pages.last) == (0, 9)
+    assert pages.label() == "第1-10页(7页)"
+    assert PageSet([(2, 2), (4, 4)]).label() == "第3,5页"
+
+
+def test_page_set_operations():
+    pages = PageSet([(0, 4), (8, 9)])
+    assert pages.union(PageSet([(5, 7)])) == PageSet([(0, 9)])
+    assert pages.difference(PageSet([(2, 8)])) == PageSet([(0, 1), (9, 9)])
+    assert pages.difference(PageSet([(0, 9)])) == PageSet()
+    assert pages.clamp(9) == PageSet([(0, 4), (8, 8)])
+    assert not PageSet()
+
+
+def test_page_runs():
+    assert page_runs([0, 1, 2, 5, 6, 9]) == [(0, 2), (5, 6), (9, 9)]
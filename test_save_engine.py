@@ -0,0 +1,41 @@
+"""
+PDF书签工具 - 保存引擎测试
+"""
+
+import os
+import stat
+
+import pymupdf
+
+import save_engine
+
+
+def _new_doc():
+    doc = pymupdf.open()
+    doc.new_page()
+    return doc
+
+
+def test_new_file_follows_umask(tmp_path):
+    target = tmp_path / "new.pdf"
+    with _new_doc() as doc:
+        save_engine.atomic_save(doc, str(target))
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o666 & ~save_engine._UMASK
+
+
+def test_existing_file_mode_kept(tmp_path):
+    target = tmp_path / "existing.pdf"
+    target.write_bytes(b"")
+    os.chmod(target, 0o640)
+    with _new_doc() as doc:
+        save_engine.atomic_save(doc, str(target))
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o640
+
+
+def test_umask_read_without_changing_it():
+    umask = os.umask(0o027)
+    try:
+        assert save_engine._read_umask() == 0o027
+        assert os.umask(0o027) == 0o027
+    finally:
+        os.umask(umask)
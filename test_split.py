@@ -0,0 +1,38 @@
+"""
+PDF书签工具 - 按书签拆分测试
+"""
+
+from split import Section, plan_sections
+
+
+def test_plan_sections():
+    toc = [[1, "前言", 1], [1, "第一章", 3], [2, "1.1", 4], [1, "第二章", 6], [2, "2.1", 8]]
+    sections = plan_sections(toc, 1, 10)
+    assert [(s.title, s.start, s.end) for s in sections] == [("前言", 0, 1), ("第一章", 2, 4), ("第二章", 5, 9)]
+    assert sections[1].toc == [[1, "第一章", 1], [2, "1.1", 2]]
+    assert sections[2].toc == [[1, "第二章", 1], [2, "2.1", 3]]
+
+
+def test_out_of_range_sub_bookmark_drops_descendants():
+    """页码不在章节范围内的下级书签连同其下级一起丢弃，不会留下跳级的书签"""
+    toc = [[1, "A", 1], [2, "A.1", 2], [2, "越界", 50], [3, "越界的下级", 50], [3, "越界的下级2", 3],
+           [2, "A.2", 3], [1, "B", 6]]
+    section = plan_sections(toc, 1, 10)[0]
+    assert section.toc == [[1, "A", 1], [2, "A.1", 2], [2, "A.2", 3]]
+
+
+def test_level_jump_clamped():
+    toc = [[1, "A", 1], [2, "A.1", 2], [4, "跳级", 3]]
+    assert plan_sections(toc, 1, 5)[0].toc == [[1, "A", 1], [2, "A.1", 2], [3, "跳级", 3]]
+
+
+def test_second_level_sections():
+    toc = [[1, "第一章", 1], [2, "1.1", 2], [3, "1.1.1", 3], [2, "1.2", 5], [1, "第二章", 7]]
+    sections = plan_sections(toc, 2, 8)
+    assert [(s.title, s.start, s.end) for s in sections] == [("1.1", 1, 3), ("1.2", 4, 5)]
+    assert sections[0].toc == [[1, "1.1", 1], [2, "1.1.1", 2]]
+
+
+def test_section_filename():
+    assert Section(3, 'a/b:c?', 0, 0, []).filename() == "003_a_b_c.pdf"
+    assert Section(1, '...', 0, 0, []).filename() == "001_未命名.pdf"
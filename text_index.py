@@ -0,0 +1,221 @@
+"""
+PDF书签工具 - 页面文本索引
+将每页的文本行及字号信息缓存到SQLite数据库，按文件内容哈希和页码索引，
+再次处理同一文件时跳过文本提取；多个进程可以同时读写同一个索引
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+# 索引总大小上限（按缓存的文本字节数计），超出时淘汰最久未使用的文档
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 每个分片的页数
+SHARD_SIZE = 50
+# 其他进程写入时最多等待的秒数
+BUSY_TIMEOUT = 30
+# PyMuPDF span flags 中表示粗体的位
+BOLD_FLAG = 16
+# 每个文本行的字段数：文本、字号、是否粗体、上边缘y、下边缘y
+LINE_FIELDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT);
+CREATE TABLE IF NOT EXISTS docs (hash TEXT PRIMARY KEY, bytes INTEGER NOT NULL DEFAULT 0, last_used REAL);
+CREATE TABLE IF NOT EXISTS pages (hash TEXT, page INTEGER, lines TEXT, sizes TEXT, PRIMARY KEY (hash, page))
+    WITHOUT ROWID;
+"""
+
+
+def default_index_path():
+    """索引文件位置，可用环境变量 PDF_BM_INDEX 指定"""
+    path = os.environ.get('PDF_BM_INDEX')
+    if path:
+        return path
+    base = (os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+            or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'pdf_bm_tools', 'text_index.sqlite')
+
+
+def _round_size(size):
+    """字号按0.5pt取整，消除浮点误差"""
+    return round(size * 2) / 2
+
+
+def extract_pages(pdf_path, pages):
+    """提取指定页面（0基）的文本，返回 {页码: (文本行, 各字号字符数)}
+
+    文本行为 [(文本, 最大字号, 是否粗体, 上边缘y, 下边缘y), ...]，按页面中的阅读顺序排列；
+    各字号字符数为 {字号: 字符数}。
+    """
+    import pymupdf
+
+    records = {}
+    with pymupdf.open(pdf_path) as doc:
+        for page_num in pages:
+            sizes = {}
+            lines = []
+            text_dict = doc[page_num].get_text("dict", flags=pymupdf.TEXTFLAGS_TEXT)
+            for block in text_dict["blocks"]:
+                for line in block.get("lines", []):
+                    spans = [span for span in line["spans"] if span["text"].strip()]
+                    if not spans:
+                        continue
+                    for span in spans:
+                        size = _round_size(span["size"])
+                        sizes[size] = sizes.get(size, 0) + len(span["text"].strip())
+                    text = "".join(span["text"] for span in spans).strip()
+                    size = _round_size(max(span["size"] for span in spans))
+                    bold = all(span["flags"] & BOLD_FLAG or "bold" in span["font"].lower() for span in spans)
+                    top, bottom = line["bbox"][1], line["bbox"][3]
+                    lines.append((text, size, bold, round(top, 1), round(bottom, 1)))
+            records[page_num] = (lines, sizes)
+    return records
+
+
+class TextIndex:
+    """SQLite页面文本索引
+
+    使用WAL模式，读操作不会被写操作阻塞；写操作在短事务中完成，并发写入时等待而不是失败。
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_index_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def file_hash(self, pdf_path):
+        """文件内容的SHA-256；文件大小和修改时间未变时直接使用记录的哈希，不重新读取文件"""
+        path = os.path.abspath(pdf_path)
+        stat = os.stat(path)
+        row = self.conn.execute("SELECT size, mtime_ns, hash FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        doc_hash = digest.hexdigest()
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                          (path, stat.st_size, stat.st_mtime_ns, doc_hash))
+        return doc_hash
+
+    def get(self, doc_hash, pages):
+        """读取已缓存的页面，返回 {页码: (文本行, 各字号字符数)}
+
+        旧版本缓存的文本行没有位置信息，这些页面视为未缓存，重新提取后覆盖。
+        """
+        wanted = set(pages)
+        records = {}
+        for page, lines, sizes in self.conn.execute("SELECT page, lines, sizes FROM pages WHERE hash = ?",
+                                                    (doc_hash,)):
+            if page in wanted:
+                lines = [tuple(line) for line in json.loads(lines)]
+                if any(len(line) < LINE_FIELDS for line in lines):
+                    continue
+                records[page] = (lines, {float(size): count for size, count in json.loads(sizes).items()})
+        if records:
+            self.conn.execute("UPDATE docs SET last_used = ? WHERE hash = ?", (time.time(), doc_hash))
+        return records
+
+    def put(self, doc_hash, records):
+        """写入新提取的页面，超出大小上限时淘汰最久未使用的文档"""
+        rows = [(doc_hash, page, json.dumps(lines, ensure_ascii=False), json.dumps(sizes))
+                for page, (lines, sizes) in records.items()]
+        # BEGIN IMMEDIATE 立即获取写锁，避免两个进程同时由读事务升级为写事务而死锁
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = 0
+            for row in rows:
+                # 覆盖旧版本缓存的页面时扣除其原有大小
+                old = self.conn.execute("SELECT length(lines) + length(sizes) FROM pages WHERE hash = ? AND page = ?",
+                                        row[:2]).fetchone()
+                self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", row)
+                added += len(row[2]) + len(row[3]) - (old[0] if old else 0)
+            self.conn.execute("INSERT OR IGNORE INTO docs (hash, bytes) VALUES (?, 0)", (doc_hash,))
+            self.conn.execute("UPDATE docs SET bytes = bytes + ?, last_used = ? WHERE hash = ?",
+                              (added, time.time(), doc_hash))
+            self._evict(doc_hash)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, keep_hash):
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM docs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for doc_hash, size in self.conn.execute(
+                "SELECT hash, bytes FROM docs WHERE hash != ? ORDER BY last_used", (keep_hash,)).fetchall():
+            for table in ("pages", "docs", "files"):
+                self.conn.execute(f"DELETE FROM {table} WHERE hash = ?", (doc_hash,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def _extract_parallel(pdf_path, pages, workers=None):
+    """页面分片到多个进程并行提取"""
+    shards = [pages[i:i + SHARD_SIZE] for i in range(0, len(pages), SHARD_SIZE)]
+    if len(shards) <= 1 or workers == 1:
+        results = [extract_pages(pdf_path, shard) for shard in shards]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        workers = min(workers or os.cpu_count() or 1, len(shards))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(extract_pages, [pdf_path] * len(shards), shards))
+    records = {}
+    for shard_records in results:
+        records.update(shard_records)
+    return records
+
+
+def load_pages(pdf_path, pages, workers=None, use_index=True):
+    """读取指定页面（0基）的文本行和字号信息，已索引的页面直接从索引读取
+
+    索引不可用（如目录只读）时直接提取，不影响调用方。
+    """
+    pages = sorted(set(pages))
+    index = None
+    records = {}
+    if use_index:
+        try:
+            index = TextIndex()
+            doc_hash = index.file_hash(pdf_path)
+            records = index.get(doc_hash, pages)
+        except (sqlite3.Error, OSError):
+            if index is not None:
+                index.close()
+            index = None
+
+    try:
+        missing = [page for page in pages if page not in records]
+        if missing:
+            extracted = _extract_parallel(pdf_path, missing, workers)
+            records.update(extracted)
+            if index is not None:
+                try:
+                    index.put(doc_hash, extracted)
+                except sqlite3.Error:
+                    pass
+        return records
+    finally:
+        if index is not None:
+            index.close()
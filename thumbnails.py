@@ -0,0 +1,186 @@
+"""
+PDF书签工具 - 页面缩略图
+页面在工作进程池中渲染（PyMuPDF不能在多个线程中同时使用），结果保存在按内存大小限制的LRU缓存中；
+缩略图只在滚动到可见区域时才请求渲染，最近的请求优先
+"""
+
+import os
+from collections import OrderedDict
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QObject, QSize, Qt, Signal
+from PySide6.QtGui import QColor, QImage, QPixmap
+
+
+THUMB_WIDTH = 120
+THUMB_SIZE = QSize(THUMB_WIDTH, 170)
+# 像素缓存上限
+DEFAULT_CACHE_BYTES = 96 * 1024 * 1024
+# 等待渲染的请求上限，超出时丢弃最早的请求（通常已滚出可见区域）
+MAX_PENDING = 200
+# 工作进程中最多保持打开的文档数
+MAX_OPEN_DOCUMENTS = 2
+
+# 工作进程中已打开的文档 {路径: (修改时间, 文档)}
+_documents = OrderedDict()
+
+
+def render_page(pdf_path, page_num, width):
+    """在工作进程中渲染页面，返回 (宽, 高, 行字节数, RGB像素)"""
+    import pymupdf
+
+    mtime = os.stat(pdf_path).st_mtime_ns
+    cached = _documents.pop(pdf_path, None)
+    if cached is None or cached[0] != mtime:
+        if cached is not None:
+            cached[1].close()
+        cached = (mtime, pymupdf.open(pdf_path))
+    _documents[pdf_path] = cached
+    while len(_documents) > MAX_OPEN_DOCUMENTS:
+        _documents.popitem(last=False)[1][1].close()
+
+    page = cached[1][page_num]
+    zoom = width / page.rect.width
+    pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+    return pix.width, pix.height, pix.stride, pix.samples
+
+
+class PixmapCache:
+    """按像素字节数限制大小的LRU缓存，只在主线程中使用"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        pixmap = self.entries.get(key)
+        if pixmap is not None:
+            self.entries.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= self._size(old)
+        self.entries[key] = pixmap
+        self.total_bytes += self._size(pixmap)
+        # 至少保留最新的一项
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= self._size(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    @staticmethod
+    def _size(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class PageRenderer(QObject):
+    """调度渲染请求：同一页同一宽度只渲染一次，最近的请求优先，进程池按需启动"""
+
+    rendered = Signal(int, int, QImage)  # 页码(0基), 宽度, 图像
+    _completed = Signal(object, object)  # 内部使用：在进程池线程中发出，在主线程中处理
+
+    def __init__(self, workers=None, parent=None):
+        super().__init__(parent)
+        self.workers = workers or min(2, os.cpu_count() or 1)
+        self.executor = None
+        self.pdf_path = None
+        self.generation = 0
+        self.pending = OrderedDict()
+        self.in_flight = set()
+        self._completed.connect(self._on_completed)
+
+    def set_document(self, pdf_path):
+        """切换文档，丢弃旧文档的请求"""
+        self.pdf_path = pdf_path
+        self.generation += 1
+        self.pending.clear()
+        self.in_flight.clear()
+
+    def request(self, page_num, width):
+        key = (page_num, width)
+        if self.pdf_path is None or key in self.in_flight:
+            return
+        self.pending.pop(key, None)
+        self.pending[key] = None
+        while len(self.pending) > MAX_PENDING:
+            self.pending.popitem(last=False)
+        self._dispatch()
+
+    def _dispatch(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        while self.pending and len(self.in_flight) < self.workers * 2:
+            key, _ = self.pending.popitem(last=True)
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self.executor.submit(render_page, self.pdf_path, *key)
+            self.in_flight.add(key)
+            tag = (self.generation, key)
+            future.add_done_callback(lambda f, tag=tag: self._completed.emit(tag, f))
+
+    def _on_completed(self, tag, future):
+        generation, key = tag
+        if generation != self.generation:
+            return
+        self.in_flight.discard(key)
+        if not future.cancelled() and future.exception() is None:
+            width, height, stride, samples = future.result()
+            image = QImage(samples, width, height, stride, QImage.Format.Format_RGB888).copy()
+            self.rendered.emit(key[0], key[1], image)
+        self._dispatch()
+
+    def shutdown(self):
+        """停止进程池，释放工作进程打开的文件；之后的请求会重新启动进程池"""
+        self.generation += 1
+        self.pending.clear()
+        self.in_flight.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+class ThumbnailModel(QAbstractListModel):
+    """缩略图列表模型：视图请求可见行的图标时才提交渲染"""
+
+    def __init__(self, renderer, cache, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.cache = cache
+        self.page_count = 0
+        self.placeholder = QPixmap(THUMB_SIZE)
+        self.placeholder.fill(QColor(235, 235, 235))
+        renderer.rendered.connect(self.on_rendered)
+
+    def set_page_count(self, page_count):
+        self.beginResetModel()
+        self.page_count = page_count
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.page_count
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        page_num = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(page_num + 1)
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.cache.get((page_num, THUMB_WIDTH))
+            if pixmap is None:
+                self.renderer.request(page_num, THUMB_WIDTH)
+                return self.placeholder
+            return pixmap
+        return None
+
+    def on_rendered(self, page_num, width, image):
+        if width != THUMB_WIDTH or page_num >= self.page_count:
+            return
+        self.cache.put((page_num, width), QPixmap.fromImage(image))
+        index = self.index(page_num)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
@@ -0,0 +1,118 @@
+"""
+PDF书签工具 - 书签校验
+检查每个书签的标题是否出现在目标页上，并在附近页面中查找最佳匹配给出修正建议；
+每个页面只读取一次文本，页面文本经页面文本索引读取
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+import text_index
+
+
+# 在目标页前后这么多页内查找标题
+SEARCH_RADIUS = 3
+# 相似度达到该值视为匹配
+MATCH_THRESHOLD = 0.8
+
+# 去掉空白、标点和符号，只比较文字
+IGNORED_PATTERN = re.compile(r'[\W_]+')
+
+
+def normalise(text):
+    """全角转半角、统一大小写并去掉空白和标点"""
+    return IGNORED_PATTERN.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def collect_texts(pdf_path, pages, workers=None, use_index=True):
+    """读取页面（0基）文本，返回 {页码: (整页文本, [各行文本])}，均已规范化"""
+    texts = {}
+    for page_num, (lines, _) in text_index.load_pages(pdf_path, pages, workers, use_index).items():
+        lines = [normalise(line[0]) for line in lines]
+        lines = [line for line in lines if line]
+        texts[page_num] = (''.join(lines), lines)
+    return texts
+
+
+def match_score(title, page_text):
+    """标题与页面文本的相似度，0~1"""
+    if not title:
+        return 1.0
+    full_text, lines = page_text
+    if title in full_text:
+        return 1.0
+    # 编号不同的相邻标题（如"3.1"与"3.2"）文字几乎相同，模糊匹配时要求数字一致
+    digits = ''.join(c for c in title if c.isdigit())
+    best = 0.0
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(title)
+    for line in lines:
+        if digits and digits not in ''.join(c for c in line if c.isdigit()):
+            continue
+        matcher.set_seq1(line)
+        # quick_ratio是ratio的上界，先用它过滤
+        if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+            best = max(best, matcher.ratio())
+    return best
+
+
+class VerifyResult:
+    """单个书签的校验结果"""
+
+    def __init__(self, index, level, title, page, score, best_page, best_score):
+        self.index = index
+        self.level = level
+        self.title = title
+        self.page = page
+        self.score = score
+        self.best_page = best_page
+        self.best_score = best_score
+
+    @property
+    def ok(self):
+        return self.score >= MATCH_THRESHOLD
+
+    @property
+    def suggestion(self):
+        """建议的页码，附近也找不到时为None"""
+        if self.ok or self.best_score < MATCH_THRESHOLD:
+            return None
+        return self.best_page
+
+    def __str__(self):
+        text = f"第{self.index}个书签 '{self.title}' (第{self.page}页, 相似度 {self.score:.0%})"
+        if self.suggestion is not None:
+            return f"{text} -> 建议第{self.suggestion}页 (相似度 {self.best_score:.0%})"
+        return f"{text} -> 附近{SEARCH_RADIUS}页内未找到"
+
+
+def verify_bookmarks(pdf_path, bookmarks, page_count, radius=SEARCH_RADIUS, workers=None, use_index=True):
+    """校验书签列表 [[层级, 标题, 页码(1基)], ...]，返回 VerifyResult 列表"""
+    pages = set()
+    for _, _, page in bookmarks:
+        pages.update(range(max(page - 1 - radius, 0), min(page + radius, page_count)))
+    texts = collect_texts(pdf_path, pages, workers, use_index)
+
+    results = []
+    for index, (level, title, page) in enumerate(bookmarks, 1):
+        title_key = normalise(title)
+        scores = {}
+        for page_num in range(max(page - 1 - radius, 0), min(page + radius, page_count)):
+            scores[page_num + 1] = match_score(title_key, texts[page_num])
+        score = scores.get(page, 0.0)
+        # 相似度相同时取离目标页最近的页
+        best_page = max(scores, key=lambda p: (scores[p], -abs(p - page))) if scores else page
+        results.append(VerifyResult(index, level, title, page, score, best_page, scores.get(best_page, 0.0)))
+    return results
+
+
+def common_shift(results):
+    """多数不匹配的书签偏差相同页数时，返回该偏差（整体偏移），否则返回None"""
+    shifts = Counter(r.suggestion - r.page for r in results if r.suggestion is not None)
+    if not shifts:
+        return None
+    shift, count = shifts.most_common(1)[0]
+    mismatched = sum(1 for r in results if not r.ok)
+    return shift if count * 2 > mismatched else None
@@ -0,0 +1,347 @@
+"""
+PDF书签工具 - 监视目录
+监视目录中新放入的PDF和书签TXT文件，文件写完（大小和修改时间在一段时间内不变）且配对完整后自动应用书签；
+Linux上使用inotify，其他系统或网络共享目录轮询；任务记录在只追加的日志中，重启后不会重复处理
+"""
+
+import collections
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import time
+
+import cli
+
+
+# 文件大小和修改时间保持不变多少秒后视为写入完成
+SETTLE_SECONDS = 2.0
+# 有文件等待写完或有任务进行时的检查间隔（秒），轮询模式下也是扫描间隔
+POLL_INTERVAL = 1.0
+# 使用inotify时也定期完整扫描一次，防止漏掉事件
+RESCAN_INTERVAL = 60.0
+# 默认任务日志文件名，位于第一个监视目录中
+JOURNAL_NAME = '.pdf_bm_watch.jsonl'
+
+# inotify 常量（见 inotify(7)）
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def file_signature(path):
+    """文件的 [大小, 修改时间]，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class PollingMonitor:
+    """轮询：每次等待后要求完整扫描，适用于网络共享等收不到inotify事件的目录"""
+
+    name = "轮询"
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyMonitor:
+    """通过ctypes使用Linux inotify，返回发生变化的文件路径；事件队列溢出时要求完整扫描"""
+
+    name = "inotify"
+
+    def __init__(self, directories):
+        import ctypes
+
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.directories = {}
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for directory in directories:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"无法监视目录 {directory}")
+            self.directories[wd] = directory
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name and wd in self.directories:
+                changed.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_monitor(directories, poll=False):
+    """优先使用inotify，不可用时（非Linux、达到监视数上限等）回退到轮询"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyMonitor(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingMonitor()
+
+
+class JobJournal:
+    """只追加的任务日志：每行一个JSON记录，事件为 queued、done 或 failed
+
+    done和failed记录处理时的书签文件签名，以及处理后的PDF签名（应用书签会修改PDF），
+    文件再次变化前不会重复处理。中断时写了一半的最后一行会被截掉。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.finished = {}
+        self.queued = set()
+        valid_end = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                        self._replay(record)
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    valid_end += len(line)
+            if valid_end != os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _replay(self, record):
+        pdf = record["pdf"]
+        if record["event"] == "queued":
+            self.queued.add(pdf)
+        else:
+            self.queued.discard(pdf)
+            self.finished[pdf] = (record["pdf_sig"], record["txt_sig"])
+
+    def is_finished(self, pdf, pdf_sig, txt_sig):
+        return self.finished.get(pdf) == (pdf_sig, txt_sig)
+
+    def record(self, event, pdf, txt, pdf_sig, txt_sig, message=""):
+        record = {"time": round(time.time(), 3), "event": event, "pdf": pdf, "txt": txt,
+                  "pdf_sig": pdf_sig, "txt_sig": txt_sig}
+        if message:
+            record["message"] = message
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 每条记录都落盘，崩溃后最多重做正在处理的任务
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._replay(record)
+
+    def close(self):
+        self.file.close()
+
+
+class FolderWatcher:
+    """跟踪目录中的PDF和书签文件，文件写完后与对应的文件配对，产出可以执行的任务"""
+
+    def __init__(self, directories, bookmark_dir=None, pattern="{stem}.txt", settle=SETTLE_SECONDS):
+        self.directories = directories
+        self.bookmark_dir = bookmark_dir
+        self.pattern = pattern
+        self.settle = settle
+        self.changing = {}  # 正在写入的文件 {路径: (签名, 签名最后变化的时间)}
+        self.stable = {}  # 已写完的文件 {路径: 签名}
+        self.pdf_for_txt = {}  # 书签文件 -> 对应的PDF
+        self.ready = set()  # 刚写完、需要检查配对的PDF
+
+    def _is_candidate(self, path):
+        name = os.path.basename(path)
+        return not name.startswith('.') and name.lower().endswith(('.pdf', '.txt'))
+
+    def txt_for_pdf(self, pdf_path):
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        txt_root = self.bookmark_dir or os.path.dirname(pdf_path)
+        return os.path.join(txt_root, self.pattern.format(stem=stem))
+
+    def scan(self):
+        """完整扫描所有监视目录"""
+        for directory in {*self.directories, *([self.bookmark_dir] if self.bookmark_dir else [])}:
+            try:
+                with os.scandir(directory) as entries:
+                    paths = [entry.path for entry in entries]
+            except OSError:
+                continue
+            for path in paths:
+                self.touch(path)
+
+    def touch(self, path, now=None):
+        """文件可能发生了变化"""
+        if not self._is_candidate(path):
+            return
+        signature = file_signature(path)
+        if signature is None:
+            self.changing.pop(path, None)
+            self.stable.pop(path, None)
+            return
+        if path.lower().endswith('.pdf'):
+            self.pdf_for_txt[self.txt_for_pdf(path)] = path
+        if self.stable.get(path) == signature:
+            return
+        current = self.changing.get(path)
+        if current is None or current[0] != signature:
+            self.stable.pop(path, None)
+            self.changing[path] = (signature, now if now is not None else time.monotonic())
+
+    def poll_changing(self, now=None):
+        """重新检查正在写入的文件，签名保持不变超过settle秒的视为写完"""
+        now = now if now is not None else time.monotonic()
+        for path, (signature, since) in list(self.changing.items()):
+            current = file_signature(path)
+            if current is None:
+                del self.changing[path]
+            elif current != signature:
+                self.changing[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.changing[path]
+                self.stable[path] = signature
+                pdf = path if path.lower().endswith('.pdf') else self.pdf_for_txt.get(path)
+                if pdf is not None:
+                    self.ready.add(pdf)
+
+    def take_jobs(self):
+        """产出配对完整、两个文件都已写完的任务 (PDF路径, 书签路径, PDF签名, 书签签名)"""
+        ready, self.ready = self.ready, set()
+        for pdf in sorted(ready):
+            txt = self.txt_for_pdf(pdf)
+            if pdf in self.stable and txt in self.stable:
+                yield pdf, txt, self.stable[pdf], self.stable[txt]
+
+    @property
+    def busy(self):
+        return bool(self.changing)
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _init_worker():
+    """工作进程忽略Ctrl+C和SIGTERM，由主进程等待正在保存的文件写完后再退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def run_watch(directories, bookmark_dir=None, pattern="{stem}.txt", workers=None, update=False, offset=None,
+              profile=None, journal_path=None, poll=False, settle=SETTLE_SECONDS):
+    """监视目录并自动应用书签，直到收到Ctrl+C或SIGTERM"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    directories = [os.path.abspath(directory) for directory in directories]
+    bookmark_dir = os.path.abspath(bookmark_dir) if bookmark_dir else None
+    journal = JobJournal(journal_path or os.path.join(directories[0], JOURNAL_NAME))
+    watcher = FolderWatcher(directories, bookmark_dir, pattern, settle)
+    monitor = open_monitor(directories + ([bookmark_dir] if bookmark_dir else []), poll)
+    workers = workers or os.cpu_count() or 1
+
+    queue = collections.deque()
+    queued = set()
+    in_flight = {}
+    counts = {"done": 0, "failed": 0}
+
+    def finish(future):
+        pdf, txt, _, txt_sig = in_flight.pop(future)
+        try:
+            _, ok, message = future.result()
+        except Exception as e:
+            # 工作进程异常退出，不记录结果，下次启动时重新处理
+            print(f"[中断] {pdf}: {e}", flush=True)
+            return
+        # 记录应用书签之后的PDF签名，自身的写入不会再次触发任务
+        event = "done" if ok else "failed"
+        last_line = message.splitlines()[-1] if message else ""
+        journal.record(event, pdf, txt, file_signature(pdf), txt_sig, last_line)
+        counts[event] += 1
+        print(f"[{'成功' if ok else '失败'}] {pdf}: {last_line}", flush=True)
+
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    print(f"开始监视 {', '.join(directories)}（{monitor.name}，{workers} 个工作进程，"
+          f"文件 {settle:g} 秒内不变视为写完）", flush=True)
+    if journal.queued:
+        print(f"上次退出时有 {len(journal.queued)} 个任务未完成，文件仍在时将重新处理", flush=True)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            watcher.scan()
+            last_scan = time.monotonic()
+            while True:
+                # 有文件正在写入或任务在进行时频繁检查，否则等待文件系统事件
+                busy = watcher.busy or in_flight or queue
+                changed = monitor.wait(POLL_INTERVAL if busy or isinstance(monitor, PollingMonitor)
+                                       else RESCAN_INTERVAL)
+                now = time.monotonic()
+                if changed is None or now - last_scan >= RESCAN_INTERVAL:
+                    watcher.scan()
+                    last_scan = now
+                else:
+                    for path in changed:
+                        watcher.touch(path, now)
+                watcher.poll_changing(now)
+
+                # 先记录已完成的任务，应用书签后PDF的新签名才能被识别为自身的写入
+                for future in [future for future in in_flight if future.done()]:
+                    finish(future)
+
+                busy_pdfs = {job[0] for job in in_flight.values()}
+                for job in watcher.take_jobs():
+                    pdf, txt, pdf_sig, txt_sig = job
+                    if pdf in busy_pdfs:
+                        # 正在处理的PDF在任务完成后再检查
+                        watcher.ready.add(pdf)
+                        continue
+                    if pdf in queued or journal.is_finished(pdf, pdf_sig, txt_sig):
+                        continue
+                    journal.record("queued", pdf, txt, pdf_sig, txt_sig)
+                    queue.append(job)
+                    queued.add(pdf)
+
+                # 进程池中的任务数不超过工作进程数
+                while queue and len(in_flight) < workers:
+                    job = queue.popleft()
+                    queued.discard(job[0])
+                    future = executor.submit(cli._apply_bookmarks_worker, job[0], job[1], update, offset, profile)
+                    in_flight[future] = job
+    except KeyboardInterrupt:
+        # 退出进程池时已等待正在处理的任务完成，记录其结果；排队中的任务下次启动时重新处理
+        for future in list(in_flight):
+            finish(future)
+        print(f"\n已停止监视: 成功 {counts['done']} 个，失败 {counts['failed']} 个", flush=True)
+    finally:
+        monitor.close()
+        journal.close()
+    return True
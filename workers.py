@@ -0,0 +1,60 @@
+"""
+PDF书签工具 - 后台任务
+基于QThreadPool/QRunnable的后台任务层，支持进度上报与取消
+"""
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+
+class OperationCancelled(Exception):
+    """用户取消了正在进行的操作"""
+
+
+class WorkerSignals(QObject):
+    """后台任务的信号，在主线程中接收"""
+    progress = Signal(int, int, str)  # 已完成, 总数(0表示未知), 说明
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class Worker(QRunnable):
+    """在线程池中执行task(worker)，通过信号返回结果
+
+    task通过worker.report()上报进度；report同时也是取消检查点，
+    用户取消后下一次report会抛出OperationCancelled。
+    """
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.signals = WorkerSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消任务，在下一个检查点生效"""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise OperationCancelled()
+
+    def report(self, done, total=0, text=""):
+        """上报进度，并检查是否已被取消"""
+        self.check_cancelled()
+        self.signals.progress.emit(done, total, text)
+
+    def run(self):
+        try:
+            result = self.task(self)
+        except OperationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)